@@ -1,16 +1,26 @@
 # server_serial_steweart.py
 # FastAPI + Serial + WebSocket de telemetria com reconstrução de pose (LSQ)
 
+import os
+import re
+import struct
+import binascii
+import heapq
 import threading
 import time
 import json
 import asyncio
-from typing import List, Optional, Dict, Any, Tuple
+from collections import OrderedDict, deque
+from fractions import Fraction
+from functools import partial
+from typing import List, Optional, Dict, Any, Tuple, Sequence
 from math import sin, cos, tau
 
 import numpy as np
 from scipy.spatial.transform import Rotation as R
-from scipy.optimize import least_squares
+from scipy.optimize import least_squares, brentq, minimize_scalar
+from scipy.interpolate import RegularGridInterpolator
+from scipy.sparse import coo_matrix
 import serial
 import serial.tools.list_ports
 
@@ -18,6 +28,11 @@ from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 
+try:
+    import orjson  # opcional: serialização rápida do broadcast (arrays NumPy nativos)
+except ImportError:
+    orjson = None
+
 # -------------------- Config API --------------------
 API_TITLE = "Stewart Platform API + Serial + WS"
 API_VERSION = "1.1.0"
@@ -38,9 +53,158 @@ async def startup_event():
     loop = asyncio.get_event_loop()
     serial_mgr.set_event_loop(loop)
     print("✅ FastAPI startup: event loop configurado")
+    if os.environ.get(VIRTUAL_RIG_ENV) == "1":
+        try:
+            start_virtual_rig(VirtualRigConfig())
+        except HTTPException as e:
+            # sem pty (Windows) ou rig já rodando: o servidor sobe mesmo assim
+            print(f"⚠️ Rig virtual não iniciado: {e.detail}")
 
 BAUD = 115200
 CSV_DELIM = ';'
+SERIAL_MAX_LINE = 4096           # linha sem '\n' maior que isso é descartada (lixo de boot, ruído)
+SERIAL_RATE_WINDOW_S = 1.0       # janela dos contadores bytes/s e linhas/s
+SERIAL_TRANSPORTS = ("thread", "asyncio")   # leitura numa thread ou no próprio event loop (add_reader)
+SERIAL_TRANSPORT_ENV = "STEWART_SERIAL_TRANSPORT"
+SERIAL_READ_CHUNK = 65536        # os.read por evento de leitura no transporte asyncio
+STREAM_QUEUE_MAX = 256           # fila por consumidor assíncrono (cheia: descarta o mais antigo)
+WS_QUEUE_MAX = 64                # mensagens pendentes por cliente WebSocket (cheia: descarta a mais antiga)
+# Tipos em que um cliente atrasado só precisa da mensagem mais recente (raw/ack nunca são fundidos)
+WS_LATEST_TYPES = ("telemetry", "telemetry_mpu", "telemetry_bno085", "motion_tick")
+WS_JSON_ENCODER = "orjson" if orjson is not None else "json"
+# Tópicos do /ws/telemetry (os três formatos de telemetria formam um tópico só)
+WS_TOPICS = ("telemetry", "motion_tick", "raw")
+WS_TOPIC_OF = {"telemetry": "telemetry", "telemetry_mpu": "telemetry", "telemetry_bno085": "telemetry",
+               "motion_tick": "motion_tick", "raw": "raw"}
+WS_RATE_TOPICS = ("telemetry", "motion_tick")   # raw (respostas do firmware) nunca é decimado
+WS_DECIMATION_MODES = ("latest", "aggregate")   # último frame do período ou ele + min/máx/média dos pulados
+WS_AGG_SKIP = ("type", "ts")                    # campos fora do agregado
+
+# Frame binário de telemetria (alternativa compacta ao CSV, detectada por conexão):
+#   0xAA 0x55 | len (u8) | payload (len bytes, little-endian) | CRC-16/CCITT (u16 LE) sobre len+payload
+# O payload espelha os campos do CSV; o tamanho identifica o formato.
+TELEM_BIN_SYNC = b"\xaa\x55"
+TELEM_BIN_CRC_INIT = 0xFFFF
+# Telemetria CSV: formato travado por conexão pelo cabeçalho do firmware ou pelo 1º frame válido.
+# Só essas contagens travam; travado, outra contagem é linha rejeitada (troca real vem pelo cabeçalho)
+TELEM_CSV_FORMATS = {14: "standard", 17: "mpu6050", 21: "bno085"}
+TELEM_CSV_MIN_FIELDS = 14
+TELEM_CSV_HEADER_PREFIX = "ms;"  # cabeçalho do firmware: ms;SP_mm;Y1;...;PWM6[;Roll;Pitch;Yaw[;Qw;Qx;Qy;Qz]]
+
+TELEM_BIN_LAYOUTS = {
+    44: struct.Struct("<If6f6h"),        # ms, SP, Y1-Y6, PWM1-PWM6           (padrão)
+    56: struct.Struct("<If6f6h3f"),      # + Roll, Pitch, Yaw                  (MPU-6050)
+    72: struct.Struct("<If6f6h3f4f"),    # + Roll, Pitch, Yaw, Qw, Qx, Qy, Qz  (BNO085)
+}
+
+# TX serial: uma única thread escreve na porta; quem chama write_line só enfileira.
+# Comandos saem por prioridade e, dentro dela, na ordem de chegada. Setpoints em lote
+# são latest-wins: um novo descarta o anterior ainda não enviado.
+TX_PRIO_URGENT = 0
+TX_PRIO_NORMAL = 1
+TX_URGENT_COMMANDS = ("OK",)              # parada manual fura a fila (firmware aceita em qualquer caixa)
+TX_LATEST_WINS_PREFIXES = ("spmm6x=",)
+TX_QUEUE_MAX = 1000                       # comandos pendentes; acima disso a porta está travada
+TX_WRITE_TIMEOUT_S = 1.0
+
+# Transações com confirmação: o firmware processa a serial em ordem e responde
+# "OK ..."/"ERR ..." a parte dos comandos. Comando sem resposta própria (sel=, kpmm=, ...)
+# é confirmado por uma resposta posterior; se for o último do lote, vai junto um "v?"
+# (consulta sem efeito colateral, respondida por todas as versões do firmware).
+# Toda resposta é casada com o comando escrito mais antigo ainda sem resposta (ordem da
+# thread TX), então "OK spmm6x" da rotina ou "V[" de um v? avulso não confirmam a transação.
+CMD_ACK_TIMEOUT_S = 1.0
+CMD_REPLY_STALE_S = 15.0   # comando fora de transação sem resposta nesse prazo deixa de ser esperado
+CMD_BARRIER = "v?"
+CMD_ACK_REPLIES = (
+    # (prefixo do comando, prefixos aceitos como resposta)
+    ("spmm6x=", ("OK spmm6x", "ERR spmm6x")),
+    ("vmaxmmps=", ("OK vmax_mm_s",)),
+    ("u0aall=", ("OK U0_adv para todos",)),
+    ("u0rall=", ("OK U0_ret para todos",)),
+    ("u0a=", ("OK U0_adv[",)),
+    ("u0r=", ("OK U0_ret[",)),
+    ("offsetall=", ("OK offset para todos",)),
+    ("offset=", ("OK offset[",)),
+    ("cal=", ("OK CAL[", "ERR CAL")),
+    ("zero", ("OK ZERO[",)),
+    ("mark100", ("OK V100[",)),
+    ("v?", ("V[",)),
+)
+CMD_REPLY_PREFIXES = ("OK", "ERR", "V[")
+
+# Rig virtual: ESP32 emulado num pseudo-terminal (Linux/macOS) para testes sem hardware.
+# Padrões iguais ao pid-control-filter-spike-bno; a dinâmica dos atuadores é de 1ª ordem.
+VIRTUAL_RIG_ENV = "STEWART_VIRTUAL_RIG"      # "1" inicia o rig junto com o servidor
+VIRTUAL_RIG_RATE_HZ_DEFAULT = 30.0           # firmware: telemetria a cada 33 ms
+VIRTUAL_RIG_CONTROL_HZ = 500.0               # passo do laço de controle simulado
+VIRTUAL_RIG_IMU_HZ = 100.0                   # orientação chega por ESP-NOW nessa taxa (não a cada frame)
+VIRTUAL_RIG_ACT_VMAX_MM_S = 60.0             # velocidade do atuador com PWM 255
+VIRTUAL_RIG_ACT_TAU_S = 0.05                 # constante de tempo do atuador
+VIRTUAL_RIG_STICTION_PWM = 8.0               # PWM abaixo disso não move o atuador
+VIRTUAL_RIG_MAX_CMD = 96                     # firmware guarda só os últimos 96 caracteres da linha
+VIRTUAL_RIG_FORMATS = {"standard": 14, "mpu6050": 17, "bno085": 21}
+
+# Replay de aquisições gravadas (monitor serial "hora;direcao;linha" ou dumps "hora;ms;SP;FB...")
+REPLAY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "aquisições")
+REPLAY_EXTENSIONS = (".csv", ".txt", ".log")
+REPLAY_MAX_SPEED = 1000.0                    # speed=0 = o mais rápido possível
+REPLAY_WAIT_SLICE_S = 0.05                   # espera máxima por vez (reage a stop/seek/pausa)
+MAX_BATCH_POSES = 20000  # limite de poses por requisição em /calculate/batch
+
+# Cinemática direta (reconstrução de pose a partir dos comprimentos)
+FK_METHODS = ("newton", "lsq")
+FK_METHOD_DEFAULT = "newton"
+FK_NEWTON_MAX_ITER = 20
+FK_NEWTON_TOL = 1e-6  # mm / graus
+FK_CACHE_RESOLUTION_MM = 0.01  # quantização dos comprimentos na chave do cache
+FK_CACHE_MAX_ENTRIES = 4096
+FK_RATE_HZ_DEFAULT = 0.0  # taxa da reconstrução de pose (0 = todo frame de telemetria)
+
+# Índice do espaço de trabalho (grade 6D de margens de curso)
+WORKSPACE_GRID_POINTS = 8       # pontos por eixo (8^6 ≈ 262k poses, ~6 MB de comprimentos em float32)
+WORKSPACE_RANGE_PAD = 0.10      # folga da grade além do alcance de cada eixo isolado
+WORKSPACE_CHUNK = 65536         # poses por lote de IK ao montar a grade
+POSE_AXES = ("x", "y", "z", "roll", "pitch", "yaw")
+DEXTERITY_MIN = 0.2              # 1/cond(J) abaixo disso → pose perto de singularidade
+ACTUATOR_VMAX_MM_S_DEFAULT = 150.0    # igual ao vmax_mm_s padrão do firmware (vmaxmmps=)
+ACTUATOR_AMAX_MM_S2_DEFAULT = 0.0     # aceleração máx. por perna; 0 = só reporta (firmware não limita)
+MOTION_PRECHECK_SAMPLES_PER_CYCLE = 20  # passo do precheck: no máximo o tick (60 Hz) e >= 20 amostras por ciclo
+GEOMETRY_PROFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "geometry_profiles")
+GEOMETRY_PROFILE_NAME_RE = re.compile(r"^[A-Za-z0-9_\-]{1,64}$")  # sem caminhos
+CALIB_PRIOR_MM = 5.0             # desvio a priori dos pontos B/P0 em relação ao CAD (fixa o gauge)
+CALIB_MAX_FRAMES = 200000        # limite do gravador de calibração
+CALIB_MAX_NFEV = 100
+CALIB_FTOL = 1e-6                # variação relativa do custo para parar (resíduos já no nível do ruído)
+LIMITS_SAMPLES = 2001            # amostras por eixo antes do refinamento por raiz
+LIMITS_XTOL = 1e-4               # tolerância do refinamento (mm / graus)
+LIMITS_SPANS = (400.0, 400.0, None, 90.0, 90.0, 90.0)  # busca ±span por eixo (z: 0..2*stroke_max)
+WORKSPACE_SLICE_CACHE_SIZE = 64  # fatias 2D guardadas por geometria
+WORKSPACE_SLICE_MAX_POINTS = 401  # resolução máxima por eixo de uma fatia
+
+# Subprotocolo binário do /ws/telemetry (opt-in: new WebSocket(url, ["stewart.bin.v1"])):
+#   cabeçalho 16 B LE: u8 código do tipo | u8 versão | u16 flags | u32 seq (por tópico) | f64 ts
+#   corpo: float32 LE na ordem de WS_BIN_LAYOUTS[tipo]; bloco ausente vai como NaN e sem o seu bit em flags
+#   (bit i = i-ésimo bloco). Tipos sem layout (raw, subscribed, error) seguem em texto JSON no mesmo socket.
+#   Bloco = (campo, n) para número/lista, (campo, (linhas, colunas)) para matriz ou (campo, chaves) para dict;
+#   flags booleanas (near_singular) vão como 0/1 e valores None dentro de dicts como NaN.
+WS_BIN_SUBPROTOCOL = "stewart.bin.v1"
+WS_BIN_VERSION = 1
+WS_BIN_TYPES = {"telemetry": 1, "telemetry_mpu": 2, "telemetry_bno085": 3, "motion_tick": 4}
+_WS_BIN_TELEMETRY = (
+    ("sp_mm", 1), ("Y", 6), ("PWM", 6), ("actuator_lengths_abs", 6),
+    ("pose_live", POSE_AXES), ("pose_age_ms", 1), ("platform_points_live", (6, 3)), ("base_points", (6, 3)),
+    ("mpu", ("roll", "pitch", "yaw")), ("quaternions", ("w", "x", "y", "z")),
+    ("conditioning", ("condition_number", "dexterity", "near_singular")),
+    ("fk", ("solve_ms", "iterations", "residual_mm")),
+)
+WS_BIN_LAYOUTS = {
+    "telemetry": _WS_BIN_TELEMETRY,
+    "telemetry_mpu": _WS_BIN_TELEMETRY,
+    "telemetry_bno085": _WS_BIN_TELEMETRY,
+    "motion_tick": (("t", 1), ("elapsed_ms", 1), ("pose_cmd", POSE_AXES), ("actuators_cmd", 6),
+                    ("actuators_real", 6), ("dexterity", 1), ("near_singular", 1)),
+}
 
 FLIGHT_SIMULATION_STATE = {
     "enabled": False,
@@ -70,6 +234,61 @@ class PlatformResponse(BaseModel):
     valid: bool
     base_points: List[List[float]]
     platform_points: List[List[float]]
+    condition_number: Optional[float] = None  # cond(J) das pernas
+    dexterity: Optional[float] = None         # 1/cond(J), 0 = singular
+    near_singular: bool = False               # dexterity < DEXTERITY_MIN
+
+class BatchPoseInput(BaseModel):
+    poses: List[PoseInput] = Field(..., min_length=1, max_length=MAX_BATCH_POSES)
+    include_points: bool = False  # Se True, retorna platform_points (N x 6 x 3)
+
+class BatchPlatformResponse(BaseModel):
+    count: int
+    all_valid: bool
+    first_invalid: Optional[int]  # índice da primeira pose inválida (ou None)
+    valid: List[bool]
+    lengths: List[List[float]]
+    percentages: List[List[float]]
+    base_points: List[List[float]]
+    platform_points: Optional[List[List[List[float]]]] = None
+    condition_numbers: List[float] = []
+    dexterity: List[float] = []
+    near_singular: List[bool] = []
+    min_dexterity: Optional[float] = None
+
+class FKSettings(BaseModel):
+    method: Optional[str] = None  # "newton" | "lsq"
+    cache_enabled: Optional[bool] = None
+    cache_resolution_mm: Optional[float] = Field(None, gt=0, le=5.0)
+    cache_size: Optional[int] = Field(None, ge=1, le=1_000_000)
+    rate_hz: Optional[float] = Field(None, ge=0, le=1000)  # 0 = todo frame
+
+class WorkspaceQuery(BaseModel):
+    poses: List[PoseInput] = Field(..., min_length=1, max_length=MAX_BATCH_POSES)
+    exact: bool = False  # Se True, inclui também a margem exata calculada pela IK
+
+class GeometryProfile(BaseModel):
+    name: str
+    description: Optional[str] = None
+    h0: float
+    stroke_min: float
+    stroke_max: float
+    home_z: Optional[float] = None  # Altura HOME das rotinas (padrão: altura neutra)
+    B: List[List[float]]            # 6 pontos de fixação na base (mm)
+    P0: List[List[float]]           # 6 pontos da plataforma móvel no referencial local (mm)
+
+class CalibrationFrame(BaseModel):
+    Y: List[float] = Field(..., min_length=6, max_length=6)  # curso medido (mm), L = stroke_min + Y
+    pose: Optional[List[float]] = Field(None, min_length=6, max_length=6)  # pose conhecida [x,y,z,roll,pitch,yaw]
+    quaternion: Optional[List[float]] = Field(None, min_length=4, max_length=4)  # orientação do BNO085 [w,x,y,z]
+
+class CalibrationRequest(BaseModel):
+    profile_name: str                  # perfil de geometria a ser gravado
+    frames: Optional[List[CalibrationFrame]] = None  # se None, usa a gravação em memória
+    csv_path: Optional[str] = None     # alternativa: CSV em aquisições/ com Y1..Y6 [x..yaw] [qw,qx,qy,qz]
+    prior_mm: float = Field(CALIB_PRIOR_MM, gt=0)
+    fit_imu_offset: bool = True        # ajusta o desalinhamento fixo do IMU
+    activate: bool = False             # ativa o perfil gerado
 
 class PlatformConfig(BaseModel):
     h0: float
@@ -79,6 +298,24 @@ class PlatformConfig(BaseModel):
 class SerialOpenRequest(BaseModel):
     port: str
     baud: Optional[int] = BAUD
+    transport: Optional[str] = None  # "thread" ou "asyncio" (padrão: STEWART_SERIAL_TRANSPORT ou "thread")
+
+class VirtualRigConfig(BaseModel):
+    rate_hz: float = Field(VIRTUAL_RIG_RATE_HZ_DEFAULT, gt=0, le=2000)
+    telemetry_format: str = "bno085"   # "standard" (14), "mpu6050" (17) ou "bno085" (21 campos)
+    encoding: str = "text"             # "text" (CSV) ou "binary" (frame com CRC)
+    noise_mm: float = Field(0.0, ge=0, le=5.0)
+    seed: Optional[int] = None
+
+class ReplayRequest(BaseModel):
+    file: str                          # caminho relativo a REPLAY_DIR (ver GET /replay/files)
+    speed: float = Field(1.0, ge=0, le=REPLAY_MAX_SPEED)  # 1 = tempo real, N = N vezes, 0 = sem espera
+    loop: bool = False
+    start_s: float = Field(0.0, ge=0)
+
+class ReplaySeek(BaseModel):
+    position_s: float = Field(..., ge=0)
+    speed: Optional[float] = Field(None, ge=0, le=REPLAY_MAX_SPEED)
 
 class ApplyPoseRequest(PoseInput):
     pass
@@ -105,6 +342,23 @@ class PIDSettings(BaseModel):
     dbmm: Optional[float] = None
     minpwm: Optional[int] = None
 
+class PIDBatch(BaseModel):
+    """Reconfiguração de vários pistões numa única transação"""
+    gains: List[PIDGains] = []
+    feedforward: List[PIDFeedforward] = []
+
+class SerialTransaction(BaseModel):
+    commands: List[str] = Field(..., min_length=1, max_length=256)
+    timeout_s: float = Field(CMD_ACK_TIMEOUT_S, gt=0, le=10.0)
+
+class WSSubscribe(BaseModel):
+    """Mensagem do cliente no /ws/telemetry: {"action": "subscribe", "topics": [...], "fields": {...}}"""
+    action: str = "subscribe"
+    topics: Optional[List[str]] = None              # None = todos os tópicos
+    fields: Optional[Dict[str, List[str]]] = None   # tópico -> campos enviados ("type" sempre vai)
+    rates: Optional[Dict[str, float]] = None        # tópico -> taxa máxima em Hz (ausente = todo frame)
+    decimation: str = "latest"                      # latest | aggregate
+
 class MotionRequest(BaseModel):
     routine: str  # "sine_axis", "circle_xy", "helix", "heave_pitch"
     duration_s: float = Field(60.0, gt=0, le=3600)
@@ -118,6 +372,12 @@ class MotionRequest(BaseModel):
     z_amp_mm: Optional[float] = None  # Amplitude em Z para helix (mm)
     z_cycles: Optional[float] = None  # Número de ciclos completos em Z durante uma volta no círculo XY
 
+class MotionLimits(BaseModel):
+    vmax_mm_s: Optional[float] = Field(None, gt=1.0, le=2000.0)   # mesmo piso do firmware (v > 1)
+    amax_mm_s2: Optional[float] = Field(None, ge=0, le=100000.0)  # 0 = não verifica aceleração
+    enforce: Optional[bool] = None    # True = /motion/start rejeita rotinas inviáveis
+    sync_firmware: bool = False       # Se True, envia vmaxmmps= para o ESP32
+
 class JoystickPoseRequest(BaseModel):
     """Modelo para controle por joystick (gamepad)"""
     lx: float = Field(0.0, ge=-1.0, le=1.0)  # left stick X, -1..1
@@ -131,10 +391,20 @@ class JoystickPoseRequest(BaseModel):
 
 # -------------------- Stewart Platform --------------------
 class StewartPlatform:
-    def __init__(self, h0=432, stroke_min=500, stroke_max=680):
+    # Limites de busca da cinemática direta [x, y, z, roll, pitch, yaw]
+    FK_BOUNDS = (
+        np.array([-100.0, -100.0, 300.0, -30.0, -30.0, -30.0]),  # limites inferiores
+        np.array([ 100.0,  100.0, 600.0,  30.0,  30.0,  30.0]),  # limites superiores
+    )
+
+    def __init__(self, h0=432, stroke_min=500, stroke_max=680, B=None, P0=None, name="default", home_z=None):
+        if not stroke_min < stroke_max:
+            raise ValueError(f"stroke_min ({stroke_min}) deve ser menor que stroke_max ({stroke_max})")
+        self.name = name
         self.h0 = h0
         self.stroke_min = stroke_min
         self.stroke_max = stroke_max
+        self.home_z = home_z  # None = altura neutra
 
         self.B = np.array([
             [305.5, -17, 0],
@@ -143,7 +413,7 @@ class StewartPlatform:
             [-168,   255.7, 0],
             [-167.2, -256.2, 0],
             [-136.8, -273.6, 0],
-        ])
+        ]) if B is None else np.array(B, dtype=float)
         self.P0 = np.array([
             [191.1, -241.5, 0],
             [191.1,  241.5, 0],
@@ -151,7 +421,44 @@ class StewartPlatform:
             [-304.7,  44.8, 0],
             [-304.7, -44.8, 0],
             [113.1, -286.4, 0],
-        ])
+        ]) if P0 is None else np.array(P0, dtype=float)
+        if self.B.shape != (6, 3) or self.P0.shape != (6, 3):
+            raise ValueError(f"B e P0 devem ter shape (6, 3), recebido {self.B.shape} e {self.P0.shape}")
+
+        # Artefatos derivados da geometria (montados sob demanda)
+        self._workspace: Optional["WorkspaceIndex"] = None
+        self._workspace_lock = threading.RLock()
+        self._slice_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._limits_cache: Dict[tuple, Dict[str, Any]] = {}
+
+        # Comprimento característico (raio médio da plataforma móvel): adimensionaliza
+        # as colunas de rotação do Jacobiano para o número de condição fazer sentido
+        self.char_length = float(np.mean(np.linalg.norm(self.P0, axis=1)))
+
+    @classmethod
+    def from_profile(cls, profile: "GeometryProfile") -> "StewartPlatform":
+        """Cria a plataforma a partir de um perfil de geometria nomeado"""
+        return cls(h0=profile.h0, stroke_min=profile.stroke_min, stroke_max=profile.stroke_max,
+                   B=profile.B, P0=profile.P0, name=profile.name, home_z=profile.home_z)
+
+    def to_profile(self, description: Optional[str] = None) -> "GeometryProfile":
+        return GeometryProfile(
+            name=self.name, description=description,
+            h0=self.h0, stroke_min=self.stroke_min, stroke_max=self.stroke_max,
+            home_z=self.home_z, B=self.B.tolist(), P0=self.P0.tolist(),
+        )
+
+    def precompute(self) -> Dict[str, Any]:
+        """
+        Monta todos os artefatos derivados da geometria (limites e tabela do
+        espaço de trabalho) de uma vez, antes de a plataforma entrar em uso.
+        Levanta ValueError se a geometria não tiver pose neutra válida.
+        """
+        t0 = time.perf_counter()
+        limits = self.compute_limits()
+        ws = self.workspace()
+        return {"limits_ms": limits["compute_ms"], "workspace_ms": ws.build_ms,
+                "total_ms": (time.perf_counter() - t0) * 1000.0}
 
     def inverse_kinematics(self, x=0, y=0, z=None, roll=0, pitch=0, yaw=0):
         # Define altura padrão se 'z' não for passado
@@ -207,6 +514,317 @@ class StewartPlatform:
         # P → pontos móveis (p + R b_i)
         return L, bool(valid), P
 
+    # ---------- Cinemática inversa em lote (vetorizada) ----------
+    @staticmethod
+    def rotation_matrices(roll, pitch, yaw) -> np.ndarray:
+        """
+        Matrizes de rotação Euler ZYX (yaw → pitch → roll) para N ângulos de uma vez.
+        Equivalente a R.from_euler('ZYX', [yaw, pitch, roll], degrees=True).as_matrix(),
+        mas sem criar um objeto Rotation por pose.
+
+        Ângulos em GRAUS, arrays de shape (N,). Retorna array (N, 3, 3).
+        """
+        r = np.radians(np.asarray(roll, dtype=float))
+        p = np.radians(np.asarray(pitch, dtype=float))
+        y = np.radians(np.asarray(yaw, dtype=float))
+        cr, sr = np.cos(r), np.sin(r)
+        cp, sp = np.cos(p), np.sin(p)
+        cy, sy = np.cos(y), np.sin(y)
+
+        Rm = np.empty(r.shape + (3, 3), dtype=float)
+        # Rz(yaw) @ Ry(pitch) @ Rx(roll)
+        Rm[..., 0, 0] = cy * cp
+        Rm[..., 0, 1] = cy * sp * sr - sy * cr
+        Rm[..., 0, 2] = cy * sp * cr + sy * sr
+        Rm[..., 1, 0] = sy * cp
+        Rm[..., 1, 1] = sy * sp * sr + cy * cr
+        Rm[..., 1, 2] = sy * sp * cr - cy * sr
+        Rm[..., 2, 0] = -sp
+        Rm[..., 2, 1] = cp * sr
+        Rm[..., 2, 2] = cp * cr
+        return Rm
+
+    def inverse_kinematics_batch(self, poses):
+        """
+        Cinemática inversa para N poses de uma vez.
+
+        poses: array (N, 6) com colunas [x, y, z, roll, pitch, yaw] (mm / graus).
+               z = NaN usa a altura padrão h0 (igual a z=None em inverse_kinematics).
+
+        Retorna:
+        - L:     (N, 6)    comprimentos absolutos dos atuadores
+        - valid: (N,)      máscara booleana (todos os atuadores dentro do curso)
+        - P:     (N, 6, 3) pontos da plataforma móvel no referencial da base
+        """
+        poses = np.array(poses, dtype=float, ndmin=2)
+        if poses.ndim != 2 or poses.shape[1] != 6:
+            raise ValueError(f"poses deve ter shape (N, 6), recebido {poses.shape}")
+
+        z = poses[:, 2]
+        z[np.isnan(z)] = self.h0
+
+        # R para todas as poses: (N, 3, 3)
+        Rm = self.rotation_matrices(poses[:, 3], poses[:, 4], poses[:, 5])
+        # P_i = p + R b_i  → (N, 6, 3)
+        P = np.einsum('nij,kj->nki', Rm, self.P0) + poses[:, None, :3]
+        # s_i = P_i - a_i  → ||s_i||
+        L = np.linalg.norm(P - self.B, axis=2)
+        valid = np.all((L >= self.stroke_min) & (L <= self.stroke_max), axis=1)
+        return L, valid, P
+
+    # ---------- Jacobiano das pernas e proximidade de singularidade ----------
+    def leg_jacobian_batch(self, poses, L: np.ndarray, P: np.ndarray) -> np.ndarray:
+        """
+        Jacobiano inverso das pernas (dL = J · [dp, ω·char_length]) a partir do resultado
+        de inverse_kinematics_batch. Linha i = [u_i, (R b_i × u_i) / char_length], com
+        u_i o versor do atuador i. poses (N, 6), L (N, 6), P (N, 6, 3) → (N, 6, 6).
+        """
+        poses = np.array(poses, dtype=float, ndmin=2)
+        u = (P - self.B) / L[..., None]
+        Rb = P - poses[:, None, :3]  # R b_i
+        return np.concatenate([u, np.cross(Rb, u) / self.char_length], axis=2)
+
+    def conditioning_from_ik(self, poses, L: np.ndarray, P: np.ndarray):
+        """
+        Número de condição de J e destreza (1/cond, em [0, 1]) por pose.
+        cond alto = pequenos erros de comprimento viram grandes erros de pose.
+        Retorna (cond (N,), dexterity (N,), near_singular (N,)).
+        """
+        sv = np.linalg.svd(self.leg_jacobian_batch(poses, L, P), compute_uv=False)
+        dexterity = sv[:, -1] / sv[:, 0]
+        cond = sv[:, 0] / np.maximum(sv[:, -1], 1e-12)  # finito para caber em JSON
+        return cond, dexterity, dexterity < DEXTERITY_MIN
+
+    def conditioning_batch(self, poses):
+        """
+        IK em lote + condicionamento: (L, valid, P, cond, dexterity, near_singular).
+        Barato o bastante para rodar a cada tick de movimento (SVD 6x6 vetorizada).
+        """
+        poses = np.array(poses, dtype=float, ndmin=2)
+        L, valid, P = self.inverse_kinematics_batch(poses)
+        cond, dexterity, near_singular = self.conditioning_from_ik(poses, L, P)
+        return L, valid, P, cond, dexterity, near_singular
+
+    def conditioning(self, pose, L: np.ndarray, P: np.ndarray) -> Dict[str, Any]:
+        """Condicionamento de uma única pose [x, y, z, roll, pitch, yaw] (para respostas/telemetria)."""
+        cond, dexterity, near_singular = self.conditioning_from_ik(
+            pose, np.asarray(L, dtype=float)[None], np.asarray(P, dtype=float)[None]
+        )
+        return {"condition_number": float(cond[0]), "dexterity": float(dexterity[0]),
+                "near_singular": bool(near_singular[0])}
+
+    @staticmethod
+    def leg_rates(lengths: np.ndarray, dt: float):
+        """
+        Velocidade (mm/s) e aceleração (mm/s²) de cada perna ao longo de uma trajetória
+        amostrada em passo constante dt. lengths (N, 6) → (v (N, 6), a (N, 6)).
+        Diferenças centrais no interior e de um lado nas pontas (np.gradient).
+        """
+        lengths = np.asarray(lengths, dtype=float)
+        if lengths.ndim != 2 or lengths.shape[1] != 6:
+            raise ValueError(f"lengths deve ter shape (N, 6), recebido {lengths.shape}")
+        if len(lengths) < 3:
+            zeros = np.zeros_like(lengths)
+            return zeros, zeros
+        v = np.gradient(lengths, dt, axis=0)
+        a = np.gradient(v, dt, axis=0)
+        return v, a
+
+    def stroke_margins(self, lengths: np.ndarray) -> np.ndarray:
+        """
+        Margem de curso (mm) de cada pose: menor folga entre qualquer atuador e o batente
+        mais próximo. Positiva = pose válida; negativa = quanto falta/sobra de curso.
+        lengths (..., 6) → (...)
+        """
+        lengths = np.asarray(lengths, dtype=float)
+        return np.min(np.minimum(lengths - self.stroke_min, self.stroke_max - lengths), axis=-1)
+
+    # ---------- Limites geométricos (substitui find_h0.py / find_z_limits.py) ----------
+    def _margin_at(self, pose: np.ndarray) -> float:
+        L, _, _ = self.inverse_kinematics_batch(pose)
+        return float(self.stroke_margins(L)[0])
+
+    def neutral_height(self, base_pose: Optional[np.ndarray] = None) -> float:
+        """
+        Altura neutra: z com a maior margem de curso (atuadores mais perto do meio do curso)
+        mantendo x, y e ângulos de base_pose (padrão: x=y=0, ângulos nulos).
+        Amostragem vetorizada de z seguida de refinamento escalar limitado.
+        """
+        center = np.zeros(6) if base_pose is None else np.array(base_pose, dtype=float)
+        zs = np.linspace(0.0, 2.0 * self.stroke_max, LIMITS_SAMPLES)
+        poses = np.tile(center, (len(zs), 1))
+        poses[:, 2] = zs
+        L, valid, _ = self.inverse_kinematics_batch(poses)
+        if not valid.any():
+            raise ValueError("Geometria sem altura válida para esta pose: verifique h0/stroke_min/stroke_max")
+        i = int(np.argmax(self.stroke_margins(L)))
+        lo, hi = zs[max(i - 1, 0)], zs[min(i + 1, len(zs) - 1)]
+
+        def neg_margin(z):
+            p = center.copy()
+            p[2] = z
+            return -self._margin_at(p)
+
+        res = minimize_scalar(neg_margin, bounds=(lo, hi), method="bounded",
+                              options={"xatol": LIMITS_XTOL})
+        return float(res.x)
+
+    def _axis_limits(self, center: np.ndarray, k: int) -> Tuple[float, float]:
+        """
+        (min, max) do eixo k variando só ele a partir de center: amostragem vetorizada
+        acha o trecho válido contínuo que contém center e brentq refina cada borda.
+        """
+        span = LIMITS_SPANS[k]
+        if span is None:
+            samples = np.linspace(0.0, 2.0 * self.stroke_max, LIMITS_SAMPLES)
+        else:
+            samples = center[k] + np.linspace(-span, span, LIMITS_SAMPLES)
+        poses = np.tile(center, (len(samples), 1))
+        poses[:, k] = samples
+        L, _, _ = self.inverse_kinematics_batch(poses)
+        margin = self.stroke_margins(L)
+
+        i0 = int(np.argmin(np.abs(samples - center[k])))
+        lo = hi = i0
+        while lo > 0 and margin[lo - 1] >= 0:
+            lo -= 1
+        while hi < len(samples) - 1 and margin[hi + 1] >= 0:
+            hi += 1
+
+        def f(v):
+            p = center.copy()
+            p[k] = v
+            return self._margin_at(p)
+
+        v_lo = brentq(f, samples[lo - 1], samples[lo], xtol=LIMITS_XTOL) if lo > 0 else samples[lo]
+        v_hi = brentq(f, samples[hi], samples[hi + 1], xtol=LIMITS_XTOL) if hi < len(samples) - 1 else samples[hi]
+        return float(v_lo), float(v_hi)
+
+    def compute_limits(self, base_pose: Optional[Dict[str, Optional[float]]] = None) -> Dict[str, Any]:
+        """
+        Limites geométricos a partir de uma pose base (padrão: pose neutra):
+        z_min/z_max, altura neutra e excursão máxima de cada eixo variando um por vez.
+        Resultado em cache por geometria e pose base.
+        """
+        base_pose = base_pose or {}
+        center = np.array([float(base_pose.get(a) or 0.0) for a in POSE_AXES])
+        resolve_z = base_pose.get("z") is None
+
+        # Chave com z=None quando a altura é a neutra: acerto no cache não paga a busca da altura
+        key = tuple(None if resolve_z and k == 2 else v for k, v in enumerate(np.round(center, 6).tolist()))
+        with self._workspace_lock:
+            if key in self._limits_cache:
+                return self._limits_cache[key]
+        neutral_z = self.neutral_height(center)
+        if resolve_z:
+            center[2] = neutral_z
+
+        if self._margin_at(center) < 0:
+            raise ValueError(f"Pose base fora do curso dos atuadores: {dict(zip(POSE_AXES, center.tolist()))}")
+
+        t0 = time.perf_counter()
+        axes = {}
+        for k, name in enumerate(POSE_AXES):
+            v_lo, v_hi = self._axis_limits(center, k)
+            axes[name] = {
+                "min": v_lo, "max": v_hi,
+                "neg": float(center[k] - v_lo),  # excursão disponível para baixo
+                "pos": float(v_hi - center[k]),  # excursão disponível para cima
+            }
+        limits = {
+            "base_pose": dict(zip(POSE_AXES, center.tolist())),
+            "h0": self.h0,
+            "stroke_min": self.stroke_min,
+            "stroke_max": self.stroke_max,
+            "z_min": axes["z"]["min"],
+            "z_max": axes["z"]["max"],
+            "neutral_z": neutral_z,
+            "margin_mm": self._margin_at(center),
+            "axes": axes,
+            "compute_ms": (time.perf_counter() - t0) * 1000.0,
+        }
+        with self._workspace_lock:
+            self._limits_cache[key] = limits
+        return limits
+
+    def workspace(self) -> "WorkspaceIndex":
+        """Índice do espaço de trabalho desta geometria (montado uma vez, na primeira chamada)."""
+        with self._workspace_lock:
+            if self._workspace is None:
+                self._workspace = WorkspaceIndex(self)
+            return self._workspace
+
+    def workspace_slice(self, ax1: str, ax2: str, fixed: Dict[str, float],
+                        range1: Optional[Tuple[float, float]] = None,
+                        range2: Optional[Tuple[float, float]] = None,
+                        n1: int = 61, n2: int = 61) -> Dict[str, Any]:
+        """
+        Região alcançável sobre dois eixos de pose (ex.: x-y em z/roll/pitch/yaw fixos,
+        ou roll-pitch em uma altura), calculada com IK exata em lote.
+
+        fixed: valores dos outros eixos (faltando → pose neutra do workspace).
+        range1/range2: (min, max) de cada eixo (padrão: limites da grade do workspace).
+        Resultados ficam em cache LRU por geometria e parâmetros.
+        """
+        if ax1 not in POSE_AXES or ax2 not in POSE_AXES or ax1 == ax2:
+            raise ValueError(f"Eixos devem ser dois distintos entre: {', '.join(POSE_AXES)}")
+        for n in (n1, n2):
+            if not 2 <= n <= WORKSPACE_SLICE_MAX_POINTS:
+                raise ValueError(f"Resolução deve estar entre 2 e {WORKSPACE_SLICE_MAX_POINTS}")
+
+        ws = self.workspace()
+        k1, k2 = POSE_AXES.index(ax1), POSE_AXES.index(ax2)
+        center = ws.neutral.copy()
+        for k, name in enumerate(POSE_AXES):
+            if fixed.get(name) is not None:
+                center[k] = float(fixed[name])
+        if range1 is None:
+            range1 = (float(ws.axes[k1][0]), float(ws.axes[k1][-1]))
+        if range2 is None:
+            range2 = (float(ws.axes[k2][0]), float(ws.axes[k2][-1]))
+
+        key = (ax1, ax2, int(n1), int(n2),
+               round(range1[0], 6), round(range1[1], 6),
+               round(range2[0], 6), round(range2[1], 6),
+               tuple(np.round(np.delete(center, [k1, k2]), 6).tolist()))
+        with self._workspace_lock:
+            hit = self._slice_cache.get(key)
+            if hit is not None:
+                self._slice_cache.move_to_end(key)
+                return {**hit, "cached": True}
+
+        t0 = time.perf_counter()
+        v1 = np.linspace(range1[0], range1[1], n1)
+        v2 = np.linspace(range2[0], range2[1], n2)
+        poses = np.tile(center, (n1 * n2, 1))
+        g1, g2 = np.meshgrid(v1, v2, indexing='ij')
+        poses[:, k1] = g1.ravel()
+        poses[:, k2] = g2.ravel()
+        L, valid, _ = self.inverse_kinematics_batch(poses)
+        margin = self.stroke_margins(L).reshape(n1, n2)
+        valid = valid.reshape(n1, n2)
+
+        bounds = {}
+        for name, values, mask in ((ax1, v1, valid.any(axis=1)), (ax2, v2, valid.any(axis=0))):
+            bounds[name] = ({"min": float(values[mask][0]), "max": float(values[mask][-1])}
+                            if mask.any() else {"min": None, "max": None})
+
+        result = {
+            "axes": [ax1, ax2],
+            "values1": v1.tolist(),
+            "values2": v2.tolist(),
+            "fixed": {name: float(center[k]) for k, name in enumerate(POSE_AXES) if k not in (k1, k2)},
+            "margin_mm": margin.tolist(),   # [i1][i2]; contorno 0 = limite alcançável
+            "valid": valid.tolist(),
+            "reachable_fraction": float(valid.mean()),
+            "bounds": bounds,               # caixa envolvente da região alcançável
+            "compute_ms": (time.perf_counter() - t0) * 1000.0,
+        }
+        with self._workspace_lock:
+            self._slice_cache[key] = result
+            while len(self._slice_cache) > WORKSPACE_SLICE_CACHE_SIZE:
+                self._slice_cache.popitem(last=False)
+        return {**result, "cached": False}
 
     def stroke_percentages(self, lengths: np.ndarray):
         rng = self.stroke_max - self.stroke_min
@@ -220,7 +838,8 @@ class StewartPlatform:
     def estimate_pose_from_lengths(
             self,
             lengths_abs: np.ndarray,
-            x0: Optional[np.ndarray] = None
+            x0: Optional[np.ndarray] = None,
+            method: str = "lsq"
         ):
         """
         Estima a POSE da plataforma (cinemática direta numérica) a partir dos comprimentos
@@ -239,8 +858,36 @@ class StewartPlatform:
         Vars de otimização:
             x = [x, y, z, roll, pitch, yaw]
         (ângulos em GRAUS para facilitar interface; internamente convertidos p/ matriz R)
+
+        method: "lsq" (scipy least_squares) ou "newton" (Jacobiano analítico).
+        Para obter também iterações/tempo de solução use solve_forward_kinematics.
+        """
+        pose, P, _ = self.solve_forward_kinematics(lengths_abs, x0=x0, method=method)
+        return pose, P
+
+    def solve_forward_kinematics(
+            self,
+            lengths_abs: np.ndarray,
+            x0: Optional[np.ndarray] = None,
+            method: str = "newton"
+        ):
         """
+        Cinemática direta com motor selecionável.
 
+        - "newton": Gauss-Newton/Levenberg-Marquardt com resíduos fechados e Jacobiano
+          analítico 6x6, partindo de x0 (warm start). Se não convergir ou sair dos limites
+          FK_BOUNDS, cai para o least_squares.
+        - "lsq": scipy least_squares (Jacobiano por diferenças finitas).
+
+        Retorna (pose, P, info):
+        - pose: dict x,y,z,roll,pitch,yaw (ou None se falhar)
+        - P: array 6x3 dos pontos móveis (ou None)
+        - info: dict com method, iterations, solve_ms, residual_mm, converged, fallback
+        """
+        if method not in FK_METHODS:
+            raise ValueError(f"Método FK inválido: {method}. Use: {', '.join(FK_METHODS)}")
+
+        lengths_abs = np.asarray(lengths_abs, dtype=float)
         # Se não for passado chute inicial, começa da pose "neutra":
         # - x = 0, y = 0
         # - z = h0 (altura nominal)
@@ -248,6 +895,127 @@ class StewartPlatform:
         if x0 is None:
             x0 = np.array([0.0, 0.0, self.h0, 0.0, 0.0, 0.0], dtype=float)
 
+        t0 = time.perf_counter()
+        info = {"method": method, "iterations": 0, "solve_ms": 0.0,
+                "residual_mm": None, "converged": False, "fallback": False}
+
+        x = None
+        if method == "newton":
+            x, iterations, converged = self._fk_newton(lengths_abs, x0)
+            info["iterations"] = iterations
+            if not converged:
+                # Fallback: least_squares a partir do mesmo chute
+                x = None
+                info["fallback"] = True
+
+        if x is None:
+            res = self._fk_least_squares(lengths_abs, x0)
+            info["iterations"] += int(res.nfev) if res is not None else 0
+            if res is not None:
+                x = res.x
+
+        info["solve_ms"] = (time.perf_counter() - t0) * 1000.0
+        if x is None:
+            return None, None, info
+
+        # ---------------------------
+        # Recalcula P para a solução ótima (útil p/ mandar pro frontend)
+        # ---------------------------
+        Rm = self.rotation_matrices(x[3], x[4], x[5])
+        P = (self.P0 @ Rm.T) + x[:3]
+        info["residual_mm"] = float(np.max(np.abs(np.linalg.norm(P - self.B, axis=1) - lengths_abs)))
+        info["converged"] = True
+
+        # Monta dicionário amigável com a pose estimada
+        pose = dict(
+            x=float(x[0]),
+            y=float(x[1]),
+            z=float(x[2]),
+            roll=float(x[3]),
+            pitch=float(x[4]),
+            yaw=float(x[5])
+        )
+        # Retorna:
+        # - pose: dicionário com x,y,z,roll,pitch,yaw
+        # - P: array 6x3 com coordenadas 3D dos pontos móveis
+        # - info: métricas do solver
+        return pose, P, info
+
+    def _fk_residuals_jacobian(self, q: np.ndarray, lengths_abs: np.ndarray):
+        """
+        Resíduos fechados r_i = ||p + R b_i - a_i|| - L_i e Jacobiano analítico dr/dq (6x6).
+
+        Com u_i = s_i / ||s_i|| (direção do atuador):
+            dr_i/dp     = u_i
+            dr_i/dangle = u_i · (dR/dangle b_i)   (ângulos em graus → fator pi/180)
+        """
+        r, p, y = np.radians(q[3:6])
+        cr, sr = cos(r), sin(r)
+        cp, sp = cos(p), sin(p)
+        cy, sy = cos(y), sin(y)
+
+        Rx = np.array([[1, 0, 0], [0, cr, -sr], [0, sr, cr]])
+        Ry = np.array([[cp, 0, sp], [0, 1, 0], [-sp, 0, cp]])
+        Rz = np.array([[cy, -sy, 0], [sy, cy, 0], [0, 0, 1]])
+        dRx = np.array([[0, 0, 0], [0, -sr, -cr], [0, cr, -sr]])
+        dRy = np.array([[-sp, 0, cp], [0, 0, 0], [-cp, 0, -sp]])
+        dRz = np.array([[-sy, -cy, 0], [cy, -sy, 0], [0, 0, 0]])
+
+        RzRy = Rz @ Ry
+        Rm = RzRy @ Rx
+        P = (self.P0 @ Rm.T) + q[:3]
+        S = P - self.B
+        Lhat = np.linalg.norm(S, axis=1)
+        U = S / Lhat[:, None]
+
+        J = np.empty((6, 6))
+        J[:, :3] = U
+        deg = np.pi / 180.0
+        J[:, 3] = np.einsum('ij,ij->i', U, self.P0 @ (RzRy @ dRx).T) * deg
+        J[:, 4] = np.einsum('ij,ij->i', U, self.P0 @ (Rz @ dRy @ Rx).T) * deg
+        J[:, 5] = np.einsum('ij,ij->i', U, self.P0 @ (dRz @ Ry @ Rx).T) * deg
+        return Lhat - lengths_abs, J
+
+    def _fk_newton(self, lengths_abs: np.ndarray, x0: np.ndarray,
+                   max_iter: int = FK_NEWTON_MAX_ITER, tol: float = FK_NEWTON_TOL):
+        """
+        Passos de Newton amortecidos (Levenberg-Marquardt) com Jacobiano analítico.
+        Retorna (x, iterações, convergiu).
+        """
+        q = np.array(x0, dtype=float)
+        r, J = self._fk_residuals_jacobian(q, lengths_abs)
+        cost = float(r @ r)
+        lam = 1e-6
+
+        for it in range(1, max_iter + 1):
+            A = J.T @ J
+            g = J.T @ r
+            try:
+                delta = np.linalg.solve(A + lam * np.diag(np.diag(A)), -g)
+            except np.linalg.LinAlgError:
+                return q, it, False
+
+            q_new = q + delta
+            r_new, J_new = self._fk_residuals_jacobian(q_new, lengths_abs)
+            cost_new = float(r_new @ r_new)
+
+            if cost_new <= cost:
+                q, r, J, cost = q_new, r_new, J_new, cost_new
+                lam = max(lam * 0.1, 1e-12)
+                if np.max(np.abs(delta)) < tol or np.max(np.abs(r)) < tol:
+                    break
+            else:
+                # Passo rejeitado: aumenta amortecimento
+                lam *= 10.0
+        else:
+            return q, max_iter, False
+
+        lo, hi = self.FK_BOUNDS
+        in_bounds = bool(np.all(q >= lo) and np.all(q <= hi))
+        return q, it, in_bounds
+
+    def _fk_least_squares(self, lengths_abs: np.ndarray, x0: np.ndarray):
+        """Solver de referência (scipy least_squares). Retorna o OptimizeResult ou None."""
         # ---------------------------
         # Função de resíduos para o least_squares
         # ---------------------------
@@ -277,16 +1045,16 @@ class StewartPlatform:
             return Lhat - lengths_abs
 
         try:
+            # O least_squares exige chute inicial dentro dos limites
+            lo, hi = self.FK_BOUNDS
+            x0 = np.clip(x0, lo, hi)
             # ---------------------------
             # Chamada do solver de mínimos quadrados
             # ---------------------------
             res = least_squares(
                 residuals,   # função de resíduos
                 x0,          # chute inicial
-                bounds=(
-                    [-100, -100, 300, -30, -30, -30],  # limites inferiores  [x,y,z,roll,pitch,yaw]
-                    [ 100,  100, 600,  30,  30,  30]   # limites superiores
-                ),
+                bounds=self.FK_BOUNDS,  # limites [x,y,z,roll,pitch,yaw]
                 ftol=1e-6,   # tolerância no valor da função
                 xtol=1e-6,   # tolerância nas variáveis
                 gtol=1e-6,   # tolerância no gradiente
@@ -296,114 +1064,1502 @@ class StewartPlatform:
             # Se o otimizador não convergir, aborta e retorna None
             if not res.success:
                 print(f"   ⚠️ least_squares não convergiu: {res.message}")
-                return None, None
-
-            # Solução encontrada: x* = [x, y, z, roll, pitch, yaw]
-            x = res.x
-
-            # Monta dicionário amigável com a pose estimada
-            pose = dict(
-                x=float(x[0]),
-                y=float(x[1]),
-                z=float(x[2]),
-                roll=float(x[3]),
-                pitch=float(x[4]),
-                yaw=float(x[5])
-            )
+                return None
+            return res
 
-            # ---------------------------
-            # Recalcula P para a solução ótima (útil p/ mandar pro frontend)
-            # ---------------------------
-            T = np.array([x[0], x[1], x[2]])
+        except Exception as e:
+            # Qualquer erro inesperado na otimização é tratado aqui
+            print(f"   ❌ Exceção em estimate_pose_from_lengths: {e}")
+            return None
 
-            # Aqui mantém a mesma convenção: Euler ZYX (yaw, pitch, roll)
-            Rm = R.from_euler('ZYX', [x[5], x[4], x[3]], degrees=True).as_matrix()
+# -------------------- Workspace --------------------
+class WorkspaceIndex:
+    """
+    Espaço de trabalho alcançável pré-calculado para uma geometria.
+
+    Grade regular 6D (x, y, z, roll, pitch, yaw) com os 6 comprimentos de atuador de
+    cada nó, obtidos por IK em lote. Consultas respondem "a pose é alcançável e quanto
+    curso sobra" interpolando (multilinear) os comprimentos na tabela e aplicando os
+    limites de curso. Os comprimentos variam suavemente com a pose, então interpolá-los
+    erra bem menos que interpolar a margem (que tem quinas), mas ainda alguns mm perto
+    da borda: a tabela só descarta poses; as que ela aceita são confirmadas pela IK exata
+    em lote (sem falso positivo). Fora da grade a pose é tratada como não alcançável.
+    """
+    def __init__(self, platform: "StewartPlatform", points: int = WORKSPACE_GRID_POINTS):
+        t0 = time.perf_counter()
+        self._platform = platform
+        self.h0 = platform.h0
+        self.stroke_min = platform.stroke_min
+        self.stroke_max = platform.stroke_max
+
+        # Limites da grade: alcance de cada eixo isolado a partir da pose neutra, com folga
+        limits = platform.compute_limits()
+        self.neutral = np.array([limits["base_pose"][a] for a in POSE_AXES])
+        extents = [(limits["axes"][a]["min"], limits["axes"][a]["max"]) for a in POSE_AXES]
+        self.axes = tuple(
+            np.linspace(lo - WORKSPACE_RANGE_PAD * (hi - lo), hi + WORKSPACE_RANGE_PAD * (hi - lo), points)
+            for lo, hi in extents
+        )
 
-            # Pontos da plataforma móvel no referencial da base com a pose estimada
-            P = (self.P0 @ Rm.T) + T
+        # Comprimentos em cada nó da grade (float32) e margem de curso derivada
+        grid = np.stack(np.meshgrid(*self.axes, indexing='ij'), axis=-1).reshape(-1, 6)
+        lengths = np.empty((len(grid), 6), dtype=np.float32)
+        for i in range(0, len(grid), WORKSPACE_CHUNK):
+            L, _, _ = platform.inverse_kinematics_batch(grid[i:i + WORKSPACE_CHUNK])
+            lengths[i:i + WORKSPACE_CHUNK] = L
+        self.lengths = lengths.reshape((points,) * 6 + (6,))
+        self.margin = platform.stroke_margins(self.lengths).astype(np.float32)
+
+        self._interp = RegularGridInterpolator(
+            self.axes, self.lengths, method="linear", bounds_error=False, fill_value=np.nan
+        )
+        self.build_ms = (time.perf_counter() - t0) * 1000.0
+
+    def query(self, poses):
+        """
+        poses (N, 6) → (reachable (N,), margin_mm (N,)).
+        margin_mm é NaN para poses fora da grade; exata nas poses aceitas pela tabela e
+        interpolada nas demais.
+        """
+        poses = np.array(poses, dtype=float, ndmin=2)
+        lengths = self._interp(poses)
+        margin = np.min(np.minimum(lengths - self.stroke_min, self.stroke_max - lengths), axis=-1)
+        reachable = np.nan_to_num(margin, nan=-1.0) >= 0.0
+        idx = np.flatnonzero(reachable)
+        if idx.size:
+            # Interpolação erra até ~3 mm perto da borda: confirma os positivos com a IK exata
+            L, valid, _ = self._platform.inverse_kinematics_batch(poses[idx])
+            margin[idx] = self._platform.stroke_margins(L)
+            reachable[idx] = valid
+        return reachable, margin
+
+    def axis_ranges(self, center: Optional[np.ndarray] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Faixa alcançável (pela tabela) ao longo de cada eixo, variando só aquele eixo
+        a partir de center (padrão: pose neutra).
+        """
+        if center is None:
+            center = self.neutral
+        ranges = {}
+        for k, name in enumerate(POSE_AXES):
+            samples = np.linspace(self.axes[k][0], self.axes[k][-1], 401)
+            poses = np.tile(center, (len(samples), 1))
+            poses[:, k] = samples
+            reachable, _ = self.query(poses)
+            if reachable.any():
+                ranges[name] = {"min": float(samples[reachable][0]), "max": float(samples[reachable][-1])}
+            else:
+                ranges[name] = {"min": None, "max": None}
+        return ranges
 
-            # Retorna:
-            # - pose: dicionário com x,y,z,roll,pitch,yaw
-            # - P: array 6x3 com coordenadas 3D dos pontos móveis
-            return pose, P
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "h0": self.h0,
+            "stroke_min": self.stroke_min,
+            "stroke_max": self.stroke_max,
+            "axes": {
+                name: {"min": float(a[0]), "max": float(a[-1]), "points": int(len(a))}
+                for name, a in zip(POSE_AXES, self.axes)
+            },
+            "nodes": int(self.margin.size),
+            "reachable_fraction": float(np.mean(self.margin >= 0)),
+            "max_margin_mm": float(self.margin.max()),
+            "neutral_z": float(self.neutral[2]),
+            "axis_ranges": self.axis_ranges(),
+            "build_ms": self.build_ms,
+        }
 
-        except Exception as e:
-            # Qualquer erro inesperado na otimização é tratado aqui
-            print(f"   ❌ Exceção em estimate_pose_from_lengths: {e}")
-            return None, None
+# -------------------- Perfis de geometria --------------------
+def _geometry_profile_path(name: str) -> str:
+    if not GEOMETRY_PROFILE_NAME_RE.match(name or ""):
+        raise ValueError(f"Nome de perfil inválido: '{name}' (use letras, números, '-' e '_')")
+    return os.path.join(GEOMETRY_PROFILES_DIR, f"{name}.json")
+
+def list_geometry_profiles() -> List[str]:
+    """Nomes dos perfis de geometria salvos em GEOMETRY_PROFILES_DIR"""
+    if not os.path.isdir(GEOMETRY_PROFILES_DIR):
+        return []
+    return sorted(f[:-5] for f in os.listdir(GEOMETRY_PROFILES_DIR)
+                  if f.endswith(".json") and GEOMETRY_PROFILE_NAME_RE.match(f[:-5]))
+
+def load_geometry_profile(name: str) -> GeometryProfile:
+    """Lê um perfil do disco (ValueError se não existir ou for inválido)"""
+    path = _geometry_profile_path(name)
+    if not os.path.isfile(path):
+        raise ValueError(f"Perfil de geometria '{name}' não encontrado")
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data["name"] = name  # o nome do arquivo manda
+    return GeometryProfile(**data)
+
+def save_geometry_profile(profile: GeometryProfile) -> str:
+    """Grava o perfil em GEOMETRY_PROFILES_DIR (escrita atômica). Retorna o caminho."""
+    path = _geometry_profile_path(profile.name)
+    os.makedirs(GEOMETRY_PROFILES_DIR, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(model_to_dict(profile), f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+    return path
+
+platform = StewartPlatform(h0=432, stroke_min=500, stroke_max=680, home_z=520)  # 182mm de curso útil
+
+# -------------------- Calibração cinemática --------------------
+def load_calibration_csv(path: str):
+    """
+    Lê frames de calibração de um CSV (delimitador CSV_DELIM) com colunas Y1..Y6 e,
+    opcionalmente, x;y;z;roll;pitch;yaw (pose conhecida) e qw;qx;qy;qz (IMU).
+    Retorna (Y (N, 6), poses (N, 6) com NaN se ausente, quats (N, 4) com NaN se ausente).
+    """
+    if not os.path.isfile(path):
+        raise ValueError(f"Arquivo não encontrado: {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        header = f.readline().strip().strip('"').split(CSV_DELIM)
+    data = np.genfromtxt(path, delimiter=CSV_DELIM, skip_header=1, dtype=float, ndmin=2)
+    col = {name.strip(): i for i, name in enumerate(header)}
+
+    def columns(names):
+        if all(n in col for n in names):
+            return data[:, [col[n] for n in names]]
+        return np.full((len(data), len(names)), np.nan)
+
+    if not all(f"Y{i}" in col for i in range(1, 7)):
+        raise ValueError("CSV de calibração precisa das colunas Y1..Y6")
+    return (columns([f"Y{i}" for i in range(1, 7)]),
+            columns(list(POSE_AXES)),
+            columns(["qw", "qx", "qy", "qz"]))
+
+
+def calibrate_geometry(base: "StewartPlatform", Y, poses=None, quats=None,
+                       prior_mm: float = CALIB_PRIOR_MM, fit_imu_offset: bool = True,
+                       max_nfev: int = CALIB_MAX_NFEV):
+    """
+    Ajusta B e P0 reais a partir de frames gravados, num único least-squares esparso.
+
+    Cada frame traz os cursos medidos (Y, L = stroke_min + Y) e uma referência:
+    - pose conhecida (x..yaw, sem NaN): pose fixa;
+    - só orientação do IMU (quaternion [w,x,y,z]): translação do frame vira incógnita,
+      e um desalinhamento fixo do IMU (roll/pitch/yaw, graus) é ajustado junto.
+    Frames sem referência não informam a geometria e são ignorados.
+
+    Incógnitas: B (18), P0 (18), [offset IMU (3)], translação por frame IMU (3·N).
+    Resíduos: ||t_j + R_j P0_i - B_i|| - L_ij, mais um prior fraco (prior_mm) puxando
+    B/P0 para o CAD, que elimina as liberdades de gauge (deslocar P0 e as translações juntos).
+    Resíduo e Jacobiano são vetorizados; o Jacobiano é montado em COO esparso.
+
+    Retorna (B (6, 3), P0 (6, 3), relatório).
+    """
+    t_start = time.perf_counter()
+    Y = np.array(Y, dtype=float, ndmin=2)
+    if Y.ndim != 2 or Y.shape[1] != 6:
+        raise ValueError(f"Y deve ter shape (N, 6), recebido {Y.shape}")
+    N = len(Y)
+    poses = np.full((N, 6), np.nan) if poses is None else np.array(poses, dtype=float, ndmin=2)
+    quats = np.full((N, 4), np.nan) if quats is None else np.array(quats, dtype=float, ndmin=2)
+
+    L_all = base.stroke_min + Y
+    known = ~np.isnan(poses).any(axis=1) & ~np.isnan(L_all).any(axis=1)
+    imu = ~known & ~np.isnan(quats).any(axis=1) & ~np.isnan(L_all).any(axis=1)
+    n_known, n_imu = int(known.sum()), int(imu.sum())
+    if n_known + n_imu == 0:
+        raise ValueError("Nenhum frame com pose conhecida ou orientação do IMU")
+    fit_offset = fit_imu_offset and n_imu > 0
+
+    L = np.concatenate([L_all[known], L_all[imu]])      # (M, 6)
+    R_known = base.rotation_matrices(poses[known, 3], poses[known, 4], poses[known, 5])
+    t_known = poses[known, :3]
+    q = quats[imu]
+    q = q / np.linalg.norm(q, axis=1, keepdims=True)
+    R_imu = R.from_quat(q[:, [1, 2, 3, 0]]).as_matrix() if n_imu else np.zeros((0, 3, 3))
+
+    theta0 = np.concatenate([base.B.ravel(), base.P0.ravel()])
+    n_geo = theta0.size                         # 36
+    i_off = n_geo                               # offset IMU (3), se ajustado
+    i_t = n_geo + (3 if fit_offset else 0)      # translações dos frames IMU
+    w_prior = 1.0 / prior_mm                    # resíduos de dados em mm (σ ≈ 1)
+
+    def unpack(theta):
+        B = theta[:18].reshape(6, 3)
+        P0 = theta[18:36].reshape(6, 3)
+        off = theta[i_off:i_off + 3] if fit_offset else np.zeros(3)
+        t_imu = theta[i_t:].reshape(n_imu, 3)
+        return B, P0, off, t_imu
+
+    def frames(theta):
+        B, P0, off, t_imu = unpack(theta)
+        R_off = base.rotation_matrices(off[0:1], off[1:2], off[2:3])[0]
+        Rm = np.concatenate([R_known, R_off @ R_imu]) if n_imu else R_known
+        t = np.concatenate([t_known, t_imu])
+        RP = np.einsum('nij,kj->nki', Rm, P0)                     # (M, 6, 3)
+        s = t[:, None, :] + RP - B
+        return s, np.linalg.norm(s, axis=2), Rm, RP
+
+    def residuals(theta):
+        _, Lm, _, _ = frames(theta)
+        return np.concatenate([(Lm - L).ravel(), w_prior * (theta[:n_geo] - theta0)])
+
+    M = n_known + n_imu
+    leg = np.tile(np.arange(6), M)
+    frame = np.repeat(np.arange(M), 6)
+    rows_data = np.arange(M * 6)
+
+    def jacobian(theta):
+        s, Lm, Rm, _ = frames(theta)
+        u = (s / Lm[..., None]).reshape(-1, 3)                    # (M*6, 3)
+        RtU = np.einsum('nji,nj->ni', Rm[frame], u)               # R_j^T u_ij
+        rows, cols, vals = [], [], []
+        for k in range(3):
+            rows += [rows_data, rows_data]
+            cols += [3 * leg + k, 18 + 3 * leg + k]
+            vals += [-u[:, k], RtU[:, k]]
+        if n_imu:
+            sel = frame >= n_known
+            k_imu = frame[sel] - n_known
+            for k in range(3):
+                rows.append(rows_data[sel])
+                cols.append(i_t + 3 * k_imu + k)
+                vals.append(u[sel, k])
+        if fit_offset:
+            # 3 colunas densas nos frames IMU: diferença central (resíduo vetorizado)
+            sel = frame >= n_known
+            for k in range(3):
+                d = np.zeros_like(theta)
+                d[i_off + k] = 1e-6
+                col = (residuals(theta + d) - residuals(theta - d))[:M * 6] / 2e-6
+                rows.append(rows_data[sel])
+                cols.append(np.full(sel.sum(), i_off + k))
+                vals.append(col[sel])
+        rows.append(M * 6 + np.arange(n_geo))
+        cols.append(np.arange(n_geo))
+        vals.append(np.full(n_geo, w_prior))
+        return coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                          shape=(M * 6 + n_geo, theta.size)).tocsr()
+
+    # Translação inicial dos frames IMU: Gauss-Newton em lote (3 incógnitas por frame), geometria CAD
+    t_imu0 = np.tile([0.0, 0.0, base.compute_limits()["neutral_z"]], (n_imu, 1))
+    if n_imu:
+        RP_imu = np.einsum('nij,kj->nki', R_imu, base.P0)
+        L_imu = L_all[imu]
+        for _ in range(10):
+            s = t_imu0[:, None, :] + RP_imu - base.B
+            Lm = np.linalg.norm(s, axis=2)
+            u = s / Lm[..., None]
+            JtJ = np.einsum('nki,nkj->nij', u, u)
+            Jtr = np.einsum('nki,nk->ni', u, Lm - L_imu)
+            t_imu0 -= np.linalg.solve(JtJ, Jtr[..., None])[..., 0]
+
+    x0 = np.concatenate([theta0, np.zeros(3 if fit_offset else 0), t_imu0.ravel()])
+    r0 = residuals(x0)[:M * 6]
+    res = least_squares(residuals, x0, jac=jacobian, method="trf", tr_solver="lsmr",
+                        x_scale="jac", ftol=CALIB_FTOL, max_nfev=max_nfev)
+    r1 = res.fun[:M * 6]
+    B, P0, off, _ = unpack(res.x)
+
+    report = {
+        "frames": N,
+        "frames_known_pose": n_known,
+        "frames_imu": n_imu,
+        "frames_skipped": N - n_known - n_imu,
+        "unknowns": int(res.x.size),
+        "residuals": int(res.fun.size),
+        "jac_nnz": int(res.jac.nnz),
+        "rms_before_mm": float(np.sqrt(np.mean(r0 ** 2))),
+        "rms_after_mm": float(np.sqrt(np.mean(r1 ** 2))),
+        "max_abs_after_mm": float(np.abs(r1).max()),
+        "B_shift_mm": np.linalg.norm(B - base.B, axis=1).tolist(),
+        "P0_shift_mm": np.linalg.norm(P0 - base.P0, axis=1).tolist(),
+        "imu_offset_deg": dict(zip(("roll", "pitch", "yaw"), off.tolist())) if fit_offset else None,
+        "nfev": int(res.nfev),
+        "success": bool(res.success),
+        "solve_ms": (time.perf_counter() - t_start) * 1000.0,
+    }
+    return B, P0, report
+
+
+class CalibrationRecorder:
+    """
+    Grava frames de telemetria (cursos + quaternion do BNO085) para a calibração.
+    Alimentado pela thread de leitura; frames sem quaternion não informam a geometria.
+    """
+
+    def __init__(self, max_frames: int = CALIB_MAX_FRAMES):
+        self.max_frames = max_frames
+        self.active = False
+        self._Y: List[List[float]] = []
+        self._quats: List[List[float]] = []
+        self._lock = threading.Lock()
+        self.started_at: Optional[float] = None
+
+    def start(self):
+        with self._lock:
+            self._Y.clear()
+            self._quats.clear()
+            self.active = True
+            self.started_at = time.time()
 
-platform = StewartPlatform(h0=432, stroke_min=500, stroke_max=680)  # 182mm de curso útil
+    def stop(self):
+        self.active = False
+
+    def add(self, Y: List[float], quaternions: Optional[Dict[str, float]]):
+        if not self.active or quaternions is None:
+            return
+        with self._lock:
+            if len(self._Y) >= self.max_frames:
+                self.active = False
+                return
+            self._Y.append(Y)
+            self._quats.append([quaternions["w"], quaternions["x"], quaternions["y"], quaternions["z"]])
+
+    def arrays(self):
+        with self._lock:
+            return np.array(self._Y, dtype=float).reshape(-1, 6), np.array(self._quats, dtype=float).reshape(-1, 4)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            n = len(self._Y)
+        return {"active": self.active, "frames": n, "max_frames": self.max_frames,
+                "started_at": self.started_at}
+
+calib_recorder = CalibrationRecorder()
 
 # -------------------- WS Manager --------------------
-class WSManager:
+def _json_default(obj):
+    """Tipos NumPy que o encoder não serializa sozinho (escalares, arrays não contíguos)."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Tipo não serializável em JSON: {type(obj).__name__}")
+
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_SERIALIZE_NUMPY
+
+    def encode_ws(obj: dict) -> str:
+        """Mensagem WebSocket em texto JSON (NaN/inf viram null)."""
+        return orjson.dumps(obj, default=_json_default, option=_ORJSON_OPTS).decode()
+else:
+    _json_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=_json_default)
+
+    def encode_ws(obj: dict) -> str:
+        """Mensagem WebSocket em texto JSON (mesmo formato do send_json do Starlette)."""
+        return _json_encoder.encode(obj)
+
+
+_NAN = float("nan")
+
+
+def _bin_plan(layout) -> tuple:
+    """(campo, bit em flags, nº de floats, chaves do dict ou None, NaNs de preenchimento) por bloco."""
+    plan = []
+    for i, (name, spec) in enumerate(layout):
+        if isinstance(spec, int):
+            n, keys = spec, None
+        elif isinstance(spec[0], str):
+            n, keys = len(spec), spec
+        else:
+            n, keys = spec[0] * spec[1], None  # matriz achatada por linhas
+        plan.append((name, 1 << i, n, keys, (_NAN,) * n))
+    return tuple(plan)
+
+
+_WS_BIN_HEADER = struct.Struct("<BBHId")
+_WS_BIN_PLANS = {kind: _bin_plan(layout) for kind, layout in WS_BIN_LAYOUTS.items()}
+_WS_BIN_BODIES = {kind: struct.Struct("<%df" % sum(b[2] for b in plan)) for kind, plan in _WS_BIN_PLANS.items()}
+_WS_BIN_KINDS = {code: kind for kind, code in WS_BIN_TYPES.items()}
+_WS_BIN_FORMATS = {"telemetry": "standard", "telemetry_mpu": "mpu6050", "telemetry_bno085": "bno085"}
+
+
+def encode_ws_binary(obj: dict, seq: int) -> Optional[bytes]:
+    """Mensagem no subprotocolo binário (WS_BIN_LAYOUTS) ou None se o tipo não tiver layout."""
+    kind = obj.get("type")
+    plan = _WS_BIN_PLANS.get(kind)
+    if plan is None:
+        return None
+    flags = 0
+    values: List[float] = []
+    extend = values.extend
+    for name, bit, n, keys, fill in plan:
+        v = obj.get(name)
+        if v is None:
+            extend(fill)
+            continue
+        if keys is not None:
+            block = [v.get(k) for k in keys]
+            if None in block:
+                block = [_NAN if x is None else x for x in block]
+        elif n == 1:
+            values.append(v)
+            flags |= bit
+            continue
+        else:
+            if type(v) is not list:
+                v = np.asarray(v, dtype=float).ravel().tolist()
+            elif v and type(v[0]) is list:
+                v = [x for row in v for x in row]  # matriz 6x3 de pontos
+            if len(v) != n:
+                extend(fill)
+                continue
+            block = v
+        extend(block)
+        flags |= bit
+    header = _WS_BIN_HEADER.pack(WS_BIN_TYPES[kind], WS_BIN_VERSION, flags, seq & 0xFFFFFFFF,
+                                 obj.get("ts") or 0.0)
+    return header + _WS_BIN_BODIES[kind].pack(*values)
+
+
+def decode_ws_binary(data: bytes) -> Dict[str, Any]:
+    """Inverso de encode_ws_binary (ferramentas e testes; o navegador usa DataView/Float32Array)."""
+    code, version, flags, seq, ts = _WS_BIN_HEADER.unpack_from(data)
+    kind = _WS_BIN_KINDS[code]
+    values = _WS_BIN_BODIES[kind].unpack_from(data, _WS_BIN_HEADER.size)
+    out: Dict[str, Any] = {"type": kind, "seq": seq, "ts": ts, "version": version}
+    if kind in _WS_BIN_FORMATS:
+        out["format"] = _WS_BIN_FORMATS[kind]  # implícito no código do tipo
+    pos = 0
+    for (name, spec), (_, bit, n, keys, _) in zip(WS_BIN_LAYOUTS[kind], _WS_BIN_PLANS[kind]):
+        block = list(values[pos:pos + n])
+        pos += n
+        if not flags & bit:
+            out[name] = None
+        elif keys is not None:
+            out[name] = {k: (bool(x) if k == "near_singular" else None if x != x else x)
+                         for k, x in zip(keys, block)}
+        elif isinstance(spec, tuple):
+            cols = spec[1]
+            out[name] = [block[i:i + cols] for i in range(0, n, cols)]
+        elif n == 1:
+            out[name] = bool(block[0]) if name == "near_singular" else block[0]
+        else:
+            out[name] = block
+    return out
+
+
+class _AggStat:
+    """min/máx/soma de um campo numérico (escalar ou lista plana)"""
+    __slots__ = ("mn", "mx", "sum", "n")
+
+    def __init__(self, v):
+        vec = type(v) is list
+        self.mn = list(v) if vec else v
+        self.mx = list(v) if vec else v
+        self.sum = [float(x) for x in v] if vec else float(v)
+        self.n = 1
+
+    def add(self, v):
+        if type(v) is list:
+            if type(self.mn) is not list or len(v) != len(self.mn):
+                return
+            self.mn = [a if a <= b else b for a, b in zip(self.mn, v)]
+            self.mx = [a if a >= b else b for a, b in zip(self.mx, v)]
+            self.sum = [a + b for a, b in zip(self.sum, v)]
+        else:
+            if type(self.mn) is list:
+                return
+            if v < self.mn:
+                self.mn = v
+            elif v > self.mx:
+                self.mx = v
+            self.sum += v
+        self.n += 1
+
+    def result(self) -> Dict[str, Any]:
+        if type(self.sum) is list:
+            mean = [x / self.n for x in self.sum]
+        else:
+            mean = self.sum / self.n
+        return {"min": self.mn, "max": self.mx, "mean": mean}
+
+
+def _is_number(v) -> bool:
+    return type(v) in (int, float)
+
+
+class FrameAggregate:
+    """
+    min/máx/média dos campos numéricos dos frames de um período (decimação "aggregate").
+    Entram números, listas planas de números e dicts desses (pose_live, mpu, quaternions);
+    o resto (texto, None, matrizes de pontos) fica de fora.
+    """
     def __init__(self):
-        self.active: List[WebSocket] = []
-        self.lock = asyncio.Lock()
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self._acc: Dict[str, Any] = {}
+
+    def add(self, msg: dict):
+        self.n += 1
+        self._add(self._acc, msg, WS_AGG_SKIP)
+
+    def _add(self, acc: Dict[str, Any], obj: dict, skip=()):
+        for k, v in obj.items():
+            if k in skip or v is None:
+                continue
+            st = acc.get(k)
+            if type(v) is dict:
+                if st is None:
+                    st = acc[k] = {}
+                if type(st) is dict:
+                    self._add(st, v)
+            elif _is_number(v) or (type(v) is list and v and all(_is_number(x) for x in v)):
+                if st is None:
+                    acc[k] = _AggStat(v)
+                elif type(st) is _AggStat:
+                    st.add(v)
+
+    def result(self) -> Dict[str, Any]:
+        def walk(acc):
+            out = {}
+            for k, st in acc.items():
+                out[k] = walk(st) if type(st) is dict else st.result()
+            return out
+        return {"n": self.n, "fields": walk(self._acc)}
+
+
+class WSClient:
+    """
+    Conexão WebSocket com fila própria e uma task de envio.
+
+    Um cliente lento (aba no Wi-Fi) só atrasa a si mesmo: a fila é limitada em
+    WS_QUEUE_MAX e, cheia, perde a mensagem mais antiga. Tipos em WS_LATEST_TYPES
+    guardam só a mais recente ainda pendente (substituída no lugar, sem crescer a fila).
+    A fila guarda a mensagem já serializada pelo WSManager (texto JSON ou, no subprotocolo
+    binário, bytes), compartilhada entre os clientes com a mesma assinatura
+    (protocolo, tópicos e campos). Tópicos com taxa máxima são
+    decimados aqui: no máximo um frame por período, o mais recente (um timer entrega
+    o último retido quando o fluxo para), opcionalmente com o agregado dos pulados.
+    """
+    def __init__(self, ws: WebSocket, cid: int, maxsize: int = WS_QUEUE_MAX, binary: bool = False):
+        self.ws = ws
+        self.id = cid
+        self.maxsize = int(maxsize)
+        self.binary = binary                   # subprotocolo WS_BIN_SUBPROTOCOL negociado
+        self.pending: deque = deque()          # [t_enfileirado, tipo, texto JSON ou bytes]
+        self._latest: Dict[str, list] = {}     # tipo -> item pendente (WS_LATEST_TYPES)
+        self._wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.connected_at = time.time()
+        self.topics: Optional[frozenset] = None    # None = todos
+        self.fields: Dict[str, Tuple[str, ...]] = {}  # tópico -> campos (ausente = mensagem inteira)
+        self.rates: Dict[str, float] = {}             # tópico -> Hz máximos
+        self.decimation = "latest"
+        self._due: Dict[str, float] = {}              # tópico -> próximo envio (time.monotonic)
+        self._held: Dict[str, tuple] = {}             # tópico -> (último frame retido no período, encoder)
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._aggs: Dict[str, FrameAggregate] = {}
+        self.counters = {"enqueued": 0, "sent": 0, "dropped": 0, "coalesced": 0, "filtered": 0, "decimated": 0,
+                         "max_depth": 0, "lag_sum_s": 0.0, "lag_max_s": 0.0, "lag_last_s": 0.0}
+
+    def start(self, on_error):
+        self.task = asyncio.get_running_loop().create_task(self._sender(on_error))
+
+    def subscribe(self, topics: Optional[List[str]], fields: Optional[Dict[str, List[str]]],
+                  rates: Optional[Dict[str, float]] = None, decimation: str = "latest"):
+        """Troca a assinatura inteira (sem topics = todos os tópicos, sem fields = mensagens inteiras,
+        sem rates = todo frame)."""
+        if decimation not in WS_DECIMATION_MODES:
+            raise ValueError(f"Decimação inválida: {decimation}. Use: {', '.join(WS_DECIMATION_MODES)}")
+        if decimation == "aggregate" and self.binary:
+            raise ValueError(f"Decimação aggregate não cabe no layout fixo de {WS_BIN_SUBPROTOCOL}: use JSON")
+        for topic, hz in (rates or {}).items():
+            if topic not in WS_RATE_TOPICS or (topics is not None and topic not in topics):
+                raise ValueError(f"Taxa para tópico não decimável ou não assinado: {topic}. "
+                                 f"Use: {', '.join(WS_RATE_TOPICS)}")
+            if not hz > 0:
+                raise ValueError(f"Taxa deve ser > 0 Hz ({topic}={hz})")
+        if topics is not None:
+            bad = [t for t in topics if t not in WS_TOPICS]
+            if bad:
+                raise ValueError(f"Tópico inválido: {', '.join(bad)}. Use: {', '.join(WS_TOPICS)}")
+        new_fields = {}
+        for topic, names in (fields or {}).items():
+            if topic not in WS_TOPICS or (topics is not None and topic not in topics):
+                raise ValueError(f"Campos para tópico não assinado: {topic}")
+            new_fields[topic] = ("type",) + tuple(sorted(set(names) - {"type"}))
+        self.topics = frozenset(topics) if topics is not None else None
+        self.fields = new_fields
+        self.cancel_timers()
+        self.rates = {t: float(hz) for t, hz in (rates or {}).items()}
+        self.decimation = decimation
+        self._due.clear()
+        self._held.clear()
+        self._aggs = {t: FrameAggregate() for t in self.rates} if decimation == "aggregate" else {}
+
+    def cancel_timers(self):
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+
+    def offer(self, topic: str, msg: dict, encode):
+        """(loop) Frame de tópico com taxa máxima: sai já se o período venceu, senão fica retido."""
+        agg = self._aggs.get(topic)
+        if agg is not None:
+            agg.add(msg)
+        now = time.monotonic()
+        due = self._due.get(topic, 0.0)
+        if now >= due:
+            if self._held.pop(topic, None) is not None:  # timer atrasado: o frame novo substitui o retido
+                self.counters["decimated"] += 1
+                handle = self._timers.pop(topic, None)
+                if handle is not None:
+                    handle.cancel()
+            self._send_decimated(topic, msg, now, encode)
+            return
+        if topic in self._held:
+            self.counters["decimated"] += 1
+        self._held[topic] = (msg, encode)
+        if topic not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[topic] = loop.call_later(due - now, self._flush, topic)
+
+    def _flush(self, topic: str):
+        self._timers.pop(topic, None)
+        held = self._held.pop(topic, None)
+        if held is not None:
+            self._send_decimated(topic, held[0], time.monotonic(), held[1])
+
+    def _send_decimated(self, topic: str, msg: dict, now: float, encode):
+        period = 1.0 / self.rates[topic]
+        due = self._due.get(topic, 0.0)
+        self._due[topic] = due + period if now - due < period else now + period  # sem rajada após pausa
+        agg = self._aggs.get(topic)
+        if agg is not None:
+            msg = dict(msg, agg=agg.result())
+            agg.reset()
+        data = encode(msg)
+        if data is not None:
+            self.enqueue(msg.get("type"), data)
+
+    def wants(self, topic: str) -> bool:
+        return self.topics is None or topic in self.topics
+
+    def enqueue(self, kind: Optional[str], data):
+        """(loop) Não bloqueia: envio fica com a task do cliente (str = texto, bytes = binário)."""
+        c = self.counters
+        c["enqueued"] += 1
+        now = time.monotonic()
+        if kind in WS_LATEST_TYPES:
+            item = self._latest.get(kind)
+            if item is not None:
+                item[2] = data  # mesma posição na fila; a idade conta a partir da versão nova
+                item[0] = now
+                c["coalesced"] += 1
+                return
+        if len(self.pending) >= self.maxsize:
+            old = self.pending.popleft()
+            if self._latest.get(old[1]) is old:
+                del self._latest[old[1]]
+            c["dropped"] += 1
+        item = [now, kind, data]
+        self.pending.append(item)
+        if kind in WS_LATEST_TYPES:
+            self._latest[kind] = item
+        if len(self.pending) > c["max_depth"]:
+            c["max_depth"] = len(self.pending)
+        self._wake.set()
+
+    async def _sender(self, on_error):
+        c = self.counters
+        try:
+            while True:
+                if not self.pending:
+                    self._wake.clear()
+                    await self._wake.wait()
+                    continue
+                item = self.pending.popleft()
+                kind = item[1]
+                if self._latest.get(kind) is item:
+                    del self._latest[kind]
+                data = item[2]
+                if type(data) is bytes:
+                    await self.ws.send_bytes(data)
+                else:
+                    await self.ws.send_text(data)
+                lag = time.monotonic() - item[0]
+                c["sent"] += 1
+                c["lag_sum_s"] += lag
+                c["lag_last_s"] = lag
+                if lag > c["lag_max_s"]:
+                    c["lag_max_s"] = lag
+        except Exception as e:  # CancelledError (disconnect) não passa por aqui
+            print(f"   ❌ Erro ao enviar (cliente {self.id}): {e}")
+            on_error(self)
+
+    def stats(self) -> Dict[str, Any]:
+        c = self.counters
+        client = getattr(self.ws, "client", None)
+        return {
+            "id": self.id,
+            "client": f"{client[0]}:{client[1]}" if client else None,
+            "connected_s": time.time() - self.connected_at,
+            "protocol": WS_BIN_SUBPROTOCOL if self.binary else "json",
+            "queue_depth": len(self.pending),
+            "queue_max": self.maxsize,
+            "max_depth": c["max_depth"],
+            "enqueued": c["enqueued"],
+            "sent": c["sent"],
+            "dropped": c["dropped"],
+            "coalesced": c["coalesced"],
+            "filtered": c["filtered"],
+            "decimated": c["decimated"],
+            "topics": sorted(self.topics) if self.topics is not None else list(WS_TOPICS),
+            "fields": {t: list(f) for t, f in self.fields.items()},
+            "rates": dict(self.rates),
+            "decimation": self.decimation,
+            "lag_ms": c["lag_last_s"] * 1000,
+            "lag_avg_ms": c["lag_sum_s"] / c["sent"] * 1000 if c["sent"] else 0.0,
+            "lag_max_ms": c["lag_max_s"] * 1000,
+        }
+
+
+class WSManager:
+    """
+    Clientes do /ws/telemetry. broadcast serializa a mensagem uma vez por assinatura
+    distinta (JSON via WS_JSON_ENCODER ou layout binário para quem negociou
+    WS_BIN_SUBPROTOCOL) e só enfileira o resultado em cada cliente, que envia no seu
+    ritmo. Clientes que não assinaram o tópico nem entram na conta; os que pediram
+    taxa máxima recebem o frame pela decimação do próprio WSClient.
+    """
+    def __init__(self, queue_max: int = WS_QUEUE_MAX):
+        self.clients: Dict[WebSocket, WSClient] = {}
+        self.queue_max = int(queue_max)
+        self._next_id = 1
+        self.encode_counters = {"broadcasts": 0, "messages": 0, "bytes": 0, "encode_s": 0.0,
+                                "encode_max_s": 0.0, "errors": 0}
+        self.bin_counters = {"messages": 0, "bytes": 0, "encode_s": 0.0, "encode_max_s": 0.0, "errors": 0}
+        self._seq: Dict[str, int] = {}  # tópico -> número de sequência do último broadcast
+
+    @property
+    def active(self) -> List[WebSocket]:
+        return list(self.clients)
 
     async def connect(self, ws: WebSocket):
-        await ws.accept()
-        async with self.lock:
-            self.active.append(ws)
+        binary = WS_BIN_SUBPROTOCOL in ws.scope.get("subprotocols", ())
+        await ws.accept(subprotocol=WS_BIN_SUBPROTOCOL if binary else None)
+        self.register(ws, binary)
+
+    def register(self, ws: WebSocket, binary: bool = False) -> WSClient:
+        """(loop) Cria a fila e a task de envio de um socket já aceito."""
+        client = WSClient(ws, self._next_id, self.queue_max, binary)
+        self._next_id += 1
+        self.clients[ws] = client
+        client.start(self._on_send_error)
+        return client
 
     async def disconnect(self, ws: WebSocket):
-        async with self.lock:
-            if ws in self.active:
-                self.active.remove(ws)
+        client = self.clients.pop(ws, None)
+        if client is not None:
+            client.cancel_timers()
+            if client.task is not None:
+                client.task.cancel()
+
+    def _on_send_error(self, client: WSClient):
+        client.cancel_timers()
+        if self.clients.get(client.ws) is client:
+            del self.clients[client.ws]
+
+    def _encode(self, obj: dict, binary: bool = False, seq: int = 0):
+        """JSON (str) ou, com binary, o layout de WS_BIN_LAYOUTS (bytes); None se falhar."""
+        c = self.bin_counters if binary else self.encode_counters
+        t0 = time.perf_counter()
+        try:
+            data = encode_ws_binary(obj, seq) if binary else encode_ws(obj)
+        except Exception as e:
+            c["errors"] += 1
+            print(f"   ❌ Erro ao serializar {obj.get('type')}: {e}")
+            return None
+        dt = time.perf_counter() - t0
+        c["messages"] += 1
+        c["bytes"] += len(data)
+        c["encode_s"] += dt
+        if dt > c["encode_max_s"]:
+            c["encode_max_s"] = dt
+        return data
+
+    def broadcast(self, obj: dict):
+        """(loop) Enfileira para os assinantes do tópico sem esperar nenhum envio."""
+        if not self.clients:
+            return  # ninguém conectado: nem serializa
+        self.encode_counters["broadcasts"] += 1
+        kind = obj.get("type")
+        topic = WS_TOPIC_OF.get(kind, kind)
+        seq = self._seq[topic] = self._seq.get(topic, 0) + 1
+        has_layout = kind in WS_BIN_LAYOUTS
+        encoded: Dict[tuple, Any] = {}  # (binário, campos) -> mensagem serializada (campos None = inteira)
+        for client in list(self.clients.values()):
+            if not client.wants(topic):
+                client.counters["filtered"] += 1
+                continue
+            fields = client.fields.get(topic)
+            binary = client.binary and has_layout
+            if topic in client.rates:
+                client.offer(topic, obj if fields is None else {k: obj[k] for k in fields if k in obj},
+                             partial(self._encode, binary=binary, seq=seq))
+                continue
+            key = (binary, fields)
+            if key not in encoded:  # falha também fica no cache: não repete por cliente
+                encoded[key] = self._encode(obj if fields is None else {k: obj[k] for k in fields if k in obj},
+                                            binary, seq)
+            data = encoded[key]
+            if data is None:
+                continue  # só esta variante falhou; as demais seguem para os seus clientes
+            client.enqueue(kind, data)
+
+    def handle_message(self, ws: WebSocket, text: str):
+        """(loop) Mensagem do cliente: assinatura de tópicos/campos; responde subscribed ou error."""
+        client = self.clients.get(ws)
+        if client is None:
+            return
+        try:
+            msg = WSSubscribe(**json.loads(text))
+            if msg.action != "subscribe":
+                raise ValueError(f"Ação inválida: {msg.action}. Use: subscribe")
+            client.subscribe(msg.topics, msg.fields, msg.rates, msg.decimation)
+            st = client.stats()
+            reply = {"type": "subscribed", "topics": st["topics"], "fields": st["fields"],
+                     "rates": st["rates"], "decimation": st["decimation"]}
+        except (ValueError, TypeError) as e:  # JSON inválido, ValidationError ou assinatura inválida
+            reply = {"type": "error", "detail": str(e)}
+        client.enqueue(reply["type"], encode_ws(reply))
+
+    def broadcast_threadsafe(self, obj: dict, loop: Optional[asyncio.AbstractEventLoop]):
+        """Broadcast vindo de outra thread (serial, motion runner)."""
+        if loop is not None:
+            loop.call_soon_threadsafe(self.broadcast, obj)
 
     async def broadcast_json(self, obj: dict):
-        # print(f"📤 Broadcast para {len(self.active)} clientes: {obj.get('type', 'unknown')}")
-        rm = []
-        async with self.lock:
-            for ws in self.active:
-                try:
-                    await ws.send_json(obj)
-                    # print(f"   ✅ Enviado para cliente")
-                except Exception as e:
-                    print(f"   ❌ Erro ao enviar: {e}")
-                    rm.append(ws)
-            for ws in rm:
-                if ws in self.active:
-                    self.active.remove(ws)
+        self.broadcast(obj)
+
+    def stats(self) -> Dict[str, Any]:
+        clients = [c.stats() for c in self.clients.values()]
+        e = self.encode_counters
+        n = e["messages"]
+        b = self.bin_counters
+        nb = b["messages"]
+        return {
+            "encoder": WS_JSON_ENCODER,
+            "broadcasts": e["broadcasts"],
+            "encoded": n,
+            "encode_errors": e["errors"],
+            "encode_us_avg": e["encode_s"] / n * 1e6 if n else 0.0,
+            "encode_us_max": e["encode_max_s"] * 1e6,
+            "bytes_avg": e["bytes"] / n if n else 0.0,
+            "binary": {
+                "subprotocol": WS_BIN_SUBPROTOCOL,
+                "clients": sum(1 for c in clients if c["protocol"] != "json"),
+                "encoded": nb,
+                "encode_errors": b["errors"],
+                "encode_us_avg": b["encode_s"] / nb * 1e6 if nb else 0.0,
+                "encode_us_max": b["encode_max_s"] * 1e6,
+                "bytes_avg": b["bytes"] / nb if nb else 0.0,
+            },
+            "clients": len(clients),
+            "queue_max": self.queue_max,
+            "latest_types": list(WS_LATEST_TYPES),
+            "dropped": sum(c["dropped"] for c in clients),
+            "coalesced": sum(c["coalesced"] for c in clients),
+            "filtered": sum(c["filtered"] for c in clients),
+            "decimated": sum(c["decimated"] for c in clients),
+            "per_client": clients,
+        }
 
 ws_mgr = WSManager()
 
+# -------------------- Cache FK --------------------
+class FKCache:
+    """
+    Cache LRU de soluções da cinemática direta.
+
+    A chave são os 6 comprimentos absolutos quantizados em resolution_mm: durante
+    holds/rotinas lentas os Y do ESP32 quase não mudam e a mesma pose é reaproveitada
+    sem chamar o solver. Deve ser limpo sempre que a geometria da plataforma mudar.
+    """
+    def __init__(self, resolution_mm: float = FK_CACHE_RESOLUTION_MM,
+                 max_entries: int = FK_CACHE_MAX_ENTRIES):
+        self.resolution_mm = float(resolution_mm)
+        self.max_entries = int(max_entries)
+        self.enabled = True
+        self._data: "OrderedDict[Tuple[int, ...], Tuple[dict, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, lengths_abs: np.ndarray) -> Tuple[int, ...]:
+        return tuple(np.rint(np.asarray(lengths_abs, dtype=float) / self.resolution_mm).astype(np.int64).tolist())
+
+    def get(self, lengths_abs: np.ndarray):
+        """Retorna (pose, P) em caso de acerto, senão None."""
+        if not self.enabled:
+            return None
+        key = self._key(lengths_abs)
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        pose, P = hit
+        return dict(pose), P
+
+    def put(self, lengths_abs: np.ndarray, pose: dict, P: np.ndarray):
+        if not self.enabled:
+            return
+        key = self._key(lengths_abs)
+        with self._lock:
+            self._data[key] = (dict(pose), np.array(P, dtype=float))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def configure(self, enabled: Optional[bool] = None, resolution_mm: Optional[float] = None,
+                  max_entries: Optional[int] = None):
+        """Altera parâmetros; mudar a resolução invalida as entradas existentes."""
+        with self._lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if max_entries is not None:
+                self.max_entries = int(max_entries)
+            if resolution_mm is not None and float(resolution_mm) != self.resolution_mm:
+                self.resolution_mm = float(resolution_mm)
+                self._data.clear()
+            if not self.enabled:
+                self._data.clear()
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "resolution_mm": self.resolution_mm,
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+# -------------------- Framer de linhas --------------------
+class LineFramer:
+    """
+    Separa o fluxo serial em linhas sobre um bytearray reutilizável.
+
+    feed() acrescenta o bloco lido, corta TODAS as linhas completas numa única
+    passada (split em C até o último '\n') e mantém só o resto parcial no buffer:
+    custo linear no volume recebido, mesmo após rajadas ou lixo de boot do ESP32.
+    Linhas maiores que max_line são descartadas; se o buffer passar de max_line sem
+    '\n', o lixo é jogado fora e o restante dessa linha é ignorado até o próximo '\n'.
+    """
+
+    def __init__(self, max_line: int = SERIAL_MAX_LINE):
+        self.max_line = max_line
+        self._buf = bytearray()
+        self._discarding = False  # dentro de uma linha gigante já descartada
+        self.bytes_in = 0
+        self.lines_out = 0
+        self.lines_dropped = 0
+        self.bytes_dropped = 0
+        self._rate_t0 = time.monotonic()
+        self._rate_bytes0 = 0
+        self._rate_lines0 = 0
+        self.bytes_per_s = 0.0
+        self.lines_per_s = 0.0
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Acrescenta bytes e devolve as linhas completas (sem '\n' e sem '\r' final)."""
+        self.bytes_in += len(data)
+        buf = self._buf
+        buf += data
+        lines: List[bytes] = []
+
+        end = buf.rfind(b"\n")
+        if end >= 0:
+            chunk = bytes(buf[:end])
+            del buf[:end + 1]
+            parts = chunk.split(b"\n")
+            if self._discarding:
+                # primeiro pedaço é o fim da linha gigante já descartada
+                self.bytes_dropped += len(parts[0]) + 1
+                parts = parts[1:]
+                self._discarding = False
+            for line in parts:
+                if len(line) > self.max_line:
+                    self.lines_dropped += 1
+                    self.bytes_dropped += len(line) + 1
+                    continue
+                lines.append(line[:-1] if line.endswith(b"\r") else line)
+
+        if len(buf) > self.max_line:
+            # sem '\n' à vista: descarta e ignora até o próximo fim de linha
+            if not self._discarding:
+                self.lines_dropped += 1
+            self.bytes_dropped += len(buf)
+            del buf[:]
+            self._discarding = True
+
+        self.lines_out += len(lines)
+        self._update_rates()
+        return lines
+
+    def flush(self) -> Optional[bytes]:
+        """Devolve o resto parcial (ao fechar a porta) e limpa o buffer."""
+        rest = None if self._discarding or not self._buf else bytes(self._buf).rstrip(b"\r")
+        del self._buf[:]
+        self._discarding = False
+        return rest
+
+    def _update_rates(self):
+        now = time.monotonic()
+        dt = now - self._rate_t0
+        if dt >= SERIAL_RATE_WINDOW_S:
+            self.bytes_per_s = (self.bytes_in - self._rate_bytes0) / dt
+            self.lines_per_s = (self.lines_out - self._rate_lines0) / dt
+            self._rate_t0, self._rate_bytes0, self._rate_lines0 = now, self.bytes_in, self.lines_out
+
+    def stats(self) -> Dict[str, Any]:
+        self._update_rates()
+        return {
+            "bytes_in": self.bytes_in,
+            "lines_out": self.lines_out,
+            "lines_dropped": self.lines_dropped,
+            "bytes_dropped": self.bytes_dropped,
+            "buffered_bytes": len(self._buf),
+            "bytes_per_s": self.bytes_per_s,
+            "lines_per_s": self.lines_per_s,
+            "max_line": self.max_line,
+        }
+
+# -------------------- Parser CSV de telemetria --------------------
+class TelemetryParser:
+    """
+    Parser do CSV de telemetria com o formato travado por conexão. O cabeçalho do
+    firmware (ms;SP_mm;Y1;...) ou o primeiro frame válido fixa o número de campos;
+    daí em diante uma linha com essa contagem é um split e uma única conversão
+    map(float) da linha inteira, sem redetectar o formato nem tratar campo a campo.
+    Só 14, 17 ou 21 campos travam; com o formato travado, linha de 14+ campos com outra
+    contagem (duas linhas coladas, byte perdido) é rejeitada e só um cabeçalho retrava.
+    (Atribuir as strings num array numpy pré-alocado mede ~2x mais lento que o map.)
+    """
+
+    def __init__(self):
+        self.n_fields: Optional[int] = None
+        self.locked_by: Optional[str] = None  # "header" ou "frame"
+        self.counters = {"frames": 0, "headers": 0, "relocks": 0, "rejected": 0}
+
+    def parse(self, text: str) -> Optional[List[float]]:
+        """Campos da linha em float ou None se não for telemetria.
+        ValueError se a linha tiver cara de telemetria mas algum campo não for número
+        ou a contagem de campos não for a travada (nem 14/17/21, antes de travar)."""
+        if "," in text:
+            text = text.replace(",", ".")  # vírgula decimal: uma troca na linha inteira
+        parts = text.split(CSV_DELIM)
+        if len(parts) == self.n_fields:
+            try:
+                values = list(map(float, parts))
+            except ValueError:
+                # Cabeçalho reenviado a cada reset do ESP32 tem a mesma contagem: _detect
+                # devolve None para ele e relança o ValueError para linha corrompida
+                return self._detect(text, parts)
+            self.counters["frames"] += 1
+            return values
+        return self._detect(text, parts)
+
+    def _detect(self, text: str, parts: List[str]) -> Optional[List[float]]:
+        """Caminho lento: cabeçalho (trava/retrava), linhas que não são telemetria e 1º frame."""
+        n = len(parts)
+        if text.startswith(TELEM_CSV_HEADER_PREFIX):
+            try:
+                float(parts[1])
+            except (ValueError, IndexError):
+                if n in TELEM_CSV_FORMATS:
+                    self._lock(n, "header")
+                self.counters["headers"] += 1
+                return None
+            return self.parse(text[len(TELEM_CSV_HEADER_PREFIX):])  # frame com prefixo "ms;" (compatibilidade)
+        if n < TELEM_CSV_MIN_FIELDS:
+            return None
+        if n != self.n_fields and (self.n_fields is not None or n not in TELEM_CSV_FORMATS):
+            self.counters["rejected"] += 1
+            expected = self.n_fields or "/".join(map(str, TELEM_CSV_FORMATS))
+            raise ValueError(f"telemetria com {n} campos (esperado {expected})")
+        values = list(map(float, parts))  # frame corrompido levanta antes de travar
+        if self.n_fields is None:
+            self._lock(n, "frame")
+        self.counters["frames"] += 1
+        return values
+
+    def _lock(self, n: int, by: str):
+        if self.n_fields is not None and n != self.n_fields:
+            self.counters["relocks"] += 1
+        if n != self.n_fields:
+            print(f"🔒 Formato de telemetria: {n} campos ({self.format_name(n)}) via {by}")
+        self.n_fields = n
+        self.locked_by = by
+
+    @staticmethod
+    def format_name(n: int) -> str:
+        return TELEM_CSV_FORMATS[n]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "n_fields": self.n_fields,
+            "format": self.format_name(self.n_fields) if self.n_fields else None,
+            "locked_by": self.locked_by,
+            **self.counters,
+        }
+
+
+# -------------------- Frames binários de telemetria --------------------
+def encode_binary_telemetry(values) -> bytes:
+    """
+    Monta um frame binário a partir dos mesmos campos do CSV (14, 17 ou 21 valores:
+    ms;SP;Y1-Y6;PWM1-PWM6[;Roll;Pitch;Yaw[;Qw;Qx;Qy;Qz]]). Referência do lado do
+    firmware e usado nos testes.
+    """
+    values = list(values)
+    length = {14: 44, 17: 56, 21: 72}.get(len(values))
+    if length is None:
+        raise ValueError(f"frame binário com {len(values)} campos (esperado 14, 17 ou 21)")
+    st = TELEM_BIN_LAYOUTS[length]
+    values[0] = int(values[0]) & 0xFFFFFFFF
+    values[8:14] = [int(v) for v in values[8:14]]
+    body = bytes([length]) + st.pack(*values)
+    return TELEM_BIN_SYNC + body + struct.pack("<H", binascii.crc_hqx(body, TELEM_BIN_CRC_INIT))
+
+
+class TelemetryFramer:
+    """
+    Separa o fluxo serial em frames binários de telemetria e linhas de texto.
+
+    Cada conexão começa em modo texto: enquanto não aparece 0xAA 0x55 o bloco vai
+    direto para o LineFramer, sem custo extra. O primeiro frame com CRC válido trava
+    a conexão em modo binário; a partir daí tudo passa pelo varredor de frames e os
+    bytes entre frames (respostas "OK ...", mensagens de boot) continuam virando linhas.
+    Cada frame é decodificado com um único struct.unpack_from; sync falso, tamanho
+    desconhecido ou CRC inválido só avançam um byte (ressincronização).
+    """
+
+    def __init__(self, max_line: int = SERIAL_MAX_LINE):
+        self.lines = LineFramer(max_line)
+        self.binary = False
+        self._buf = bytearray()
+        self.bytes_in = 0
+        self.frames_out = 0
+        self.crc_errors = 0
+        self.bad_length = 0
+        self._rate_t0 = time.monotonic()
+        self._rate_frames0 = 0
+        self.frames_per_s = 0.0
+
+    def feed(self, data: bytes) -> Tuple[List[tuple], List[bytes]]:
+        """Acrescenta bytes e devolve (frames decodificados, linhas de texto completas)."""
+        self.bytes_in += len(data)
+        if not self.binary and not self._buf and TELEM_BIN_SYNC not in data and not data.endswith(TELEM_BIN_SYNC[:1]):
+            return [], self.lines.feed(data)
+
+        buf = self._buf
+        buf += data
+        n = len(buf)
+        frames: List[tuple] = []
+        text: List[bytes] = []
+        layouts = TELEM_BIN_LAYOUTS
+        crc = binascii.crc_hqx
+        view = memoryview(buf)  # CRC sem copiar o frame
+        pos = 0
+        try:
+            while True:
+                i = buf.find(TELEM_BIN_SYNC, pos)
+                if i < 0:
+                    # um 0xAA no fim pode ser metade do sync
+                    end = n - 1 if buf[-1] == 0xAA else n
+                    if end > pos:
+                        text.append(buf[pos:end])
+                    pos = end
+                    break
+                if i > pos:
+                    text.append(buf[pos:i])
+                    pos = i
+                if i + 3 > n:
+                    break
+                length = buf[i + 2]
+                st = layouts.get(length)
+                if st is None:
+                    self.bad_length += 1
+                    text.append(buf[i:i + 1])
+                    pos = i + 1
+                    continue
+                end = i + length + 5
+                if end > n:
+                    break
+                if crc(view[i + 2:end - 2], TELEM_BIN_CRC_INIT) != buf[end - 2] | (buf[end - 1] << 8):
+                    self.crc_errors += 1
+                    text.append(buf[i:i + 1])
+                    pos = i + 1
+                    continue
+                frames.append(st.unpack_from(buf, i + 3))
+                pos = end
+        finally:
+            view.release()
+        del buf[:pos]
+
+        if frames:
+            if not self.binary:
+                print(f"📦 Telemetria binária detectada ({len(frames[0])} campos por frame)")
+            self.binary = True
+            self.frames_out += len(frames)
+        text_bytes = b"".join(text)
+        lines = self.lines.feed(text_bytes) if text_bytes else []
+        self._update_rates()
+        return frames, lines
+
+    def flush(self) -> Optional[bytes]:
+        """Devolve o resto de texto parcial; frame binário incompleto é descartado."""
+        del self._buf[:]
+        return self.lines.flush()
+
+    def _update_rates(self):
+        now = time.monotonic()
+        dt = now - self._rate_t0
+        if dt >= SERIAL_RATE_WINDOW_S:
+            self.frames_per_s = (self.frames_out - self._rate_frames0) / dt
+            self._rate_t0, self._rate_frames0 = now, self.frames_out
+
+    def stats(self) -> Dict[str, Any]:
+        self._update_rates()
+        stats = self.lines.stats()
+        stats.update({
+            "bytes_in": self.bytes_in,
+            "encoding": "binary" if self.binary else "text",
+            "frames_out": self.frames_out,
+            "frames_per_s": self.frames_per_s,
+            "crc_errors": self.crc_errors,
+            "bad_length": self.bad_length,
+            "buffered_bytes": stats["buffered_bytes"] + len(self._buf),
+        })
+        return stats
+
 # -------------------- Serial Manager --------------------
+def expected_reply(cmd: str) -> Optional[Tuple[str, ...]]:
+    """Prefixos da resposta que o firmware dá ao comando (None = comando sem resposta)."""
+    c = cmd.strip().lower()
+    for prefix, replies in CMD_ACK_REPLIES:
+        if c.startswith(prefix):
+            return replies
+    return None
+
+
+class PendingAck:
+    """Resposta esperada de um comando escrito (event None = fora de transação, só ocupa a vez)"""
+    __slots__ = ("command", "prefixes", "event", "reply", "t_sent")
+
+    def __init__(self, command: str, prefixes: Tuple[str, ...], wait: bool = True):
+        self.command = command
+        self.prefixes = prefixes
+        self.event = threading.Event() if wait else None
+        self.reply: Optional[str] = None
+        self.t_sent = 0.0
+
+
 class SerialManager:
     def __init__(self):
         self.ser: Optional[serial.Serial] = None
         self.reader_thread: Optional[threading.Thread] = None
+        self.framer = TelemetryFramer()  # trocado por um novo a cada abertura (detecção e contadores por conexão)
+        self.parser = TelemetryParser()  # idem: formato CSV travado por conexão
+        self._base_points = platform.B.tolist()  # igual em todo frame; refeito em on_geometry_changed
         self.stop_evt = threading.Event()
         self.lock = threading.Lock()
         self.latest: Dict[str, Any] = {}
         self.loop = None  # Será configurado quando o servidor iniciar
+        self.offline_source: Optional[str] = None  # replay alimentando _on_rx_line sem porta aberta
+
+        # Transporte: "thread" (leitura bloqueante + run_coroutine_threadsafe por mensagem) ou
+        # "asyncio" (fd registrado no event loop, parse no loop, consumidores como streams assíncronos)
+        self.transport = "thread"
+        self._reader_fd: Optional[int] = None
+        self._loop_tid: Optional[int] = None
+        self._subscribers: List[asyncio.Queue] = []   # copy-on-write: lido fora do loop sem lock
+        self._out_lock = threading.Lock()
+        self._out_buf: List[dict] = []
+        self._out_scheduled = False
+        self._ws_pump: Optional[asyncio.Task] = None
+        self._stream_counters = {
+            "delivered": 0,    # mensagens distribuídas aos consumidores no loop
+            "wakeups": 0,      # call_soon_threadsafe feitos (um por lote vindo de outra thread)
+            "dropped": 0,      # mensagens descartadas por consumidor com fila cheia
+            "read_events": 0,  # eventos de leitura do add_reader com dados
+        }
         # memória para LSQ partir de último chute
         self._last_pose_guess = np.array([0, 0, platform.h0, 0, 0, 0], dtype=float)
+        # motor da cinemática direta ("newton" ou "lsq"), ajustável via /fk/settings
+        self.fk_method = FK_METHOD_DEFAULT
+        # cache LRU de poses indexado pelos comprimentos quantizados
+        self.fk_cache = FKCache()
+        # taxa própria da FK, independente da taxa de telemetria (0 = todo frame)
+        self.fk_rate_hz = FK_RATE_HZ_DEFAULT
+        self._fk_last_solve_mono = 0.0
+        self._fk_last_result: Optional[Tuple[Optional[dict], Optional[np.ndarray], Dict[str, Any], Optional[dict], float]] = None
+
+        # Pipeline de telemetria: a thread de leitura só enquadra e parseia;
+        # a thread FK consome o último frame pendente (latest-wins) e publica.
+        self.fk_thread: Optional[threading.Thread] = None
+        self._fk_cond = threading.Condition()
+        self._fk_pending: Optional[Tuple[Dict[str, Any], np.ndarray]] = None
+        self._fk_counters = {
+            "frames_in": 0,         # frames de telemetria parseados pela leitura
+            "frames_published": 0,  # frames publicados pela thread FK
+            "frames_dropped": 0,    # frames substituídos antes de a FK consumi-los
+            "fk_failures": 0,       # soluções FK sem convergência
+            "fk_solved": 0,         # frames em que a FK rodou (ou acertou o cache)
+            "fk_reused": 0,         # frames que reaproveitaram a última pose (taxa FK < telemetria)
+            "near_singular": 0,     # soluções com destreza abaixo de DEXTERITY_MIN
+            "last_solve_ms": 0.0,
+            "max_solve_ms": 0.0,
+            "total_solve_ms": 0.0,
+        }
+
+        # TX: fila de prioridade (prio, seq, chave latest-wins, bytes, t_enfileirado, resposta esperada)
+        self.tx_thread: Optional[threading.Thread] = None
+        self._tx_cond = threading.Condition()
+        self._tx_heap: List[tuple] = []
+        self._tx_seq = 0
+        self._tx_latest: Dict[str, int] = {}  # chave latest-wins -> seq do único comando válido
+        self._tx_stale = 0                    # entradas substituídas ainda no heap
+        self.tx_error: Optional[str] = None   # falha de escrita: write_lines recusa até reabrir a porta
+        self._tx_resync = False               # escrita interrompida: próximo lote começa com "\n"
+        self._tx_counters = {
+            "enqueued": 0,
+            "written": 0,           # comandos escritos na porta
+            "writes": 0,            # chamadas a ser.write (comandos pendentes saem juntos)
+            "bytes_out": 0,
+            "dropped_stale": 0,     # setpoints substituídos antes de sair
+            "dropped_closed": 0,    # pendentes descartados ao fechar a porta
+            "write_errors": 0,
+            "last_latency_ms": 0.0,
+            "max_latency_ms": 0.0,
+            "total_latency_ms": 0.0,
+        }
+
+        # Respostas esperadas na ordem em que a thread TX escreveu os comandos (casadas no RX por prefixo)
+        self._ack_lock = threading.Lock()
+        self._ack_pending: List[PendingAck] = []
+        self._txn_counters = {
+            "transactions": 0,
+            "failed": 0,
+            "acks": 0,
+            "errors": 0,            # respostas "ERR ..."
+            "timeouts": 0,          # respostas que não chegaram no prazo
+            "last_ms": 0.0,
+            "max_ms": 0.0,
+        }
 
     def set_event_loop(self, loop):
         """Configura o event loop do FastAPI"""
         self.loop = loop
         print(f"✅ Event loop configurado no SerialManager")
 
-    def open(self, port: str, baud: int = BAUD):
+    def open(self, port: str, baud: int = BAUD, transport: Optional[str] = None):
+        transport = transport or os.environ.get(SERIAL_TRANSPORT_ENV) or "thread"
+        if transport not in SERIAL_TRANSPORTS:
+            raise ValueError(f"Transporte inválido: {transport}. Use {' ou '.join(SERIAL_TRANSPORTS)}")
+        if transport == "asyncio" and (self.loop is None or os.name != "posix"):
+            raise RuntimeError("Transporte asyncio requer o event loop do servidor e um sistema POSIX (add_reader)")
         with self.lock:
             if self.ser and self.ser.is_open:
                 raise RuntimeError("Serial já aberta")
-            self.ser = serial.Serial(port, baud, timeout=0.2)
+            if self.offline_source:
+                raise RuntimeError(f"Replay em andamento ({self.offline_source}): pare o replay antes de abrir a serial")
+            # timeout=0 no asyncio: o fd só é lido quando o loop avisa que há dados
+            self.ser = serial.Serial(port, baud, timeout=0 if transport == "asyncio" else 0.2,
+                                     write_timeout=TX_WRITE_TIMEOUT_S)
+            self.transport = transport
+            self.tx_error = None
+            self.parser = TelemetryParser()
             self.stop_evt.clear()
-            self.reader_thread = threading.Thread(target=self._reader_loop, daemon=True)
-            self.reader_thread.start()
-            print(f"🔌 Serial ABERTA: {port} @ {baud} baud")
+            self._start_fk_worker()
+            self.tx_thread = threading.Thread(target=self._tx_loop, daemon=True)
+            self.tx_thread.start()
+            if transport == "thread":
+                self.reader_thread = threading.Thread(target=self._reader_loop, daemon=True)
+                self.reader_thread.start()
+            print(f"🔌 Serial ABERTA: {port} @ {baud} baud (transporte {transport})")
+        if transport == "thread":
             print(f"📖 Thread de leitura iniciada, aguardando dados...")
+            return
+        try:
+            self._call_in_loop(self._attach_reader)
+        except Exception:
+            self.close()
+            raise
 
     def close(self):
         self.stop_evt.set()
+        if self._reader_fd is not None:
+            try:
+                self._call_in_loop(self._detach_reader)
+            except Exception as e:
+                print(f"   ⚠️ Erro ao remover leitor do event loop: {e}")
         if self.reader_thread:
             self.reader_thread.join(timeout=1.0)
+        with self._fk_cond:
+            self._fk_cond.notify_all()
+        if self.fk_thread:
+            self.fk_thread.join(timeout=1.0)
+        with self._fk_cond:
+            self._fk_pending = None
+        with self._tx_cond:
+            self._tx_cond.notify_all()
+        if self.tx_thread:
+            self.tx_thread.join(timeout=TX_WRITE_TIMEOUT_S + 1.0)
+        with self._tx_cond:
+            self._tx_counters["dropped_closed"] += len(self._tx_heap) - self._tx_stale
+            self._tx_heap.clear()
+            self._tx_latest.clear()
+            self._tx_stale = 0
+        with self._ack_lock:
+            self._ack_pending = []
         with self.lock:
             if self.ser:
                 try: self.ser.close()
                 except Exception: pass
                 self.ser = None
+            self.transport = "thread"
+
+    def start_offline(self, source: str):
+        """Liga só a thread FK para uma fonte que injeta linhas em _on_rx_line (replay)."""
+        with self.lock:
+            if self.ser is not None:
+                raise RuntimeError("Serial aberta: feche a porta antes do replay")
+            if self.offline_source:
+                raise RuntimeError(f"Replay já em andamento ({self.offline_source})")
+            self.offline_source = source
+            self.parser = TelemetryParser()
+            self.stop_evt.clear()
+            self._start_fk_worker()
+
+    def stop_offline(self):
+        """Desliga a thread FK da fonte offline (a porta continua livre para open)."""
+        with self.lock:
+            if not self.offline_source:
+                return
+            self.stop_evt.set()
+        with self._fk_cond:
+            self._fk_cond.notify_all()
+        if self.fk_thread:
+            self.fk_thread.join(timeout=1.0)
+        with self._fk_cond:
+            self._fk_pending = None
+        with self.lock:
+            self.offline_source = None
 
     def list_ports(self):
         """Lista portas seriais com informações detalhadas para identificar ESP32-S3"""
@@ -520,184 +2676,1219 @@ class SerialManager:
                 "confidence": confidence
             })
 
+        # Rig virtual (pty) aparece como ESP32 de confiança mínima: nunca passa à frente do real
+        if virtual_rig is not None and virtual_rig.running:
+            ports.append({
+                "device": virtual_rig.port,
+                "description": "ESP32 virtual (pty)",
+                "display_name": f"ESP32 virtual ({virtual_rig.telemetry_format}, {virtual_rig.rate_hz:.0f} Hz)",
+                "hwid": "VIRTUAL",
+                "vid": None,
+                "pid": None,
+                "manufacturer": "simulação",
+                "is_esp32": True,
+                "confidence": 1,
+                "virtual": True,
+            })
+
         # Ordena: ESP32 primeiro (por confiança), depois outros
         ports.sort(key=lambda x: (-x["is_esp32"], -x["confidence"], x["device"]))
         return ports
 
 
-    def write_line(self, s: str, ending: bytes = b"\n"):
+    def write_line(self, s: str, ending: bytes = b"\n", priority: Optional[int] = None):
+        """
+        Enfileira um comando para a thread TX e retorna na hora (não bloqueia na porta).
+        "spmm6x=" é latest-wins; os demais saem na ordem de chegada.
+        """
+        self.write_lines([s], ending, priority)
+
+    def write_lines(self, lines: List[str], ending: bytes = b"\n", priority: Optional[int] = None,
+                    acks: Optional[List[Optional[PendingAck]]] = None):
+        """
+        Enfileira vários comandos de uma vez: saem contíguos, sem comandos de outras threads no meio.
+        acks: respostas aguardadas por uma transação (uma por linha); esses comandos ficam fora
+        do latest-wins, senão um setpoint da rotina descartaria um que ainda espera resposta.
+        """
+        if not self.ser or not self.ser.is_open:
+            raise RuntimeError("Serial não aberta")
+        if self.tx_error:
+            raise RuntimeError(f"Falha de escrita na serial ({self.tx_error}): reabra a porta")
+        items = []
+        for k, s in enumerate(lines):
+            if acks is not None:
+                key, ack = None, acks[k]
+            else:
+                key = next((p for p in TX_LATEST_WINS_PREFIXES if s.startswith(p)), None)
+                prefixes = expected_reply(s)
+                ack = PendingAck(s.strip(), prefixes, wait=False) if prefixes else None
+            prio = priority
+            if prio is None:
+                prio = TX_PRIO_URGENT if s.strip().upper() in TX_URGENT_COMMANDS else TX_PRIO_NORMAL
+            items.append((prio, key, s.encode("utf-8", errors="replace") + ending, ack))
+        with self._tx_cond:
+            if len(self._tx_heap) - self._tx_stale + len(items) > TX_QUEUE_MAX:
+                raise RuntimeError("Fila TX cheia (porta serial não está escoando)")
+            t_enq = time.monotonic()
+            for prio, key, data, ack in items:
+                self._tx_seq += 1
+                if key is not None:
+                    if key in self._tx_latest:
+                        self._tx_stale += 1
+                        self._tx_counters["dropped_stale"] += 1
+                    self._tx_latest[key] = self._tx_seq
+                heapq.heappush(self._tx_heap, (prio, self._tx_seq, key, data, t_enq, ack))
+            self._tx_counters["enqueued"] += len(items)
+            self._tx_cond.notify()
+
+    def transaction(self, commands: List[str], timeout: float = CMD_ACK_TIMEOUT_S) -> Dict[str, Any]:
+        """
+        Envia um lote de comandos relacionados e espera as confirmações do firmware.
+
+        As respostas "OK ..."/"ERR ..." são casadas no RX pelo prefixo, na ordem em que a
+        thread TX escreveu: respostas de comandos escritos antes (setpoints da rotina, v? avulso)
+        não confirmam o lote. Comando sem resposta própria conta como confirmado ("implied")
+        quando chega a resposta de um comando posterior do mesmo lote. Retorna assim que tudo foi
+        respondido ou o prazo acaba, sem esperas fixas entre comandos.
+        """
+        commands = [c.strip() for c in commands if c and c.strip()]
+        if not commands:
+            raise ValueError("Transação sem comandos")
+        plan = [(cmd, expected_reply(cmd)) for cmd in commands]
+        barrier = plan[-1][1] is None
+        if barrier:
+            plan.append((CMD_BARRIER, expected_reply(CMD_BARRIER)))
+        acks = [PendingAck(cmd, prefixes) if prefixes else None for cmd, prefixes in plan]
+        waiters = [a for a in acks if a is not None]
+
+        t0 = time.perf_counter()
+        self.write_lines([cmd for cmd, _ in plan], acks=acks)  # acks registrados pela thread TX ao escrever
+
+        deadline = t0 + timeout
+        for w in waiters:
+            if not w.event.wait(max(0.0, deadline - time.perf_counter())):
+                break
+        self._drop_acks(waiters)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+
+        results = []
+        answered_later = False  # existe resposta de um comando posterior?
+        for (cmd, _), ack in reversed(list(zip(plan, acks))):
+            if ack is None:
+                status, reply = ("implied" if answered_later else "timeout"), None
+            else:
+                reply = ack.reply
+                if reply is None:
+                    status = "timeout"
+                else:
+                    status = "error" if reply.startswith("ERR") else "ok"
+                    answered_later = True
+            results.append({"command": cmd, "status": status, "reply": reply})
+        results.reverse()
+        if barrier:
+            results.pop()
+
+        errors = [r for r in results if r["status"] == "error"]
+        timeouts = [r for r in results if r["status"] == "timeout"]
+        ok = not errors and not timeouts
+        c = self._txn_counters
+        with self._ack_lock:
+            c["transactions"] += 1
+            c["failed"] += 0 if ok else 1
+            c["acks"] += sum(1 for w in waiters if w.reply is not None)
+            c["errors"] += len(errors)
+            c["timeouts"] += len(timeouts)
+            c["last_ms"] = elapsed_ms
+            c["max_ms"] = max(c["max_ms"], elapsed_ms)
+        return {
+            "ok": ok,
+            "commands": results,
+            "errors": [r["reply"] for r in errors],
+            "timeouts": [r["command"] for r in timeouts],
+            "barrier": barrier,
+            "elapsed_ms": elapsed_ms,
+        }
+
+    def _drop_acks(self, waiters: List[PendingAck]):
+        with self._ack_lock:
+            pending = set(map(id, waiters))
+            self._ack_pending = [a for a in self._ack_pending if id(a) not in pending]
+
+    def _register_acks(self, acks: List[PendingAck]):
+        """(thread TX) Respostas esperadas dos comandos prestes a sair, na ordem de escrita."""
+        now = time.monotonic()
+        cutoff = now - CMD_REPLY_STALE_S
+        with self._ack_lock:
+            if self._ack_pending and self._ack_pending[0].t_sent < cutoff:
+                # comando avulso que nunca foi respondido não segura a fila para sempre
+                self._ack_pending = [a for a in self._ack_pending if a.event is not None or a.t_sent >= cutoff]
+            for ack in acks:
+                ack.t_sent = now
+            self._ack_pending.extend(acks)
+
+    def _match_ack(self, text: str) -> bool:
+        """Entrega a linha ao comando escrito mais antigo que ainda espera uma resposta com esse prefixo."""
+        with self._ack_lock:
+            for k, ack in enumerate(self._ack_pending):
+                if text.startswith(ack.prefixes):
+                    del self._ack_pending[k]
+                    ack.reply = text
+                    if ack.event is not None:
+                        ack.event.set()
+                    return True
+        return False
+
+    def txn_stats(self) -> Dict[str, Any]:
+        """Contadores das transações confirmadas"""
+        with self._ack_lock:
+            stats = dict(self._txn_counters)
+            stats["pending_acks"] = sum(1 for a in self._ack_pending if a.event is not None)
+            stats["pending_replies"] = len(self._ack_pending)
+        return stats
+
+    def _tx_loop(self):
+        """Thread TX: esvazia a fila em ordem de prioridade e escreve tudo numa chamada."""
+        print(f"📤 Thread TX iniciada")
+        c = self._tx_counters
+        while True:
+            with self._tx_cond:
+                while not self._tx_heap and not self.stop_evt.is_set():
+                    self._tx_cond.wait(timeout=0.5)
+                if self.stop_evt.is_set():
+                    break
+                batch = []
+                while self._tx_heap:
+                    _, seq, key, data, t_enq, ack = heapq.heappop(self._tx_heap)
+                    if key is not None:
+                        if self._tx_latest.get(key) != seq:
+                            self._tx_stale -= 1
+                            continue
+                        del self._tx_latest[key]
+                    batch.append((data, t_enq, ack))
+            if not batch:
+                continue
+
+            acks = [ack for _, _, ack in batch if ack is not None]
+            if acks:
+                self._register_acks(acks)  # antes do write: a resposta pode chegar na hora
+
+            out = b"".join(data for data, _, _ in batch)
+            if self._tx_resync:
+                out = b"\n" + out  # fecha o comando que ficou pela metade no firmware
+            try:
+                n = self.ser.write(out)
+                if n is not None and n < len(out):
+                    raise IOError(f"escrita parcial ({n}/{len(out)} bytes)")
+            except Exception as e:
+                # Quem enfileirou já recebeu sucesso: marca a porta como falha para os
+                # próximos write_lines recusarem e /serial/status mostrar
+                print(f"❌ Erro ao escrever na serial: {e}")
+                with self._tx_cond:
+                    c["write_errors"] += len(batch)
+                self._drop_acks(acks)
+                self.tx_error = str(e) or type(e).__name__
+                self._tx_resync = True  # timeout no meio deixa um comando incompleto na linha
+                continue
+            self._tx_resync = False
+
+            now = time.monotonic()
+            with self._tx_cond:
+                for _, t_enq, _ in batch:
+                    latency_ms = (now - t_enq) * 1000
+                    c["total_latency_ms"] += latency_ms
+                    if latency_ms > c["max_latency_ms"]:
+                        c["max_latency_ms"] = latency_ms
+                c["last_latency_ms"] = latency_ms
+                c["written"] += len(batch)
+                c["writes"] += 1
+                c["bytes_out"] += len(out)
+
+    def tx_stats(self) -> Dict[str, Any]:
+        """Profundidade da fila TX, setpoints descartados e latência enfileirar→escrever"""
+        with self._tx_cond:
+            c = dict(self._tx_counters)
+            depth = len(self._tx_heap) - self._tx_stale
+        written = c["written"]
+        c["queue_depth"] = depth
+        c["avg_latency_ms"] = c.pop("total_latency_ms") / written if written else 0.0
+        c["running"] = bool(self.tx_thread and self.tx_thread.is_alive())
+        return c
+
+    def _reader_loop(self):
+        print(f"🔄 Thread de leitura iniciada")
+        framer = self.framer = TelemetryFramer()
+        while not self.stop_evt.is_set():
+            try:
+                if not self.ser:
+                    break
+                # Leitura em bloco: tudo que já chegou; sem nada na fila, espera 1 byte (até o timeout)
+                data = self.ser.read(self.ser.in_waiting or 1)
+            except Exception as e:
+                print(f"❌ Erro ao ler serial: {e}")
+                break
+            if not data:
+                continue
+            frames, lines = framer.feed(data)
+            for fields in frames:
+                self._on_rx_frame(fields)
+            for line in lines:
+                self._on_rx_line(line.decode(errors="replace"))
+
+        rest = framer.flush()
+        if rest:
+            try:
+                self._on_rx_line(rest.decode(errors="replace"))
+            except Exception:
+                pass
+
+    def rx_stats(self) -> Dict[str, Any]:
+        """Contadores da leitura serial (bytes/s, linhas/s, frames binários, erros de CRC)"""
+        stats = self.framer.stats()
+        stats["transport"] = self.transport
+        stats["parser"] = self.parser.stats()
+        stats["stream"] = dict(self._stream_counters, subscribers=len(self._subscribers))
+        return stats
+
+    # ---------- Transporte asyncio (add_reader) e streams ----------
+    def _call_in_loop(self, fn):
+        """Executa fn na thread do event loop e devolve o resultado (direto, se já estiver nela)."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            return fn()
+
+        async def run():
+            return fn()
+        return asyncio.run_coroutine_threadsafe(run(), self.loop).result(timeout=2.0)
+
+    def _attach_reader(self):
+        """(loop) Registra o fd da serial no event loop e liga o WebSocket como consumidor."""
+        self.framer = TelemetryFramer()
+        self._loop_tid = threading.get_ident()
+        fd = self.ser.fileno()
+        self.loop.add_reader(fd, self._on_readable)
+        self._reader_fd = fd
+        self._ws_pump = self.loop.create_task(self._pump_ws(self.subscribe()))
+        print(f"📖 Leitura no event loop (add_reader), aguardando dados...")
+
+    def _detach_reader(self):
+        """(loop) Remove o fd do event loop; a linha incompleta que sobrou ainda é entregue."""
+        if self._reader_fd is None:
+            return
+        self.loop.remove_reader(self._reader_fd)
+        self._reader_fd = None
+        if self._ws_pump:
+            self._ws_pump.cancel()
+            self._ws_pump = None
+        rest = self.framer.flush()
+        if rest:
+            try:
+                self._on_rx_line(rest.decode(errors="replace"))
+            except Exception:
+                pass
+
+    def _on_readable(self):
+        """(loop) Callback do add_reader: um os.read do que chegou e parse no próprio loop."""
+        try:
+            # pyserial abre o fd com O_NONBLOCK; ler direto evita o ioctl de in_waiting e o select interno
+            data = os.read(self._reader_fd, SERIAL_READ_CHUNK)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            print(f"❌ Erro ao ler serial: {e}")
+            self._detach_reader()
+            return
+        if not data:
+            print(f"❌ Serial encerrada pelo dispositivo")
+            self._detach_reader()
+            return
+        self._stream_counters["read_events"] += 1
+        frames, lines = self.framer.feed(data)
+        for fields in frames:
+            self._on_rx_frame(fields)
+        for line in lines:
+            self._on_rx_line(line.decode(errors="replace"))
+
+    def _emit(self, obj: dict):
+        """Entrega uma mensagem (telemetria/raw) ao event loop: WebSocket e streams assíncronos."""
+        if self.loop is None:
+            return
+        if self.transport == "thread":
+            self.loop.call_soon_threadsafe(ws_mgr.broadcast, obj)
+            if not self._subscribers:
+                return
+        if threading.get_ident() == self._loop_tid:
+            self._deliver(obj)  # leitura no próprio loop: sem troca de thread
+            return
+        # Vindo da thread FK: acumula e acorda o loop uma vez por lote
+        with self._out_lock:
+            self._out_buf.append(obj)
+            if self._out_scheduled:
+                return
+            self._out_scheduled = True
+        self._stream_counters["wakeups"] += 1
+        self.loop.call_soon_threadsafe(self._drain_out)
+
+    def _drain_out(self):
+        with self._out_lock:
+            batch, self._out_buf = self._out_buf, []
+            self._out_scheduled = False
+        for obj in batch:
+            self._deliver(obj)
+
+    def _deliver(self, obj: dict):
+        """(loop) Distribui aos consumidores; fila cheia perde a mensagem mais antiga."""
+        c = self._stream_counters
+        c["delivered"] += 1
+        for q in self._subscribers:
+            if q.full():
+                q.get_nowait()
+                c["dropped"] += 1
+            q.put_nowait(obj)
+
+    def subscribe(self, maxsize: int = STREAM_QUEUE_MAX) -> asyncio.Queue:
+        """(loop) Nova fila de consumidor com as mensagens da serial."""
+        q: asyncio.Queue = asyncio.Queue(maxsize)
+        self._subscribers = self._subscribers + [q]
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        self._subscribers = [s for s in self._subscribers if s is not q]
+
+    async def stream(self, maxsize: int = STREAM_QUEUE_MAX):
+        """Consumidor assíncrono: `async for msg in serial_mgr.stream(): ...`"""
+        q = self.subscribe(maxsize)
+        try:
+            while True:
+                yield await q.get()
+        finally:
+            self.unsubscribe(q)
+
+    async def _pump_ws(self, q: asyncio.Queue):
+        """Consumidor do transporte asyncio que repassa as mensagens ao WebSocket."""
+        try:
+            while True:
+                ws_mgr.broadcast(await q.get())
+        finally:
+            self.unsubscribe(q)
+
+    def _on_rx_line(self, text: str):
+        now = time.time()
+        
+        # 🐛 DEBUG: Log de TODAS as linhas recebidas
+        #print(f"📥 RX: {text}")
+
+        if not text:
+            return
+
+        # Respostas "OK ..."/"ERR ..." de transações em andamento (a linha segue como raw)
+        if self._ack_pending and text.startswith(CMD_REPLY_PREFIXES):
+            self._match_ack(text)
+
+        # Formato travado no parser (cabeçalho ou 1º frame válido):
+        # Formato ANTIGO: 14 campos (ms;SP;Y1-Y6;PWM1-PWM6)
+        # Formato MPU-6050: 17 campos (ms;SP;Y1-Y6;PWM1-PWM6;Roll;Pitch;Yaw)
+        # Formato BNO085: 21 campos (ms;SP;Y1-Y6;PWM1-PWM6;Roll;Pitch;Yaw;Qw;Qx;Qy;Qz)
+        try:
+            values = self.parser.parse(text)
+            if values is not None:
+                self._publish_telemetry(now, values, raw=text)
+                return
+        except Exception as e:
+            print(f"   ❌ Erro ao parsear telemetria: {e}")
+            self._emit({
+                "type": "raw",
+                "ts": now,
+                "raw": text,
+                "parse_error": True
+            })
+            return
+
+        print(f"   ⚠️ Linha NÃO é telemetria ({text[:40]!r})")
+        # Broadcast raw mínimo
+        self.latest = {"raw": text, "ts": now}
+        self._emit({
+            "type": "raw",
+            "ts": now,
+            "raw": text,
+        })
+
+    def _on_rx_frame(self, fields: tuple):
+        """Frame binário já decodificado: mesmos campos do CSV, sem parse de texto."""
+        self._publish_telemetry(time.time(), fields, raw=None)
+
+    def _publish_telemetry(self, now: float, values: Sequence[float], raw: Optional[str]):
+        """
+        Parte comum a CSV e binário: monta o payload uma única vez (ele também é o
+        latest), grava calibração e entrega à FK. values são os campos já convertidos
+        (lista do parser ou tupla do frame binário).
+        """
+        n = len(values)
+        Y = list(values[2:8])
+        PWM = [int(v) for v in values[8:14]]
+
+        # Tipo de mensagem e formato pelo número de campos
+        if n >= 21:
+            roll, pitch, yaw, qw, qx, qy, qz = values[14:21]
+            mpu_data = {"roll": roll, "pitch": pitch, "yaw": yaw}
+            quaternions = {"w": qw, "x": qx, "y": qy, "z": qz}
+            msg_type, data_format = "telemetry_bno085", "bno085"
+        elif n >= 17:
+            roll, pitch, yaw = values[14:17]
+            mpu_data = {"roll": roll, "pitch": pitch, "yaw": yaw}
+            quaternions = None
+            msg_type, data_format = "telemetry_mpu", "mpu6050"
+        else:
+            mpu_data = quaternions = None
+            msg_type, data_format = "telemetry", "standard"
+
+        # Curso -> L abs (a reconstrução de pose fica a cargo da thread FK, que converte para array)
+        stroke_min = platform.stroke_min
+        L_abs = [y + stroke_min for y in Y]
+
+        payload = {
+            "type": msg_type,
+            "ts": now,
+            "sp_mm": values[1],
+            "Y": Y,
+            "PWM": PWM,
+            "mpu": mpu_data,        # Dados de orientação (ou None)
+            "quaternions": quaternions,  # Quaternions do BNO085 (ou None)
+            "format": data_format,  # "standard", "mpu6050" ou "bno085"
+            "actuator_lengths_abs": L_abs,
+            "base_points": self._base_points,
+            "raw": raw,             # linha CSV original (None no binário)
+            "encoding": "text" if raw is not None else "binary",
+        }
+        self.latest = payload  # a thread FK completa este mesmo dict com a pose
+
+        # Gravação para calibração cinemática (só faz algo se ativa)
+        calib_recorder.add(Y, quaternions)
+
+        # Entrega o frame para a thread FK (pose_live é anexado lá)
+        self._fk_submit(payload, L_abs)
+
+    # ---------- Pipeline FK (thread separada) ----------
+    def _fk_submit(self, payload: Dict[str, Any], L_abs: Sequence[float]):
+        """Coloca o frame no slot latest-wins; um frame ainda não consumido é descartado."""
+        with self._fk_cond:
+            self._fk_counters["frames_in"] += 1
+            if self._fk_pending is not None:
+                self._fk_counters["frames_dropped"] += 1
+            self._fk_pending = (payload, L_abs)
+            self._fk_cond.notify()
+
+    def _start_fk_worker(self):
+        if self.fk_thread and self.fk_thread.is_alive():
+            return
+        self.fk_thread = threading.Thread(target=self._fk_loop, daemon=True)
+        self.fk_thread.start()
+
+    def _fk_loop(self):
+        """Thread FK: resolve a pose do frame mais recente e publica a telemetria completa."""
+        print(f"🔄 Thread FK iniciada")
+        while not self.stop_evt.is_set():
+            with self._fk_cond:
+                while self._fk_pending is None and not self.stop_evt.is_set():
+                    self._fk_cond.wait(timeout=0.2)
+                item = self._fk_pending
+                self._fk_pending = None
+            if item is None:
+                continue
+            try:
+                self._publish_frame(*item)
+            except Exception as e:
+                print(f"   ❌ Erro na thread FK: {e}")
+
+    def _publish_frame(self, payload: Dict[str, Any], L_abs: Sequence[float]):
+        # Taxa FK desacoplada: entre soluções, o frame leva a última pose e a sua idade
+        now_mono = time.monotonic()
+        due = (self.fk_rate_hz <= 0 or self._fk_last_result is None
+               or now_mono - self._fk_last_solve_mono >= 1.0 / self.fk_rate_hz)
+
+        if due:
+            L_abs = np.asarray(L_abs, dtype=float)  # a leitura entrega lista; só vira array se a FK roda
+            pose_live, P_live, fk_info = self._solve_pose(L_abs)
+            self._fk_last_solve_mono = now_mono
+            cond_live = self._conditioning_live(pose_live, L_abs, P_live)
+            self._fk_last_result = (pose_live, P_live, fk_info, cond_live, payload["ts"])
+        pose_live, P_live, fk_info, cond_live, solved_ts = self._fk_last_result
+
+        payload["pose_live"] = pose_live  # dict ou None
+        payload["platform_points_live"] = P_live.tolist() if P_live is not None else None
+        payload["pose_age_ms"] = max(0.0, (payload["ts"] - solved_ts) * 1000.0)  # 0 = resolvida neste frame
+        payload["fk"] = fk_info           # método, iterações e tempo de solução da FK
+        payload["conditioning"] = cond_live  # cond(J), destreza e flag de singularidade (ou None)
+
+        with self._fk_cond:
+            c = self._fk_counters
+            c["frames_published"] += 1
+            if not due:
+                c["fk_reused"] += 1
+            else:
+                c["fk_solved"] += 1
+                if pose_live is None:
+                    c["fk_failures"] += 1
+                elif cond_live["near_singular"]:
+                    c["near_singular"] += 1
+                c["last_solve_ms"] = fk_info["solve_ms"]
+                c["max_solve_ms"] = max(c["max_solve_ms"], fk_info["solve_ms"])
+                c["total_solve_ms"] += fk_info["solve_ms"]
+
+        self._emit(payload)
+
+    @staticmethod
+    def _conditioning_live(pose_live, L_abs, P_live) -> Optional[Dict[str, Any]]:
+        """cond(J)/destreza da pose reconstruída (None se a FK falhou)."""
+        if pose_live is None:
+            return None
+        q = [pose_live[a] for a in POSE_AXES]
+        return platform.conditioning(q, L_abs, P_live)
+
+    def _solve_pose(self, L_abs: np.ndarray):
+        """Reconstrução de pose a partir de L abs, consultando o cache antes do solver."""
+        t0 = time.perf_counter()
+        cached = self.fk_cache.get(L_abs)
+        if cached is not None:
+            pose_live, P_live = cached
+            fk_info = {"method": "cache", "iterations": 0,
+                       "solve_ms": (time.perf_counter() - t0) * 1000.0,
+                       "residual_mm": None, "converged": True, "fallback": False}
+        else:
+            geo = platform  # referência local: a geometria pode ser trocada durante a solução
+            pose_live, P_live, fk_info = geo.solve_forward_kinematics(
+                L_abs, x0=self._last_pose_guess, method=self.fk_method
+            )
+            if pose_live is not None and geo is platform:
+                self.fk_cache.put(L_abs, pose_live, P_live)
+
+        if pose_live is not None:
+            self._last_pose_guess = np.array([
+                pose_live["x"], pose_live["y"], pose_live["z"],
+                pose_live["roll"], pose_live["pitch"], pose_live["yaw"]
+            ], dtype=float)
+        return pose_live, P_live, fk_info
+
+    def fk_stats(self) -> Dict[str, Any]:
+        """Contadores do pipeline de telemetria/FK"""
+        with self._fk_cond:
+            stats = dict(self._fk_counters)
+            stats["queue_depth"] = 1 if self._fk_pending is not None else 0
+        solved = stats["fk_solved"]
+        stats["mean_solve_ms"] = stats.pop("total_solve_ms") / solved if solved else 0.0
+        stats["drop_ratio"] = stats["frames_dropped"] / stats["frames_in"] if stats["frames_in"] else 0.0
+        stats["method"] = self.fk_method
+        stats["rate_hz"] = self.fk_rate_hz
+        stats["cache"] = self.fk_cache.stats()
+        return stats
+
+    def on_geometry_changed(self, new_platform: Optional["StewartPlatform"] = None):
+        """Invalida tudo que depende da geometria (cache FK e chute inicial)."""
+        geo = new_platform or platform
+        self.fk_cache.clear()
+        try:
+            z0 = geo.compute_limits()["neutral_z"]  # já calculado no precompute
+        except ValueError:
+            z0 = geo.h0
+        self._last_pose_guess = np.array([0, 0, z0, 0, 0, 0], dtype=float)
+        self._fk_last_result = None
+        self._base_points = geo.B.tolist()
+
+serial_mgr = SerialManager()
+
+# -------------------- Rig virtual (pty) --------------------
+class VirtualRig:
+    """
+    ESP32 emulado num pseudo-terminal: o backend abre o lado escravo como se fosse
+    a porta USB do ESP32 e conversa com o mesmo protocolo do firmware.
+
+    Uma thread lê comandos do lado mestre (sel=, spmm=, spmmN=, spmm6x=, kpmm=, u0a=,
+    offset=, v?, ...) com as mesmas respostas OK/ERR do firmware, roda o PID por pistão
+    (zona morta, feedforward, anti-windup) sobre seis atuadores de 1ª ordem e emite a
+    telemetria de 14/17/21 campos (texto ou frame binário) na taxa configurada.
+    Roll/pitch/yaw e quaternion vêm da cinemática direta dos comprimentos simulados.
+    """
+
+    def __init__(self, rate_hz: float = VIRTUAL_RIG_RATE_HZ_DEFAULT, telemetry_format: str = "bno085",
+                 encoding: str = "text", noise_mm: float = 0.0, seed: Optional[int] = None):
+        if telemetry_format not in VIRTUAL_RIG_FORMATS:
+            raise ValueError(f"Formato deve ser um de {sorted(VIRTUAL_RIG_FORMATS)}")
+        if encoding not in ("text", "binary"):
+            raise ValueError("Codificação deve ser 'text' ou 'binary'")
+        if rate_hz <= 0:
+            raise ValueError("Taxa de telemetria deve ser > 0")
+        self.rate_hz = float(rate_hz)
+        self.telemetry_format = telemetry_format
+        self.encoding = encoding
+        self.noise_mm = float(noise_mm)
+        self._rng = np.random.default_rng(seed)
+
+        self.port: Optional[str] = None
+        self._master: Optional[int] = None
+        self._slave: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._rx = bytearray()
+        self._out = bytearray()
+        self.lock = threading.Lock()
+        self.counters = {"frames_sent": 0, "commands": 0, "bytes_dropped": 0, "fk_failures": 0}
+        self._reset_state()
+
+    def _reset_state(self):
+        stroke = platform.stroke_max - platform.stroke_min
+        self.Lmm = np.full(6, stroke)
+        self.SP = np.full(6, 10.0)
+        self.y = np.full(6, 10.0)          # curso real (mm)
+        self.v = np.zeros(6)               # velocidade real (mm/s)
+        self.Kp = np.array([5.1478, 5.2, 5.2552, 5.0969, 5.4362, 5.1724])
+        self.Ki = np.array([0.8226, 0.7, 0.6391, 0.8, 1.124, 0.8593])
+        self.Kd = np.zeros(6)
+        self.U0a = np.array([11, 17, 10.5, 14, 14.5, 12.5])
+        self.U0r = np.array([8, 12, 9.4, 14.5, 11.4, 11.4])
+        self.offset = np.zeros(6)
+        self.V0 = np.full(6, 0.25)
+        self.V100 = np.full(6, 3.3)
+        self.integ = np.zeros(6)
+        self.last_y = self.y.copy()
+        self.pwm = np.zeros(6)
+        self.deadband = 0.2
+        self.min_pwm = 0
+        self.vmax_mm_s = 150.0
+        self.sel = 0
+        self.manual = 0                    # +1 avanço, -1 recuo, 0 PID
+        self.t0 = time.monotonic()
+        self._pose_guess = np.array([0, 0, platform.h0, 0, 0, 0], dtype=float)
+        self._orientation = (0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0)
+        self._imu_next = 0.0
+
+    # ---------- ciclo de vida ----------
+    def start(self) -> str:
+        try:
+            import pty  # só existe em sistemas POSIX
+            import tty
+        except ImportError:
+            raise RuntimeError("Rig virtual requer Linux/macOS (pseudo-terminal)")
+        if self._thread and self._thread.is_alive():
+            raise RuntimeError("Rig virtual já está rodando")
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)            # sem eco: a telemetria não volta como comando
+        tty.setraw(self._master)
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        self._reset_state()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        print(f"🧪 Rig virtual em {self.port} ({self.telemetry_format}, {self.encoding}, {self.rate_hz:.0f} Hz)")
+        return self.port
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try: os.close(fd)
+                except OSError: pass
+        self._master = self._slave = None
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def status(self) -> Dict[str, Any]:
         with self.lock:
-            if not self.ser or not self.ser.is_open:
-                raise RuntimeError("Serial não aberta")
-            self.ser.write(s.encode("utf-8", errors="replace") + ending)
+            return {
+                "running": self.running,
+                "port": self.port,
+                "rate_hz": self.rate_hz,
+                "telemetry_format": self.telemetry_format,
+                "encoding": self.encoding,
+                "noise_mm": self.noise_mm,
+                "setpoints_mm": self.SP.tolist(),
+                "strokes_mm": self.y.tolist(),
+                **self.counters,
+            }
 
-    def _reader_loop(self):
-        print(f"🔄 Thread de leitura iniciada")
-        buf = b""
-        while not self.stop_evt.is_set():
+    # ---------- laço principal ----------
+    def _loop(self):
+        import select
+        dt = 1.0 / VIRTUAL_RIG_CONTROL_HZ
+        period = 1.0 / self.rate_hz
+        sim_t = time.monotonic()
+        next_emit = sim_t
+        self._write(b"sep=;\r\n")
+        while not self._stop.is_set():
+            now = time.monotonic()
             try:
-                if not self.ser:
-                    break
-                data = self.ser.read(1024)
-            except Exception as e:
-                print(f"❌ Erro ao ler serial: {e}")
+                readable, _, _ = select.select([self._master], [], [], max(0.0, min(next_emit - now, 0.05)))
+            except (OSError, ValueError):
                 break
-            if not data:
+            if readable:
+                try:
+                    data = os.read(self._master, 4096)
+                except BlockingIOError:
+                    data = b""
+                except OSError:
+                    data = b""  # lado escravo ainda não aberto/fechado: segue emitindo
+                if data:
+                    self._on_bytes(data)
+
+            now = time.monotonic()
+            n = int((now - sim_t) / dt)
+            if n > 0:
+                with self.lock:
+                    for _ in range(min(n, int(VIRTUAL_RIG_CONTROL_HZ))):  # no máx. 1 s de atraso
+                        self._control_step(dt)
+                sim_t += n * dt
+            if now >= next_emit:
+                self._emit()
+                next_emit += period
+                if now - next_emit > period * 10:  # muito atrasado: não tenta recuperar a rajada
+                    next_emit = now + period
+            self._flush()
+
+    def _write(self, data: bytes):
+        self._out += data
+        self._flush()
+
+    def _flush(self):
+        """Escrita não bloqueante: sem host lendo, o excesso é descartado (como o USB CDC)."""
+        if not self._out or self._master is None:
+            return
+        try:
+            n = os.write(self._master, self._out)
+            del self._out[:n]
+        except BlockingIOError:
+            pass
+        except OSError:
+            del self._out[:]
+        if len(self._out) > 65536:
+            self.counters["bytes_dropped"] += len(self._out)
+            del self._out[:]
+
+    # ---------- protocolo ----------
+    def _on_bytes(self, data: bytes):
+        for b in data:
+            if b == 0x0D:
                 continue
-            buf += data
-            while b"\n" in buf:
-                line, buf = buf.split(b"\n", 1)
-                text = line.decode(errors="replace").rstrip("\r")
-                self._on_rx_line(text)
+            if b == 0x0A:
+                cmd = self._rx.decode(errors="replace").strip()
+                del self._rx[:]
+                with self.lock:
+                    self.counters["commands"] += 1
+                    reply = self.handle_command(cmd)
+                if reply:
+                    self._write(reply.encode() + b"\r\n")
+            else:
+                self._rx.append(b)
+                if len(self._rx) > VIRTUAL_RIG_MAX_CMD:
+                    del self._rx[:len(self._rx) - VIRTUAL_RIG_MAX_CMD]
+
+    def handle_command(self, cmd: str) -> Optional[str]:
+        """Interpreta uma linha como o firmware; devolve a resposta (ou None)."""
+        i = self.sel
+        low = cmd.lower()
+        num = lambda k: _arduino_float(cmd[k:])
+        if cmd.startswith("sel="):
+            self.sel = int(min(max(_arduino_float(cmd[4:]), 1), 6)) - 1
+        elif cmd.startswith("spmm="):
+            self.SP[:] = np.clip(num(5), 0.0, self.Lmm)
+        elif cmd.startswith("spmm6x="):
+            parts = cmd[7:].split(",")
+            if len(parts) < 6:
+                return "ERR spmm6x formato: spmm6x=v1,v2,v3,v4,v5,v6"
+            self.SP[:] = np.clip([_arduino_float(p) for p in parts[:6]], 0.0, self.Lmm)
+            return "OK spmm6x aplicado"
+        elif len(cmd) > 5 and cmd.startswith("spmm") and cmd[4] in "123456" and cmd[5] == "=":
+            k = int(cmd[4]) - 1
+            self.SP[k] = min(max(num(6), 0.0), self.Lmm[k])
+        elif cmd.startswith(("kpmm=", "kimm=", "kdmm=")):
+            {"p": self.Kp, "i": self.Ki, "d": self.Kd}[cmd[1]][i] = num(5)
+        elif cmd.startswith(("kpall=", "kiall=", "kdall=")):
+            {"p": self.Kp, "i": self.Ki, "d": self.Kd}[cmd[1]][:] = num(6)
+        elif cmd.startswith("dbmm="):
+            self.deadband = abs(num(5))
+        elif cmd.startswith("lmm="):
+            v = abs(num(4))
+            if v > 1e-3:
+                self.Lmm[i] = v
+        elif cmd.startswith("fc="):
+            return "INFO: fc= ignorado (mediana-3 + anti-spike dinamico)."
+        elif cmd.startswith("minpwm="):
+            self.min_pwm = int(min(max(_arduino_float(cmd[7:]), 0), 255))
+        elif cmd.startswith("vmaxmmps="):
+            v = abs(num(9))
+            if v > 1.0:
+                self.vmax_mm_s = v
+            return f"OK vmax_mm_s={self.vmax_mm_s:.1f} mm/s"
+        elif low == "zero":
+            v = self._volts(i)
+            self.V0[i] = v
+            return f"OK ZERO[{i + 1}]={v:.4f} V"
+        elif cmd.startswith("cal="):
+            if "," in cmd:
+                v0, v100 = (_arduino_float(p) for p in cmd[4:].split(",", 1))
+                if v100 > v0 + 0.02:
+                    self.V0[i], self.V100[i] = v0, v100
+                    return f"OK CAL[{i + 1}]=V0={v0:.4f} V, V100={v100:.4f} V"
+                return "ERR CAL span pequeno"
+        elif low == "mark100":
+            v = self._volts(i)
+            self.V100[i] = v
+            return f"OK V100[{i + 1}]={v:.4f} V"
+        elif low == "v?":
+            return f"V[{i + 1}]={self._volts(i):.4f} V | Y={self.y[i] + self.offset[i]:.3f} mm"
+        elif cmd.startswith(("u0a=", "u0r=")):
+            arr, name = (self.U0a, "U0_adv") if cmd[2] == "a" else (self.U0r, "U0_ret")
+            arr[i] = abs(num(4))
+            return f"OK {name}[{i + 1}]={arr[i]:.1f}"
+        elif cmd.startswith(("u0aall=", "u0rall=")):
+            arr, name = (self.U0a, "U0_adv") if cmd[2] == "a" else (self.U0r, "U0_ret")
+            arr[:] = abs(num(7))
+            return f"OK {name} para todos"
+        elif cmd.startswith("offset="):
+            self.offset[i] = num(7)
+            return f"OK offset[{i + 1}]={self.offset[i]:.3f} mm"
+        elif cmd.startswith("offsetall="):
+            val = num(10)
+            self.offset[:] = val
+            return f"OK offset para todos = {val:.3f} mm"
+        elif low == "r":
+            self.manual = -1
+        elif low == "a":
+            self.manual = 1
+        elif low == "ok":
+            self.manual = 0
+        elif low == "recalibra":
+            return "OK: Comando de recalibragem enviado via ESP-NOW."
+        return None
+
+    def _volts(self, i: int) -> float:
+        return float(self.V0[i] + (self.V100[i] - self.V0[i]) * self.y[i] / self.Lmm[i])
+
+    # ---------- simulação ----------
+    def _control_step(self, dt: float):
+        y_meas = self.y + self.offset
+        if self.manual:
+            u = np.zeros(6)
+            u[self.sel] = 70.0 if self.manual > 0 else -80.0   # ADV_PWM / RETRACT_PWM
+            self.last_y = y_meas
+        else:
+            e = self.SP - y_meas
+            ydot = (y_meas - self.last_y) / dt
+            self.last_y = y_meas
+            in_db = np.abs(e) <= self.deadband
+            has_i = self.Ki != 0.0
+            leak = in_db & has_i
+            self.integ[leak] -= self.integ[leak] / 0.5 * dt            # T_leak
+            pid = self.Kp * e + self.Ki * self.integ - self.Kd * ydot
+            u_unsat = pid + np.where(pid >= 0.0, self.U0a, -self.U0r)
+            u_sat = np.clip(u_unsat, -255.0, 255.0)
+            wind = ~in_db & has_i
+            self.integ[wind] += (e[wind] + (u_sat[wind] - u_unsat[wind]) / 0.30) * dt  # Tt_tracking
+            np.clip(self.integ, -1000.0, 1000.0, out=self.integ)
+            pwm = np.abs(u_sat)
+            pwm = np.where((pwm > 0) & (pwm < self.min_pwm), self.min_pwm, pwm)
+            u = np.where(in_db, 0.0, np.sign(u_sat) * np.round(pwm))
+
+        drive = np.maximum(np.abs(u) - VIRTUAL_RIG_STICTION_PWM, 0.0) / (255.0 - VIRTUAL_RIG_STICTION_PWM)
+        v_target = np.sign(u) * drive * VIRTUAL_RIG_ACT_VMAX_MM_S
+        self.v += (v_target - self.v) * min(dt / VIRTUAL_RIG_ACT_TAU_S, 1.0)
+        self.y += self.v * dt
+        hit = (self.y <= 0.0) | (self.y >= self.Lmm)
+        self.y = np.clip(self.y, 0.0, self.Lmm)
+        self.v[hit] = 0.0
+        self.pwm = np.abs(u)
+
+    def _orientation_from_fk(self) -> Tuple[float, ...]:
+        now = time.monotonic()
+        if now < self._imu_next:
+            return self._orientation
+        self._imu_next = now + 1.0 / VIRTUAL_RIG_IMU_HZ
+        pose, _, info = platform.solve_forward_kinematics(platform.stroke_min + self.y, x0=self._pose_guess,
+                                                          method="newton")
+        if pose is None:
+            self.counters["fk_failures"] += 1
+            return self._orientation
+        self._pose_guess = np.array([pose[a] for a in POSE_AXES])
+        roll, pitch, yaw = pose["roll"], pose["pitch"], pose["yaw"]
+        qx, qy, qz, qw = R.from_euler("ZYX", [yaw, pitch, roll], degrees=True).as_quat()
+        self._orientation = (roll, pitch, yaw, qw, qx, qy, qz)
+        return self._orientation
+
+    def telemetry_values(self) -> List[float]:
+        """Campos do próximo frame (ms;SP;Y1-6;PWM1-6[;Roll;Pitch;Yaw[;Qw;Qx;Qy;Qz]])"""
+        with self.lock:
+            y_out = self.y + self.offset
+            if self.noise_mm:
+                y_out = y_out + self._rng.normal(0.0, self.noise_mm, 6)
+            values = [int((time.monotonic() - self.t0) * 1000), float(self.SP[0]), *y_out.tolist(),
+                      *self.pwm.tolist()]
+            n = VIRTUAL_RIG_FORMATS[self.telemetry_format]
+            if n > 14:
+                values += list(self._orientation_from_fk()[:n - 14])
+        return values
+
+    def _emit(self):
+        values = self.telemetry_values()
+        if self.encoding == "binary":
+            frame = encode_binary_telemetry(values)
+        else:
+            n = len(values)
+            text = f"{values[0]};{values[1]:.3f};" + ";".join(f"{v:.3f}" for v in values[2:8]) + ";" \
+                + ";".join(f"{v:.0f}" for v in values[8:14])
+            if n >= 17:
+                text += ";" + ";".join(f"{v:.2f}" for v in values[14:17])
+            if n >= 21:
+                text += ";" + ";".join(f"{v:.4f}" for v in values[17:21])
+            frame = text.encode() + b"\r\n"
+        self.counters["frames_sent"] += 1
+        self._write(frame)
 
-        if buf:
-            try:
-                text = buf.decode(errors="replace").rstrip("\r")
-                if text:
-                    self._on_rx_line(text)
-            except Exception:
-                pass
 
-    def _on_rx_line(self, text: str):
-        now = time.time()
-        
-        # 🐛 DEBUG: Log de TODAS as linhas recebidas
-        #print(f"📥 RX: {text}")
+def _arduino_float(s: str) -> float:
+    """String.toFloat() do Arduino: prefixo numérico, 0 se não houver número."""
+    m = re.match(r"\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?", s)
+    return float(m.group(0)) if m else 0.0
 
-        if not text:
-            return
 
-        # Remove "ms;" se existir (compatibilidade)
-        if text.startswith("ms;"):
-            text = text[3:]  # Remove "ms;"
-        
-        parts = text.split(CSV_DELIM)
-        
-        # OTIMIZAÇÃO: Detectar formato automaticamente
-        # Formato ANTIGO: 14 campos (ms;SP;Y1-Y6;PWM1-PWM6)
-        # Formato MPU-6050: 17 campos (ms;SP;Y1-Y6;PWM1-PWM6;Roll;Pitch;Yaw)
-        # Formato BNO085: 21 campos (ms;SP;Y1-Y6;PWM1-PWM6;Roll;Pitch;Yaw;Qw;Qx;Qy;Qz)
-        
-        if len(parts) < 14:
-            print(f"   ⚠️ Linha NÃO é telemetria (tem {len(parts)} campos, esperado 14+)")
-            # Broadcast raw mínimo
-            self.latest = {"raw": text, "ts": now}
-            if self.loop:
-                asyncio.run_coroutine_threadsafe(ws_mgr.broadcast_json({
-                    "type": "raw",
-                    "ts": now,
-                    "raw": text,
-                }), self.loop)
-            return
+virtual_rig: Optional[VirtualRig] = None
 
-        try:
-            # Campos comuns a todos os formatos
-            ms_esp = float(parts[0].replace(",", "."))  # Tempo do ESP (ignorado)
-            sp = float(parts[1].replace(",", "."))
-            Y = [float(parts[2+i].replace(",", ".")) for i in range(6)]
-            PWM = [int(float(parts[8+i].replace(",", "."))) for i in range(6)]
-
-            # OTIMIZAÇÃO: Detectar formato (MPU-6050 ou BNO085)
-            has_mpu = len(parts) >= 17
-            has_quaternions = len(parts) >= 21
-            mpu_data = None
-            quaternions = None
-            
-            #print(f"   🔍 DEBUG: len(parts)={len(parts)}, has_mpu={has_mpu}, has_quaternions={has_quaternions}")
-            
-            if has_mpu:
-                try:
-                    roll = float(parts[14].replace(",", "."))
-                    pitch = float(parts[15].replace(",", "."))
-                    yaw = float(parts[16].replace(",", "."))
-                    mpu_data = {"roll": roll, "pitch": pitch, "yaw": yaw}
-                    
-                    if has_quaternions:
-                        # BNO085: inclui quaternions
-                        qw = float(parts[17].replace(",", "."))
-                        qx = float(parts[18].replace(",", "."))
-                        qy = float(parts[19].replace(",", "."))
-                        qz = float(parts[20].replace(",", "."))
-                        quaternions = {"w": qw, "x": qx, "y": qy, "z": qz}
-                        #print(f"   🎯 BNO085: Roll={roll:.2f}°, Pitch={pitch:.2f}°, Yaw={yaw:.2f}° | Q=[{qw:.4f}, {qx:.4f}, {qy:.4f}, {qz:.4f}]")
-
-                        
-                except Exception as e:
-                    print(f"   ⚠️ Erro ao parsear orientação: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    has_mpu = False
-                    has_quaternions = False
+# -------------------- Replay de aquisições --------------------
+_REPLAY_TIME_RE = re.compile(r"(?:(\d{1,2}):)?(\d{1,2}):(\d{2})(?:[.,](\d{1,6}))?$")  # HH:MM:SS.mmm ou MM:SS.s (Excel)
 
-            #print(f"   ✅ Telemetria: SP={sp:.2f}mm, Y={[f'{y:.1f}' for y in Y]}, PWM={PWM}")
+def parse_acquisition(data: bytes) -> Tuple[np.ndarray, List[str], Dict[str, Any]]:
+    """
+    Extrai (tempo relativo em s, linha) de uma aquisição gravada pelo host.
+    Aceita o log do monitor serial (hora;direcao;linha, só RX; a linha entre aspas CSV)
+    e os dumps com a hora do host na 1ª coluna (hora;ms;SP;FB...), cujo resto é a
+    linha como o firmware a enviou. O tempo vem da hora do host, então o replay
+    reproduz também as rajadas do USB. Cabeçalhos e linhas sem hora são ignorados.
+    """
+    text = data.decode("utf-8", errors="replace")
+    times: List[float] = []
+    lines: List[str] = []
+    info = {"format": None, "rows": 0, "skipped": 0, "tx_rows": 0}
+    day = 0.0
+    last = None
+    for row in text.split("\n"):  # splitlines quebraria em \f, \x1c... do lixo de boot
+        row = row.rstrip("\r")
+        if not row:
+            continue
+        info["rows"] += 1
+        head, sep, rest = row.partition(CSV_DELIM)
+        m = _REPLAY_TIME_RE.match(head.strip())
+        if not m or not sep:
+            info["skipped"] += 1
+            continue
+        direction, sep2, body = rest.partition(CSV_DELIM)
+        if sep2 and direction in ("RX", "TX"):
+            info["format"] = info["format"] or "monitor"
+            if direction == "TX":
+                info["tx_rows"] += 1
+                continue
+            body = body.strip()
+            if len(body) >= 2 and body[0] == '"' and body[-1] == '"':
+                body = body[1:-1].replace('""', '"')
+            line = body
+        else:
+            info["format"] = info["format"] or "raw"
+            line = rest.strip()
+        if not line:
+            info["skipped"] += 1
+            continue
+        h, mi, sec, frac = m.groups()
+        t = int(h or 0) * 3600 + int(mi) * 60 + int(sec) + (int(frac) / 10 ** len(frac) if frac else 0.0)
+        period = 86400.0 if h else 3600.0
+        if last is not None and t + day < last - period / 2:
+            day += period  # gravação atravessou a meia-noite (ou a hora, sem HH)
+        last = max(t + day, last) if last is not None else t + day
+        times.append(last)
+        lines.append(line)
+    t_arr = np.asarray(times, dtype=float)
+    if len(t_arr):
+        t_arr -= t_arr[0]
+    info["lines"] = len(lines)
+    info["duration_s"] = float(t_arr[-1]) if len(t_arr) else 0.0
+    return t_arr, lines, info
+
+def _replay_path(name: str) -> str:
+    """Caminho de uma aquisição dentro de REPLAY_DIR (ValueError se não existir ou sair do diretório)"""
+    root = os.path.realpath(REPLAY_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        raise ValueError(f"Aquisição '{name}' não encontrada")
+    return path
+
+def list_acquisitions() -> List[Dict[str, Any]]:
+    """Arquivos de aquisição em REPLAY_DIR (subpastas incluídas), com tamanho"""
+    if not os.path.isdir(REPLAY_DIR):
+        return []
+    files = []
+    for dirpath, _, names in os.walk(REPLAY_DIR):
+        for f in names:
+            if f.lower().endswith(REPLAY_EXTENSIONS):
+                full = os.path.join(dirpath, f)
+                files.append({"file": os.path.relpath(full, REPLAY_DIR).replace(os.sep, "/"),
+                              "size_bytes": os.path.getsize(full)})
+    return sorted(files, key=lambda x: x["file"])
+
+
+class TelemetryReplay:
+    """
+    Fonte de telemetria gravada: entrega as linhas de uma aquisição a
+    SerialManager._on_rx_line no ritmo original (speed=1), N vezes mais rápido
+    ou sem espera (speed=0). Parser, FK, WebSocket e gravador de calibração
+    recebem exatamente o que receberiam do rig. Suporta seek, pausa e loop.
+    """
 
-            # Determinar formato para identificação
-            if has_quaternions:
-                data_format = "bno085"
-            elif has_mpu:
-                data_format = "mpu6050"
-            else:
-                data_format = "standard"
-
-            self.latest = {
-                "ts": now, 
-                "sp_mm": sp, 
-                "Y": Y, 
-                "PWM": PWM, 
-                "mpu": mpu_data,
-                "quaternions": quaternions,
-                "raw": text, 
-                "format": data_format
-            }
+    def __init__(self, mgr: "SerialManager", path: str, speed: float = 1.0, loop: bool = False):
+        if not 0 <= speed <= REPLAY_MAX_SPEED:
+            raise ValueError(f"speed deve estar entre 0 e {REPLAY_MAX_SPEED:g}")
+        with open(path, "rb") as f:
+            self.t, self.lines, self.info = parse_acquisition(f.read())
+        if not self.lines:
+            raise ValueError(f"Aquisição sem linhas com horário: {os.path.basename(path)}")
+        self.mgr = mgr
+        self.path = path
+        rel = os.path.relpath(path, REPLAY_DIR)
+        self.name = os.path.basename(path) if rel.startswith("..") else rel.replace(os.sep, "/")
+        self.duration_s = float(self.t[-1])
+        self.speed = float(speed)
+        self.loop = loop
+        self.running = False
+        self.paused = False
+        self.lock = threading.Lock()
+        self.wake = threading.Event()  # interrompe a espera em stop/seek/pausa
+        self.stop_evt = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self._times = self.t.tolist()  # floats nativos: o laço não indexa o array numpy
+        self._index = 0
+        self._seek_to: Optional[int] = None
+        self._t_run = 0.0                        # tempo entregando linhas (sem pausas)
+        self._t_seg: Optional[float] = None      # início do trecho atual sem pausa
+        self.counters = {"lines_fed": 0, "loops": 0, "feed_s": 0.0, "max_lag_ms": 0.0}
+
+    def start(self, start_s: float = 0.0):
+        if self.running:
+            raise RuntimeError("Replay já está rodando")
+        self._index = self._index_at(start_s)
+        self.mgr.start_offline(f"replay:{self.name}")
+        self.stop_evt.clear()
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        print(f"⏯️ Replay iniciado: {self.name} ({len(self.lines)} linhas, {self.duration_s:.1f} s, speed={self.speed:g})")
 
-            # Reconstrução de pose a partir de Y (curso -> L abs)
-            L_abs = platform.stroke_min + np.array(Y, dtype=float)
-            pose_live, P_live = platform.estimate_pose_from_lengths(
-                L_abs, x0=self._last_pose_guess
-            )
-            if pose_live is not None:
-                self._last_pose_guess = np.array([
-                    pose_live["x"], pose_live["y"], pose_live["z"],
-                    pose_live["roll"], pose_live["pitch"], pose_live["yaw"]
-                ], dtype=float)
-
-            # Determinar tipo de mensagem baseado no formato
-            msg_type = "telemetry"
-            if has_quaternions:
-                msg_type = "telemetry_bno085"
-            elif has_mpu:
-                msg_type = "telemetry_mpu"
-
-            payload = {
-                "type": msg_type,
-                "ts": now,
-                "sp_mm": sp,
-                "Y": Y,
-                "PWM": PWM,
-                "mpu": mpu_data,        # Dados de orientação (ou None)
-                "quaternions": quaternions,  # Quaternions do BNO085 (ou None)
-                "format": data_format,  # "standard", "mpu6050" ou "bno085"
-                "actuator_lengths_abs": L_abs.tolist(),
-                "pose_live": pose_live,  # dict ou None
-                "platform_points_live": P_live.tolist() if P_live is not None else None,
-                "base_points": platform.B.tolist(),
-            }
-            
-            
-            if self.loop:
-                asyncio.run_coroutine_threadsafe(ws_mgr.broadcast_json(payload), self.loop)
+    def stop(self):
+        self.stop_evt.set()
+        self.wake.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
 
-        except Exception as e:
-            print(f"   ❌ Erro ao parsear telemetria: {e}")
-            if self.loop:
-                asyncio.run_coroutine_threadsafe(ws_mgr.broadcast_json({
-                    "type": "raw",
-                    "ts": now,
-                    "raw": text,
-                    "parse_error": True
-                }), self.loop)
+    def _index_at(self, position_s: float) -> int:
+        if position_s > self.duration_s:
+            raise ValueError(f"Posição {position_s:.3f} s além da duração ({self.duration_s:.3f} s)")
+        return int(np.searchsorted(self.t, position_s, side="left"))
 
-serial_mgr = SerialManager()
+    def seek(self, position_s: float, speed: Optional[float] = None):
+        """Pula para a posição (s desde o início da gravação); opcionalmente troca a velocidade"""
+        idx = self._index_at(position_s)
+        with self.lock:
+            if speed is not None:
+                self.speed = float(speed)
+            self._seek_to = idx
+            self._index = idx
+        self.wake.set()
+
+    def set_paused(self, paused: bool):
+        with self.lock:
+            self.paused = paused
+            self._seek_to = self._index  # retoma com a âncora de tempo refeita
+        self.wake.set()
+
+    def _loop(self):
+        times, lines, n = self._times, self.lines, len(self.lines)
+        feed = self.mgr._on_rx_line
+        i = self._index
+        anchor = None
+        self._t_seg = time.monotonic()
+        try:
+            while not self.stop_evt.is_set():
+                with self.lock:
+                    if self._seek_to is not None:
+                        i, self._seek_to, anchor = self._seek_to, None, None
+                    paused, speed = self.paused, self.speed
+                if paused:
+                    if self._t_seg is not None:
+                        self._t_run += time.monotonic() - self._t_seg
+                        self._t_seg = None
+                    self.wake.wait(REPLAY_WAIT_SLICE_S)
+                    self.wake.clear()
+                    continue
+                if self._t_seg is None:
+                    self._t_seg = time.monotonic()
+                if i >= n:
+                    if not self.loop:
+                        break
+                    i, anchor = 0, None
+                    self.counters["loops"] += 1
+                if speed > 0:
+                    now = time.monotonic()
+                    if anchor is None:
+                        anchor = now - times[i] / speed
+                    delay = anchor + times[i] / speed - now
+                    if delay > 0:
+                        self.wake.wait(min(delay, REPLAY_WAIT_SLICE_S))
+                        self.wake.clear()
+                        continue
+                    lag_ms = -delay * 1000.0
+                    if lag_ms > self.counters["max_lag_ms"]:
+                        self.counters["max_lag_ms"] = lag_ms
+                t0 = time.perf_counter()
+                feed(lines[i])
+                self.counters["feed_s"] += time.perf_counter() - t0
+                self.counters["lines_fed"] += 1
+                i += 1
+                self._index = i
+        finally:
+            if self._t_seg is not None:
+                self._t_run += time.monotonic() - self._t_seg
+                self._t_seg = None
+            self.mgr.stop_offline()  # libera o SerialManager antes de sinalizar o fim
+            self.running = False
+            print(f"⏹️ Replay encerrado: {self.name} ({self.counters['lines_fed']} linhas entregues)")
+
+    def status(self) -> Dict[str, Any]:
+        i = min(self._index, len(self.lines) - 1)
+        seg = self._t_seg
+        run_s = self._t_run + (time.monotonic() - seg if seg is not None else 0.0)
+        fed = self.counters["lines_fed"]
+        return {
+            "running": self.running,
+            "paused": self.paused,
+            "file": self.name,
+            "format": self.info["format"],
+            "lines": len(self.lines),
+            "skipped_rows": self.info["skipped"],
+            "duration_s": self.duration_s,
+            "index": self._index,
+            "position_s": float(self._times[i]),
+            "speed": self.speed,
+            "loop": self.loop,
+            "loops": self.counters["loops"],
+            "lines_fed": fed,
+            "lines_per_s": fed / run_s if run_s > 0 else 0.0,
+            "avg_feed_us": self.counters["feed_s"] / fed * 1e6 if fed else 0.0,
+            "max_lag_ms": self.counters["max_lag_ms"],
+        }
+
+
+replay: Optional[TelemetryReplay] = None
 
 # -------------------- Cache de Ganhos PID --------------------
 # Cache dos últimos ganhos enviados (já que o ESP32 não tem comando para ler)
@@ -736,6 +3927,13 @@ class MotionRunner:
         self._z_limits_mm: Optional[Tuple[float, float]] = None  # (z_min, z_max)
         self._home_z_mm: float = 520 # Altura Z absoluta para HOME
         self._z_safety_mm: float = 5.0    # margem de segurança contra batente
+        self._angle_safety_deg: float = 0.5  # margem de segurança angular
+        self._axis_limits_home: Optional[Dict[str, Tuple[float, float]]] = None  # limites por eixo da HOME
+
+        # --- limites dinâmicos dos atuadores (verificados no precheck) ---
+        self.vmax_mm_s: float = ACTUATOR_VMAX_MM_S_DEFAULT
+        self.amax_mm_s2: float = ACTUATOR_AMAX_MM_S2_DEFAULT
+        self.enforce_limits: bool = True
     
     def _home_pose(self) -> dict:
         """
@@ -744,48 +3942,49 @@ class MotionRunner:
         return {"x": 0.0, "y": 0.0, "z": self._home_z_mm,
                 "roll": 0.0, "pitch": 0.0, "yaw": 0.0}
 
-    def _calibrate_limits_from_home(self):
+    def _home_axis_limits(self) -> Optional[Dict[str, Tuple[float, float]]]:
         """
-        Recalibra limites seguros de Z a partir da HOME atual (considerando folga real de curso).
-        Define self._z_limits_mm = (z_min, z_max).
+        Limites seguros {eixo: (min, max)} a partir da HOME atual usando StewartPlatform.compute_limits
+        (mesmos números servidos em GET /config/limits), descontadas as margens de segurança.
+        None se a HOME for inválida (clamps padrão de _clamp_pose). Não altera o runner.
         """
-        pose_home = self._home_pose()
-        # print(f"📏 _calibrate_limits_from_home: pose_home = {pose_home}")
-        
-        L0, valid, _ = self.platform.inverse_kinematics(**pose_home)
-        if not valid:
-            # print("⚠️ HOME inválida na calibração; usando clamps padrão de _clamp_pose.")
-            self._z_limits_mm = None
-            return
-
-        L0 = np.asarray(L0, dtype=float)
-        # print(f"📏 Comprimentos L0 na HOME: {L0}")
-        # print(f"📏 stroke_min={self.platform.stroke_min}, stroke_max={self.platform.stroke_max}")
-        
-        up_margin  = float(np.min(self.platform.stroke_max - L0))   # mm até batente superior
-        down_margin = float(np.min(L0 - self.platform.stroke_min))  # mm até batente inferior
-        
-        # print(f"📏 Margens brutas: up_margin={up_margin:.2f}mm, down_margin={down_margin:.2f}mm")
-
-        # tira margem de segurança
-        up_margin   = max(0.0, up_margin  - self._z_safety_mm)
-        down_margin = max(0.0, down_margin - self._z_safety_mm)
-        
-        # print(f"📏 Margens com segurança ({self._z_safety_mm}mm): up={up_margin:.2f}mm, down={down_margin:.2f}mm")
+        try:
+            limits = self.platform.compute_limits(self._home_pose())
+        except ValueError:
+            return None
+
+        axis_limits = {}
+        for name, lim in limits["axes"].items():
+            safety = self._z_safety_mm if name in ("x", "y", "z") else self._angle_safety_deg
+            lo, hi = lim["min"] + safety, lim["max"] - safety
+            if lo <= hi:
+                axis_limits[name] = (lo, hi)
+        return axis_limits
 
-        z_home = pose_home["z"]
-        # Calcular limites baseados nas margens reais, SEM clamps artificiais
-        z_min = z_home - down_margin
-        z_max = z_home + up_margin
-        
-        #print(f"📏 Cálculo: z_home={z_home}, z_min={z_min:.2f}, z_max={z_max:.2f}")
+    def _calibrate_limits_from_home(self):
+        """
+        Recalibra os limites a partir da HOME atual (_home_axis_limits).
+        Define self._z_limits_mm = (z_min, z_max) e self._axis_limits_home = {eixo: (min, max)}.
+        """
+        axis_limits = self._home_axis_limits()
+        self._axis_limits_home = axis_limits
+        self._z_limits_mm = axis_limits.get("z") if axis_limits is not None else None
 
-        if z_min > z_max:
-            #print("⚠️ Limites Z degenerados na calibração; usando clamps padrão.")
-            self._z_limits_mm = None
+    def on_geometry_changed(self, new_platform: "StewartPlatform"):
+        """
+        Passa a usar a nova geometria: descarta os limites calibrados da anterior e
+        ajusta a HOME (home_z do perfil; senão mantém a atual se ainda for válida,
+        ou cai para a altura neutra).
+        """
+        self.platform = new_platform
+        self._z_limits_mm = None
+        self._axis_limits_home = None
+        if new_platform.home_z is not None:
+            self._home_z_mm = float(new_platform.home_z)
         else:
-            self._z_limits_mm = (z_min, z_max)
-            #print(f"✅ Limites Z calibrados da HOME: [{z_min:.2f}, {z_max:.2f}] mm")
+            _, valid, _ = new_platform.inverse_kinematics(**self._home_pose())
+            if not valid:
+                self._home_z_mm = new_platform.compute_limits()["neutral_z"]
 
     def home_and_calibrate_limits(self, go_home_duration: float = 1.5):
         """Vai para HOME suavemente e recalibra limites com base nas folgas reais."""
@@ -865,21 +4064,14 @@ class MotionRunner:
             
             t = 0.0
             step = 0
+            near_singular_ticks = 0
             
             print(f"▶️  Iniciando rotina '{routine_name}' por {duration}s @ {hz}Hz")
             
             while t < duration and not self.stop_evt.is_set():
                 
                 # Calcular fator de ramp (ramp-in e ramp-out suaves com cosseno)
-                if t < ramp_time:
-                    # Ramp-in: 0 -> 1 usando (1 - cos(π*t/ramp_time))/2
-                    ramp_factor = (1.0 - cos(tau * 0.5 * t / ramp_time)) / 2.0
-                elif t > (duration - ramp_time):
-                    # Ramp-out: 1 -> 0
-                    remaining = duration - t
-                    ramp_factor = (1.0 - cos(tau * 0.5 * remaining / ramp_time)) / 2.0
-                else:
-                    ramp_factor = 1.0
+                ramp_factor = self._ramp_factor(t, duration, ramp_time)
                 
                 # Gerar pose baseada na rotina
                 pose = self._generate_pose(req, t, hz, ramp_factor)
@@ -893,7 +4085,7 @@ class MotionRunner:
                 
                 # Validar com inverse kinematics
                 z_val = pose.get("z", self.platform.h0)
-                L, valid, _ = self.platform.inverse_kinematics(
+                L, valid, P = self.platform.inverse_kinematics(
                     x=pose["x"], y=pose["y"], z=z_val,
                     roll=pose["roll"], pitch=pose["pitch"], yaw=pose["yaw"]
                 )
@@ -901,6 +4093,15 @@ class MotionRunner:
                 if not valid:
                     print(f"❌ Pose inválida em t={t:.2f}s: {pose}")
                     break
+
+                # Proximidade de singularidade (SVD 6x6, barato a cada tick)
+                cond = self.platform.conditioning(
+                    [pose["x"], pose["y"], z_val, pose["roll"], pose["pitch"], pose["yaw"]], L, P
+                )
+                if cond["near_singular"]:
+                    if near_singular_ticks == 0:
+                        print(f"⚠️ Pose perto de singularidade em t={t:.2f}s (destreza={cond['dexterity']:.3f})")
+                    near_singular_ticks += 1
                 
                 # Converter para curso (mm)
                 course_mm = self.platform.lengths_to_stroke_mm(L)
@@ -937,13 +4138,12 @@ class MotionRunner:
                         "pose_cmd": pose,
                         "routine": routine_name,
                         "actuators_cmd": actuators_cmd,
-                        "actuators_real": actuators_real
+                        "actuators_real": actuators_real,
+                        "dexterity": cond["dexterity"],
+                        "near_singular": cond["near_singular"],
                     }
                     
-                    asyncio.run_coroutine_threadsafe(
-                        ws_mgr.broadcast_json(payload),
-                        self.serial_mgr.loop
-                    )
+                    ws_mgr.broadcast_threadsafe(payload, self.serial_mgr.loop)
                 except Exception as e:
                     import traceback
                     traceback.print_exc()
@@ -960,6 +4160,137 @@ class MotionRunner:
             with self.lock:
                 self.status_dict["running"] = False
     
+    @staticmethod
+    def _ramp_factor(t: float, duration: float, ramp_time: float) -> float:
+        """Ramp-in e ramp-out suaves com cosseno: 0 -> 1 -> 0"""
+        if t < ramp_time:
+            # Ramp-in: 0 -> 1 usando (1 - cos(π*t/ramp_time))/2
+            return (1.0 - cos(tau * 0.5 * t / ramp_time)) / 2.0
+        if t > (duration - ramp_time):
+            # Ramp-out: 1 -> 0
+            remaining = duration - t
+            return (1.0 - cos(tau * 0.5 * remaining / ramp_time)) / 2.0
+        return 1.0
+
+    def _trajectory_poses(self, req: MotionRequest, ts: np.ndarray,
+                          axis_limits: Dict[str, Tuple[float, float]]) -> np.ndarray:
+        """
+        Poses (N, 6) da rotina nos instantes ts com o mesmo ramp e clamps de _run_routine,
+        limitadas por axis_limits (limites da HOME; {} = só os clamps padrão).
+        """
+        ramp_time = min(2.0, req.duration_s * 0.2)
+        poses = np.empty((len(ts), 6))
+        for i, t in enumerate(ts):
+            pose = self._generate_pose(req, t, req.hz, self._ramp_factor(t, req.duration_s, ramp_time))
+            pose = self._clamp_pose(pose, verbose=False, axis_limits=axis_limits)
+            poses[i] = [pose["x"], pose["y"], pose.get("z", self.platform.h0),
+                        pose["roll"], pose["pitch"], pose["yaw"]]
+        return poses
+
+    @staticmethod
+    def _routine_period(req: MotionRequest) -> Optional[float]:
+        """Período (s) do regime da rotina; None se não repetir (helix com z_cycles irracional)."""
+        if req.routine != "helix":
+            return 1.0 / req.hz
+        z_cycles = req.z_cycles if req.z_cycles is not None else 1.0
+        ratio = Fraction(z_cycles).limit_denominator(1000)  # z_cycles = p/q → repete a cada q voltas
+        if abs(float(ratio) - z_cycles) > 1e-9:
+            return None
+        return ratio.denominator / req.hz
+
+    @staticmethod
+    def _precheck_windows(req: MotionRequest, n: int, dt: float, period: Optional[float]) -> List[Tuple[int, int]]:
+        """
+        Trechos [i, j) da grade t = k*dt que o precheck precisa amostrar. A rotina é periódica
+        fora do ramp: ramp-in + um período e um período + ramp-out cobrem todos os valores de
+        pose/velocidade/aceleração (e o primeiro instante de cada violação). Sem período ou
+        quando os trechos se encontram, a rotina inteira. dt deve dividir o período.
+        """
+        if period is None:
+            return [(0, n)]
+        span = min(2.0, req.duration_s * 0.2) + period
+        head = int(np.ceil(span / dt)) + 1
+        tail = int(np.floor((req.duration_s - span) / dt))
+        if head >= tail:
+            return [(0, n)]
+        return [(0, head), (tail, n)]
+
+    def precheck(self, req: MotionRequest, include_profiles: bool = False) -> Dict[str, Any]:
+        """
+        Verificação prévia da rotina: IK, condicionamento e velocidade/aceleração de cada
+        perna (vetorizado), usando os limites da HOME sem alterar os do runner (seguro em
+        /motion/analyze com rotina em curso). Passo de no máximo o tick e pelo menos
+        MOTION_PRECHECK_SAMPLES_PER_CYCLE amostras por ciclo, ajustado para dividir o período;
+        rotinas longas amostram só ramp-in + um período e um período + ramp-out
+        (_precheck_windows), não um passo maior.
+        """
+        t0 = time.perf_counter()
+        axis_limits = self._home_axis_limits() or {}
+        dt = min(1.0 / 60.0, 1.0 / (MOTION_PRECHECK_SAMPLES_PER_CYCLE * req.hz))
+        period = self._routine_period(req)
+        if period is not None:
+            # Período = nº inteiro de passos: o regime se repete amostra a amostra e os trechos
+            # dão os mesmos picos da grade inteira
+            dt = period / np.ceil(period / dt - 1e-9)
+        grid = np.arange(0.0, req.duration_s, dt)
+        windows = self._precheck_windows(req, len(grid), dt, period)
+        # 2 amostras de contexto em cada corte: derivadas centrais iguais às da rotina inteira
+        spans = [(max(i - 2, 0), min(j + 2, len(grid))) for i, j in windows]
+        poses = self._trajectory_poses(req, np.concatenate([grid[lo:hi] for lo, hi in spans]), axis_limits)
+        L, valid, _, cond, dexterity, near_singular = self.platform.conditioning_batch(poses)
+        keep, v_parts, a_parts = [], [], []
+        k = 0
+        for (i, j), (lo, hi) in zip(windows, spans):  # derivadas por trecho: não cruzam o intervalo omitido
+            v, a = self.platform.leg_rates(L[k:k + hi - lo], dt)
+            v_parts.append(v[i - lo:j - lo])
+            a_parts.append(a[i - lo:j - lo])
+            keep.append(np.arange(k + i - lo, k + j - lo))
+            k += hi - lo
+        keep = np.concatenate(keep)
+        ts = np.concatenate([grid[i:j] for i, j in windows])
+        valid, cond, dexterity, near_singular = valid[keep], cond[keep], dexterity[keep], near_singular[keep]
+        v, a = np.concatenate(v_parts), np.concatenate(a_parts)
+
+        invalid_idx = np.flatnonzero(~valid)
+        singular_idx = np.flatnonzero(near_singular)
+
+        v_peak = np.abs(v).max(axis=0)
+        a_peak = np.abs(a).max(axis=0)
+        over = np.abs(v).max(axis=1) > self.vmax_mm_s
+        if self.amax_mm_s2 > 0:
+            over |= np.abs(a).max(axis=1) > self.amax_mm_s2
+        over_idx = np.flatnonzero(over)
+        dynamics_ok = not over_idx.size
+
+        result = {
+            "samples": int(len(ts)),
+            "dt_s": dt,
+            "windows_s": [[float(grid[i]), float(grid[j - 1])] for i, j in windows],
+            "all_valid": bool(valid.all()),
+            "first_invalid_t": float(ts[invalid_idx[0]]) if invalid_idx.size else None,
+            "min_dexterity": float(dexterity.min()),
+            "max_condition_number": float(cond.max()),
+            "near_singular_samples": int(singular_idx.size),
+            "first_near_singular_t": float(ts[singular_idx[0]]) if singular_idx.size else None,
+            "vmax_mm_s": self.vmax_mm_s,
+            "amax_mm_s2": self.amax_mm_s2,
+            "peak_velocity_mm_s": v_peak.tolist(),      # por perna
+            "peak_acceleration_mm_s2": a_peak.tolist(),  # por perna
+            "velocity_ok": bool(v_peak.max() <= self.vmax_mm_s),
+            "acceleration_ok": bool(self.amax_mm_s2 <= 0 or a_peak.max() <= self.amax_mm_s2),
+            "dynamics_ok": dynamics_ok,
+            "first_dynamics_violation_t": float(ts[over_idx[0]]) if over_idx.size else None,
+            "feasible": bool(valid.all()) and dynamics_ok,
+        }
+        if include_profiles:
+            result["profiles"] = {
+                "t": ts.tolist(),
+                "velocity_mm_s": v.tolist(),
+                "acceleration_mm_s2": a.tolist(),
+            }
+        result["compute_ms"] = (time.perf_counter() - t0) * 1000.0
+        return result
+
     def _generate_pose(self, req: MotionRequest, t: float, hz: float, ramp: float) -> dict:
         """Gera a pose para um instante t baseado na rotina"""
         routine = req.routine
@@ -1051,34 +4382,51 @@ class MotionRunner:
             # Fallback: parado na altura base elevada
             return {"x": 0, "y": 0, "z": z_base, "roll": 0, "pitch": 0, "yaw": 0}
     
-    def _clamp_pose(self, pose: dict) -> dict:
+    def _clamp_pose(self, pose: dict, verbose: bool = True,
+                    axis_limits: Optional[Dict[str, Tuple[float, float]]] = None) -> dict:
         """Limita a pose para valores seguros.
-           OBS: Se _z_limits_mm foi calibrado na HOME, priorizamos esse intervalo para Z.
+           OBS: Se _z_limits_mm foi calibrado na HOME, priorizamos esse intervalo para Z;
+           nos demais eixos a caixa fixa é intersectada com os limites calibrados.
+           axis_limits: {eixo: (min, max)} no lugar dos calibrados ({} = só os clamps padrão).
         """
+        if axis_limits is None:
+            axis_limits, z_limits = self._axis_limits_home, self._z_limits_mm
+        else:
+            z_limits = axis_limits.get("z")
         z_base = self._home_z_mm  # Altura base do HOME
         
         z_original = pose.get("z", z_base)
         
-        pose["x"] = float(np.clip(pose["x"], -50.0, 50.0))
-        pose["y"] = float(np.clip(pose["y"], -50.0, 50.0))
+        pose["x"] = self._clip_axis("x", pose["x"], -50.0, 50.0, axis_limits)
+        pose["y"] = self._clip_axis("y", pose["y"], -50.0, 50.0, axis_limits)
 
         # Z: usar limites dinâmicos calculados a partir da HOME quando disponíveis
-        if self._z_limits_mm is not None:
-            z_min, z_max = self._z_limits_mm
+        if z_limits is not None:
+            z_min, z_max = z_limits
             pose["z"] = float(np.clip(z_original, z_min, z_max))
-            if abs(pose["z"] - z_original) > 0.1:  # Se clipou mais de 0.1mm
+            if verbose and abs(pose["z"] - z_original) > 0.1:  # Se clipou mais de 0.1mm
                 print(f"⚠️ Z clipado: {z_original:.2f} -> {pose['z']:.2f} (limites: [{z_min:.2f}, {z_max:.2f}])")
         else:
             # Fallback: permite oscilação razoável em torno da altura base (±30mm)
             pose["z"] = float(np.clip(z_original, z_base - 30.0, z_base + 30.0))
-            if abs(pose["z"] - z_original) > 0.1:
+            if verbose and abs(pose["z"] - z_original) > 0.1:
                 print(f"⚠️ Z clipado (fallback): {z_original:.2f} -> {pose['z']:.2f} (limites: [{z_base-30:.2f}, {z_base+30:.2f}])")
 
-        pose["roll"]  = float(np.clip(pose["roll"],  -10.0, 10.0))
-        pose["pitch"] = float(np.clip(pose["pitch"], -10.0, 10.0))
-        pose["yaw"]   = float(np.clip(pose["yaw"],   -10.0, 10.0))
+        pose["roll"]  = self._clip_axis("roll",  pose["roll"],  -10.0, 10.0, axis_limits)
+        pose["pitch"] = self._clip_axis("pitch", pose["pitch"], -10.0, 10.0, axis_limits)
+        pose["yaw"]   = self._clip_axis("yaw",   pose["yaw"],   -10.0, 10.0, axis_limits)
         
         return pose
+
+    @staticmethod
+    def _clip_axis(name: str, value: float, lo: float, hi: float,
+                   axis_limits: Optional[Dict[str, Tuple[float, float]]]) -> float:
+        """Clip pela caixa fixa intersectada com os limites calibrados da HOME (se houver)."""
+        if axis_limits and name in axis_limits:
+            a_lo, a_hi = axis_limits[name]
+            if max(lo, a_lo) <= min(hi, a_hi):
+                lo, hi = max(lo, a_lo), min(hi, a_hi)
+        return min(max(float(value), lo), hi)
     
     def _go_home_smooth(self, duration: float = 1.5):
         """Retorna suavemente para a pose home (0,0,h0+bias,0,0,0)"""
@@ -1143,11 +4491,96 @@ motion_runner = MotionRunner(serial_mgr, platform)
 def api_list_ports():
     return {"ports": serial_mgr.list_ports()}
 
+@app.get("/virtual-rig")
+def get_virtual_rig():
+    """Estado do ESP32 emulado (porta pty, formato, setpoints e cursos simulados)"""
+    return virtual_rig.status() if virtual_rig is not None else {"running": False, "port": None}
+
+@app.post("/virtual-rig/start")
+def start_virtual_rig(cfg: VirtualRigConfig):
+    """Cria o pseudo-terminal do rig virtual; a porta passa a aparecer em /serial/ports"""
+    global virtual_rig
+    if virtual_rig is not None and virtual_rig.running:
+        raise HTTPException(status_code=409, detail=f"Rig virtual já está rodando em {virtual_rig.port}")
+    try:
+        rig = VirtualRig(cfg.rate_hz, cfg.telemetry_format, cfg.encoding, cfg.noise_mm, cfg.seed)
+        rig.start()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    virtual_rig = rig
+    return {"message": f"Rig virtual em {rig.port}", **rig.status()}
+
+@app.post("/virtual-rig/stop")
+def stop_virtual_rig():
+    """Para o rig virtual (fecha a serial antes, se estiver conectada a ele)"""
+    if virtual_rig is None or not virtual_rig.running:
+        return {"message": "Rig virtual não está rodando"}
+    if serial_mgr.ser is not None and getattr(serial_mgr.ser, "port", None) == virtual_rig.port:
+        serial_mgr.close()
+    virtual_rig.stop()
+    return {"message": "Rig virtual parado"}
+
+@app.get("/replay/files")
+def get_replay_files():
+    """Aquisições gravadas disponíveis para replay"""
+    return {"dir": REPLAY_DIR, "files": list_acquisitions()}
+
+@app.get("/replay")
+def get_replay():
+    """Estado do replay (posição, velocidade, linhas/s entregues a _on_rx_line)"""
+    return replay.status() if replay is not None else {"running": False, "file": None}
+
+@app.post("/replay/start")
+def start_replay(req: ReplayRequest):
+    """Reproduz uma aquisição pelo mesmo caminho da serial (requer a porta fechada)"""
+    global replay
+    if replay is not None and replay.running:
+        raise HTTPException(status_code=409, detail=f"Replay já está rodando ({replay.name})")
+    try:
+        path = _replay_path(req.file)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        rp = TelemetryReplay(serial_mgr, path, req.speed, req.loop)
+        rp.start(req.start_s)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    replay = rp
+    return {"message": f"Replay de {rp.name}", **rp.status()}
+
+@app.post("/replay/seek")
+def seek_replay(req: ReplaySeek):
+    """Pula para position_s (e troca a velocidade, se informada)"""
+    if replay is None or not replay.running:
+        raise HTTPException(status_code=409, detail="Replay não está rodando")
+    try:
+        replay.seek(req.position_s, req.speed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return replay.status()
+
+@app.post("/replay/{action}")
+def control_replay(action: str):
+    """pause, resume ou stop"""
+    if action not in ("pause", "resume", "stop"):
+        raise HTTPException(status_code=400, detail="Ação inválida. Use 'pause', 'resume' ou 'stop'")
+    if replay is None or not replay.running:
+        return {"message": "Replay não está rodando"}
+    if action == "stop":
+        replay.stop()
+        return {"message": "Replay parado", **replay.status()}
+    replay.set_paused(action == "pause")
+    return replay.status()
+
 @app.post("/serial/open")
 def api_open_serial(req: SerialOpenRequest):
     try:
-        serial_mgr.open(req.port, req.baud or BAUD)
-        return {"message": f"OK: aberto {req.port} @ {req.baud or BAUD}"}
+        serial_mgr.open(req.port, req.baud or BAUD, req.transport)
+        return {"message": f"OK: aberto {req.port} @ {req.baud or BAUD}", "transport": serial_mgr.transport}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -1167,7 +4600,9 @@ def api_serial_status():
         port_name = serial_mgr.ser.port if is_open else None
         return {
             "connected": is_open,
-            "port": port_name
+            "port": port_name,
+            "transport": serial_mgr.transport if is_open else None,
+            "tx_error": serial_mgr.tx_error if is_open else None,
         }
     except Exception as e:
         return {
@@ -1175,9 +4610,17 @@ def api_serial_status():
             "port": None
         }
 
+@app.get("/serial/stats")
+def api_serial_stats():
+    """Vazão da leitura serial (bytes/s, linhas/s, frames binários, CRC) e estado da fila TX"""
+    stats = serial_mgr.rx_stats()
+    stats["tx"] = serial_mgr.tx_stats()
+    stats["transactions"] = serial_mgr.txn_stats()
+    return stats
+
 @app.get("/telemetry")
 def api_telemetry():
-    return serial_mgr.latest or {}
+    return dict(serial_mgr.latest)  # cópia: a thread FK ainda pode estar completando o frame
 
 @app.post("/serial/send")
 def api_send_command(cmd: PIDCommand):
@@ -1188,7 +4631,93 @@ def api_send_command(cmd: PIDCommand):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/serial/transaction")
+def api_serial_transaction(txn: SerialTransaction):
+    """Envia um lote de comandos e espera as respostas OK/ERR do firmware"""
+    try:
+        return serial_mgr.transaction(txn.commands, timeout=txn.timeout_s)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+# -------------------- Endpoints Cinemática Direta --------------------
+@app.get("/fk/settings")
+def get_fk_settings():
+    """Retorna as configurações da reconstrução de pose (cinemática direta)"""
+    cache = serial_mgr.fk_cache
+    return {
+        "method": serial_mgr.fk_method,
+        "methods": list(FK_METHODS),
+        "cache_enabled": cache.enabled,
+        "cache_resolution_mm": cache.resolution_mm,
+        "cache_size": cache.max_entries,
+        "rate_hz": serial_mgr.fk_rate_hz,
+    }
+
+@app.get("/fk/stats")
+def get_fk_stats():
+    """Profundidade da fila e frames descartados do pipeline leitura → FK"""
+    return serial_mgr.fk_stats()
+
+@app.post("/fk/settings")
+def set_fk_settings(settings: FKSettings):
+    """Seleciona o motor da cinemática direta usado na telemetria"""
+    try:
+        if settings.method is not None:
+            if settings.method not in FK_METHODS:
+                raise ValueError(f"Método inválido. Use: {', '.join(FK_METHODS)}")
+            serial_mgr.fk_method = settings.method
+        if settings.rate_hz is not None:
+            serial_mgr.fk_rate_hz = float(settings.rate_hz)
+        serial_mgr.fk_cache.configure(
+            enabled=settings.cache_enabled,
+            resolution_mm=settings.cache_resolution_mm,
+            max_entries=settings.cache_size,
+        )
+        return {"message": "Configurações FK atualizadas", **get_fk_settings()}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # -------------------- Endpoints PID Control --------------------
+def _pid_transaction(commands: List[str]) -> Dict[str, Any]:
+    """Executa o lote confirmado; ERR ou falta de resposta viram erro do handler"""
+    if not commands:
+        return {"ok": True, "commands": [], "elapsed_ms": 0.0}
+    result = serial_mgr.transaction(commands)
+    if not result["ok"]:
+        detail = "; ".join(result["errors"] + [f"sem resposta a '{c}'" for c in result["timeouts"]])
+        raise RuntimeError(f"Firmware não confirmou: {detail}")
+    return result
+
+def _gains_commands(gains: PIDGains) -> List[str]:
+    if not 1 <= gains.piston <= 6:
+        raise ValueError("Pistão deve ser 1-6")
+    cmds = [f"sel={gains.piston}"]
+    if gains.kp is not None:
+        cmds.append(f"kpmm={gains.kp:.4f}")
+    if gains.ki is not None:
+        cmds.append(f"kimm={gains.ki:.4f}")
+    if gains.kd is not None:
+        cmds.append(f"kdmm={gains.kd:.4f}")
+    return cmds
+
+def _feedforward_commands(ff: PIDFeedforward) -> List[str]:
+    if not 1 <= ff.piston <= 6:
+        raise ValueError("Pistão deve ser 1-6")
+    cmds = [f"sel={ff.piston}"]
+    if ff.u0_adv is not None:
+        cmds.append(f"u0a={ff.u0_adv:.2f}")
+    if ff.u0_ret is not None:
+        cmds.append(f"u0r={ff.u0_ret:.2f}")
+    return cmds
+
+def _cache_gains(gains: PIDGains):
+    for k in ("kp", "ki", "kd"):
+        v = getattr(gains, k)
+        if v is not None:
+            pid_gains_cache[gains.piston][k] = v
+
 @app.post("/pid/setpoint")
 def set_pid_setpoint(sp: PIDSetpoint):
     """Define setpoint em mm (global ou individual)"""
@@ -1210,27 +4739,10 @@ def set_pid_setpoint(sp: PIDSetpoint):
 def set_pid_gains(gains: PIDGains):
     """Define ganhos PID para um pistão específico"""
     try:
-        if not 1 <= gains.piston <= 6:
-            raise ValueError("Pistão deve ser 1-6")
-        
-        # Seleciona o pistão
-        serial_mgr.write_line(f"sel={gains.piston}")
-        time.sleep(0.01)
-        
-        if gains.kp is not None:
-            serial_mgr.write_line(f"kpmm={gains.kp:.4f}")
-            time.sleep(0.01)
-            pid_gains_cache[gains.piston]["kp"] = gains.kp
-        if gains.ki is not None:
-            serial_mgr.write_line(f"kimm={gains.ki:.4f}")
-            time.sleep(0.01)
-            pid_gains_cache[gains.piston]["ki"] = gains.ki
-        if gains.kd is not None:
-            serial_mgr.write_line(f"kdmm={gains.kd:.4f}")
-            time.sleep(0.01)
-            pid_gains_cache[gains.piston]["kd"] = gains.kd
-        
-        return {"message": f"Ganhos atualizados para pistão {gains.piston}"}
+        # sel= + ganhos num lote só; o cache muda depois da confirmação
+        result = _pid_transaction(_gains_commands(gains))
+        _cache_gains(gains)
+        return {"message": f"Ganhos atualizados para pistão {gains.piston}", "ack_ms": result["elapsed_ms"]}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -1250,23 +4762,37 @@ def get_pid_gains(piston: int):
 def set_pid_gains_all(kp: Optional[float] = None, ki: Optional[float] = None, kd: Optional[float] = None):
     """Define ganhos PID para todos os pistões"""
     try:
-        if kp is not None:
-            serial_mgr.write_line(f"kpall={kp:.4f}")
-            time.sleep(0.01)
-            for piston in range(1, 7):
-                pid_gains_cache[piston]["kp"] = kp
-        if ki is not None:
-            serial_mgr.write_line(f"kiall={ki:.4f}")
-            time.sleep(0.01)
-            for piston in range(1, 7):
-                pid_gains_cache[piston]["ki"] = ki
-        if kd is not None:
-            serial_mgr.write_line(f"kdall={kd:.4f}")
-            time.sleep(0.01)
-            for piston in range(1, 7):
-                pid_gains_cache[piston]["kd"] = kd
+        values = {"kp": kp, "ki": ki, "kd": kd}
+        cmds = [f"{k}all={v:.4f}" for k, v in values.items() if v is not None]
+        result = _pid_transaction(cmds)
+        for k, v in values.items():
+            if v is not None:
+                for piston in range(1, 7):
+                    pid_gains_cache[piston][k] = v
         
-        return {"message": "Ganhos aplicados para todos os pistões"}
+        return {"message": "Ganhos aplicados para todos os pistões", "ack_ms": result["elapsed_ms"]}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/pid/batch")
+def set_pid_batch(batch: PIDBatch):
+    """Ganhos e feedforward de vários pistões numa única transação (uma ida e volta)"""
+    try:
+        cmds = []
+        for gains in batch.gains:
+            cmds += _gains_commands(gains)
+        for ff in batch.feedforward:
+            cmds += _feedforward_commands(ff)
+        if not cmds:
+            raise ValueError("Lote vazio")
+        result = _pid_transaction(cmds)
+        for gains in batch.gains:
+            _cache_gains(gains)
+        return {
+            "message": f"Lote aplicado: {len(batch.gains)} ganhos, {len(batch.feedforward)} feedforward",
+            "commands": len(cmds),
+            "ack_ms": result["elapsed_ms"],
+        }
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -1274,20 +4800,8 @@ def set_pid_gains_all(kp: Optional[float] = None, ki: Optional[float] = None, kd
 def set_pid_feedforward(ff: PIDFeedforward):
     """Define feedforward para um pistão específico"""
     try:
-        if not 1 <= ff.piston <= 6:
-            raise ValueError("Pistão deve ser 1-6")
-        
-        serial_mgr.write_line(f"sel={ff.piston}")
-        time.sleep(0.01)
-        
-        if ff.u0_adv is not None:
-            serial_mgr.write_line(f"u0a={ff.u0_adv:.2f}")
-            time.sleep(0.01)
-        if ff.u0_ret is not None:
-            serial_mgr.write_line(f"u0r={ff.u0_ret:.2f}")
-            time.sleep(0.01)
-        
-        return {"message": f"Feedforward atualizado para pistão {ff.piston}"}
+        result = _pid_transaction(_feedforward_commands(ff))
+        return {"message": f"Feedforward atualizado para pistão {ff.piston}", "ack_ms": result["elapsed_ms"]}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -1295,14 +4809,14 @@ def set_pid_feedforward(ff: PIDFeedforward):
 def set_pid_feedforward_all(u0_adv: Optional[float] = None, u0_ret: Optional[float] = None):
     """Define feedforward para todos os pistões"""
     try:
+        cmds = []
         if u0_adv is not None:
-            serial_mgr.write_line(f"u0aall={u0_adv:.2f}")
-            time.sleep(0.01)
+            cmds.append(f"u0aall={u0_adv:.2f}")
         if u0_ret is not None:
-            serial_mgr.write_line(f"u0rall={u0_ret:.2f}")
-            time.sleep(0.01)
+            cmds.append(f"u0rall={u0_ret:.2f}")
+        result = _pid_transaction(cmds)
         
-        return {"message": "Feedforward aplicado para todos os pistões"}
+        return {"message": "Feedforward aplicado para todos os pistões", "ack_ms": result["elapsed_ms"]}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -1310,16 +4824,18 @@ def set_pid_feedforward_all(u0_adv: Optional[float] = None, u0_ret: Optional[flo
 def set_pid_settings(settings: PIDSettings):
     """Ajusta configurações gerais do PID"""
     try:
+        cmds = []
+        if settings.dbmm is not None:
+            cmds.append(f"dbmm={settings.dbmm:.3f}")
+        if settings.minpwm is not None:
+            cmds.append(f"minpwm={settings.minpwm}")
+        result = _pid_transaction(cmds)
         if settings.dbmm is not None:
-            serial_mgr.write_line(f"dbmm={settings.dbmm:.3f}")
-            time.sleep(0.01)
             pid_settings_cache["dbmm"] = settings.dbmm
         if settings.minpwm is not None:
-            serial_mgr.write_line(f"minpwm={settings.minpwm}")
-            time.sleep(0.01)
             pid_settings_cache["minpwm"] = settings.minpwm
         
-        return {"message": "Configurações atualizadas"}
+        return {"message": "Configurações atualizadas", "ack_ms": result["elapsed_ms"]}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -1359,11 +4875,9 @@ def set_pid_offset(piston: int, offset: float):
         if not 1 <= piston <= 6:
             raise ValueError("Pistão deve ser 1-6")
         
-        serial_mgr.write_line(f"sel={piston}")
-        time.sleep(0.01)
-        serial_mgr.write_line(f"offset={offset:.3f}")
+        result = _pid_transaction([f"sel={piston}", f"offset={offset:.3f}"])
         
-        return {"message": f"Offset do pistão {piston} = {offset:.3f} mm"}
+        return {"message": f"Offset do pistão {piston} = {offset:.3f} mm", "ack_ms": result["elapsed_ms"]}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -1371,8 +4885,8 @@ def set_pid_offset(piston: int, offset: float):
 def set_pid_offset_all(offset: float):
     """Define offset de calibração para todos os pistões"""
     try:
-        serial_mgr.write_line(f"offsetall={offset:.3f}")
-        return {"message": f"Offset aplicado para todos = {offset:.3f} mm"}
+        result = _pid_transaction([f"offsetall={offset:.3f}"])
+        return {"message": f"Offset aplicado para todos = {offset:.3f} mm", "ack_ms": result["elapsed_ms"]}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -1429,40 +4943,59 @@ Exemplos de uso das rotinas de movimento:
    GET /motion/status
 """
 
+def validate_motion_request(req: MotionRequest):
+    """Valida rotina/eixo e aplica defaults de amplitude (ValueError se inválido)"""
+    # Validar routine
+    valid_routines = ["sine_axis", "circle_xy", "helix", "heave_pitch"]
+    if req.routine not in valid_routines:
+        raise ValueError(f"Rotina inválida. Use: {', '.join(valid_routines)}")
+    
+    # Validar axis para sine_axis
+    if req.routine == "sine_axis":
+        if req.axis is None:
+            raise ValueError("Campo 'axis' obrigatório para routine='sine_axis'")
+        valid_axes = ["x", "y", "z", "roll", "pitch", "yaw"]
+        if req.axis not in valid_axes:
+            raise ValueError(f"Eixo inválido. Use: {', '.join(valid_axes)}")
+        
+        # Aplicar defaults de amplitude
+        if req.amp is None:
+            if req.axis in ["x", "y", "z"]:
+                req.amp = 5.0  # mm
+            else:
+                req.amp = 2.0  # graus
+
 @app.post("/motion/start")
 def motion_start(req: MotionRequest):
     """Inicia uma rotina de movimento"""
     try:
-        # Validar routine
-        valid_routines = ["sine_axis", "circle_xy", "helix", "heave_pitch"]
-        if req.routine not in valid_routines:
-            raise ValueError(f"Rotina inválida. Use: {', '.join(valid_routines)}")
-        
-        # Validar axis para sine_axis
-        if req.routine == "sine_axis":
-            if req.axis is None:
-                raise ValueError("Campo 'axis' obrigatório para routine='sine_axis'")
-            valid_axes = ["x", "y", "z", "roll", "pitch", "yaw"]
-            if req.axis not in valid_axes:
-                raise ValueError(f"Eixo inválido. Use: {', '.join(valid_axes)}")
-            
-            # Aplicar defaults de amplitude
-            if req.amp is None:
-                if req.axis in ["x", "y", "z"]:
-                    req.amp = 5.0  # mm
-                else:
-                    req.amp = 2.0  # graus
-        
+        validate_motion_request(req)
+
         # Verificar se serial está conectada ANTES de qualquer operação
         if not (serial_mgr.ser and serial_mgr.ser.is_open):
             raise RuntimeError("Serial não conectada. Conecte primeiro.")
 
+        # Pré-verificação da trajetória inteira (curso, singularidade, velocidade/aceleração)
+        precheck = motion_runner.precheck(req)
+        if not precheck["all_valid"]:
+            raise ValueError(f"Trajetória sai do curso dos atuadores em t={precheck['first_invalid_t']:.2f}s")
+        if not precheck["dynamics_ok"]:
+            msg = (f"Trajetória excede os limites dos atuadores em t={precheck['first_dynamics_violation_t']:.2f}s "
+                   f"(v pico={max(precheck['peak_velocity_mm_s']):.1f}/{precheck['vmax_mm_s']:.1f} mm/s, "
+                   f"a pico={max(precheck['peak_acceleration_mm_s2']):.0f}/{precheck['amax_mm_s2']:.0f} mm/s²)")
+            if motion_runner.enforce_limits:
+                raise ValueError(msg)
+            print(f"⚠️ {msg}")
+        if precheck["near_singular_samples"]:
+            print(f"⚠️ Trajetória passa perto de singularidade (destreza mín.={precheck['min_dexterity']:.3f})")
+
         motion_runner.start(req)
         
         return {
             "message": f"Rotina '{req.routine}' iniciada",
             "routine": req.routine,
-            "params": model_to_dict(req)
+            "params": model_to_dict(req),
+            "precheck": precheck,
         }
     
     except RuntimeError as e:
@@ -1492,6 +5025,46 @@ def motion_status():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/motion/analyze")
+def motion_analyze(req: MotionRequest, include_profiles: bool = False):
+    """
+    Analisa a rotina sem mover nada: curso, singularidade e perfis de velocidade/aceleração
+    de cada perna contra os limites configurados (mesma verificação de /motion/start).
+    """
+    try:
+        validate_motion_request(req)
+        return motion_runner.precheck(req, include_profiles=include_profiles)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/motion/limits")
+def get_motion_limits():
+    """Limites de velocidade/aceleração dos atuadores usados no precheck"""
+    return {
+        "vmax_mm_s": motion_runner.vmax_mm_s,
+        "amax_mm_s2": motion_runner.amax_mm_s2,
+        "enforce": motion_runner.enforce_limits,
+    }
+
+@app.post("/motion/limits")
+def set_motion_limits(limits: MotionLimits):
+    """
+    Atualiza os limites dos atuadores. Com sync_firmware=True, envia vmaxmmps=
+    para o ESP32 manter o limitador de velocidade do firmware igual ao do precheck.
+    """
+    try:
+        if limits.vmax_mm_s is not None:
+            motion_runner.vmax_mm_s = float(limits.vmax_mm_s)
+        if limits.amax_mm_s2 is not None:
+            motion_runner.amax_mm_s2 = float(limits.amax_mm_s2)
+        if limits.enforce is not None:
+            motion_runner.enforce_limits = bool(limits.enforce)
+        if limits.sync_firmware:
+            _pid_transaction([f"vmaxmmps={motion_runner.vmax_mm_s:.1f}"])  # confirma o "OK vmax_mm_s"
+        return {"message": "Limites dos atuadores atualizados", **get_motion_limits()}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # -------------------- Plataforma (REST iguais) --------------------
 @app.get("/config", response_model=PlatformConfig)
 def get_config():
@@ -1501,12 +5074,146 @@ def get_config():
         stroke_max=platform.stroke_max
     )
 
+geometry_lock = threading.Lock()
+
+def switch_geometry(new_platform: StewartPlatform) -> Dict[str, Any]:
+    """
+    Troca a geometria ativa sem reiniciar o servidor. Todos os artefatos derivados
+    (limites, tabela do espaço de trabalho) são montados ANTES da troca; só então
+    plataforma global, MotionRunner e SerialManager passam juntos para a nova.
+    Sem referências à plataforma antiga, suas tabelas são liberadas.
+    RuntimeError se houver rotina rodando; ValueError se a geometria for inválida.
+    """
+    global platform
+    with geometry_lock:
+        if motion_runner.status()["running"]:
+            raise RuntimeError("Rotina em execução. Pare antes de trocar a geometria.")
+        timings = new_platform.precompute()
+        platform = new_platform
+        motion_runner.on_geometry_changed(new_platform)
+        serial_mgr.on_geometry_changed(new_platform)
+    print(f"📐 Geometria ativa: '{new_platform.name}' ({timings['total_ms']:.0f} ms)")
+    return {"name": new_platform.name, "home_z": motion_runner._home_z_mm, **timings}
+
 @app.post("/config")
 def set_config(cfg: PlatformConfig):
-    global platform
-    platform = StewartPlatform(cfg.h0, cfg.stroke_min, cfg.stroke_max)
+    # Mantém B/P0 da geometria ativa; só curso e h0 mudam
+    try:
+        switch_geometry(StewartPlatform(cfg.h0, cfg.stroke_min, cfg.stroke_max,
+                                        B=platform.B, P0=platform.P0, name="custom"))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"message": "Configuração atualizada"}
 
+@app.get("/geometry")
+def get_geometry():
+    """Perfil de geometria ativo (B, P0, curso, h0)"""
+    return {**model_to_dict(platform.to_profile()), "home_z": motion_runner._home_z_mm}
+
+@app.get("/geometry/profiles")
+def get_geometry_profiles():
+    """Perfis de geometria disponíveis em disco e o ativo"""
+    return {"active": platform.name, "profiles": list_geometry_profiles(), "dir": GEOMETRY_PROFILES_DIR}
+
+@app.get("/geometry/profiles/{name}")
+def get_geometry_profile(name: str):
+    try:
+        return load_geometry_profile(name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.post("/geometry/profiles/{name}/activate")
+def activate_geometry_profile(name: str):
+    """Carrega o perfil do disco e troca a geometria ativa (sem reiniciar)"""
+    try:
+        profile = load_geometry_profile(name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        result = switch_geometry(StewartPlatform.from_profile(profile))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"Perfil '{name}' ativo", **result}
+
+# -------------------- Calibração cinemática --------------------
+@app.post("/calibration/record/start")
+def calibration_record_start():
+    """Começa a gravar frames (cursos + quaternion do BNO085) para a calibração"""
+    calib_recorder.start()
+    return {"message": "Gravação de calibração iniciada", **calib_recorder.status()}
+
+@app.post("/calibration/record/stop")
+def calibration_record_stop():
+    calib_recorder.stop()
+    return {"message": "Gravação de calibração parada", **calib_recorder.status()}
+
+@app.get("/calibration/record")
+def calibration_record_status():
+    return calib_recorder.status()
+
+@app.post("/calibration/fit")
+def calibration_fit(req: CalibrationRequest):
+    """
+    Ajusta B/P0 da geometria ativa aos frames (enviados, de um CSV em aquisições/ ou da
+    gravação em memória) e grava o resultado como um novo perfil de geometria.
+    """
+    try:
+        if req.profile_name == "default":
+            raise ValueError("O perfil 'default' (CAD) não pode ser sobrescrito")
+        _geometry_profile_path(req.profile_name)  # valida o nome antes de resolver
+
+        if req.frames is not None:
+            Y = np.array([f.Y for f in req.frames], dtype=float)
+            poses = np.array([f.pose if f.pose is not None else [np.nan] * 6 for f in req.frames], dtype=float)
+            quats = np.array([f.quaternion if f.quaternion is not None else [np.nan] * 4 for f in req.frames], dtype=float)
+        elif req.csv_path is not None:
+            # Só arquivos dentro de aquisições/ (mesma regra do replay): nada de caminho arbitrário
+            Y, poses, quats = load_calibration_csv(_replay_path(req.csv_path))
+        else:
+            Y, quats = calib_recorder.arrays()
+            poses = None
+        if len(Y) == 0:
+            raise ValueError("Nenhum frame para calibrar")
+
+        base = platform
+        B, P0, report = calibrate_geometry(base, Y, poses, quats,
+                                           prior_mm=req.prior_mm, fit_imu_offset=req.fit_imu_offset)
+        profile = GeometryProfile(
+            name=req.profile_name,
+            description=(f"Calibrado de '{base.name}' com {report['frames_known_pose'] + report['frames_imu']} frames "
+                         f"(RMS {report['rms_before_mm']:.3f} → {report['rms_after_mm']:.3f} mm)"),
+            h0=base.h0, stroke_min=base.stroke_min, stroke_max=base.stroke_max, home_z=base.home_z,
+            B=B.tolist(), P0=P0.tolist(),
+        )
+        path = save_geometry_profile(profile)
+        result = {"profile": req.profile_name, "path": path, "report": report}
+        if req.activate:
+            result["activated"] = switch_geometry(StewartPlatform.from_profile(profile))
+        return result
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/config/limits")
+def get_config_limits(
+    x: Optional[float] = None, y: Optional[float] = None, z: Optional[float] = None,
+    roll: Optional[float] = None, pitch: Optional[float] = None, yaw: Optional[float] = None,
+):
+    """
+    Limites geométricos da configuração atual a partir de uma pose base
+    (padrão: pose neutra): z_min/z_max, altura neutra e excursão por eixo.
+    """
+    try:
+        return platform.compute_limits({"x": x, "y": y, "z": z, "roll": roll, "pitch": pitch, "yaw": yaw})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 
 def model_to_dict(model):
     """Compat helper for Pydantic v1/v2."""
@@ -1523,6 +5230,7 @@ def build_platform_response(pose: PoseInput) -> PlatformResponse:
         roll=pose.roll, pitch=pose.pitch, yaw=pose.yaw,
     )
     perc = platform.stroke_percentages(L)
+    cond = platform.conditioning([pose.x, pose.y, z_value, pose.roll, pose.pitch, pose.yaw], L, P)
     actuators = [
         ActuatorData(
             id=i + 1,
@@ -1545,6 +5253,7 @@ def build_platform_response(pose: PoseInput) -> PlatformResponse:
         valid=bool(valid),
         base_points=platform.B.tolist(),
         platform_points=P.tolist(),
+        **cond,
     )
 
 
@@ -1556,6 +5265,7 @@ def calculate_position(pose: PoseInput):
         roll=pose.roll, pitch=pose.pitch, yaw=pose.yaw
     )
     perc = platform.stroke_percentages(L)
+    cond = platform.conditioning([pose.x, pose.y, z_value, pose.roll, pose.pitch, pose.yaw], L, P)
     
     # 🐛 DEBUG: Verificar validação individual
     #print(f"\n📊 ENDPOINT /calculate:")
@@ -1576,20 +5286,113 @@ def calculate_position(pose: PoseInput):
         actuators=acts,
         valid=bool(valid),
         base_points=platform.B.tolist(),
-        platform_points=P.tolist()
+        platform_points=P.tolist(),
+        **cond,
+    )
+
+@app.post("/calculate/batch", response_model=BatchPlatformResponse)
+def calculate_batch(req: BatchPoseInput):
+    """
+    Cinemática inversa de uma trajetória inteira em uma única requisição.
+    Poses sem z usam a altura padrão h0.
+    """
+    poses = np.array([
+        [p.x, p.y, p.z if p.z is not None else np.nan, p.roll, p.pitch, p.yaw]
+        for p in req.poses
+    ], dtype=float)
+    L, valid, P, cond, dexterity, near_singular = platform.conditioning_batch(poses)
+    perc = platform.stroke_percentages(L)
+
+    invalid_idx = np.flatnonzero(~valid)
+    return BatchPlatformResponse(
+        count=len(req.poses),
+        all_valid=bool(valid.all()),
+        first_invalid=int(invalid_idx[0]) if invalid_idx.size else None,
+        valid=valid.tolist(),
+        lengths=L.tolist(),
+        percentages=perc.tolist(),
+        base_points=platform.B.tolist(),
+        platform_points=P.tolist() if req.include_points else None,
+        condition_numbers=cond.tolist(),
+        dexterity=dexterity.tolist(),
+        near_singular=near_singular.tolist(),
+        min_dexterity=float(dexterity.min()),
     )
 
+# -------------------- Workspace --------------------
+@app.get("/workspace")
+def get_workspace():
+    """
+    Resumo do espaço de trabalho alcançável da geometria atual: eixos da grade,
+    fração alcançável e faixas por eixo em torno da pose neutra (para as UIs).
+    """
+    try:
+        return platform.workspace().summary()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/workspace/slice")
+def get_workspace_slice(
+    ax1: str = "x", ax2: str = "y",
+    n1: int = 61, n2: int = 61,
+    min1: Optional[float] = None, max1: Optional[float] = None,
+    min2: Optional[float] = None, max2: Optional[float] = None,
+    x: Optional[float] = None, y: Optional[float] = None, z: Optional[float] = None,
+    roll: Optional[float] = None, pitch: Optional[float] = None, yaw: Optional[float] = None,
+):
+    """
+    Região alcançável sobre dois eixos com os demais fixos, para desenhar limites na UI.
+
+    Exemplos:
+      GET /workspace/slice?ax1=x&ax2=y&z=520            → contorno XY em z=520
+      GET /workspace/slice?ax1=roll&ax2=pitch&z=500     → envelope roll/pitch em z=500
+    Eixos fixos não informados usam a pose neutra.
+    """
+    try:
+        range1 = (min1, max1) if min1 is not None and max1 is not None else None
+        range2 = (min2, max2) if min2 is not None and max2 is not None else None
+        fixed = {"x": x, "y": y, "z": z, "roll": roll, "pitch": pitch, "yaw": yaw}
+        return platform.workspace_slice(ax1, ax2, fixed, range1, range2, n1, n2)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/workspace/query")
+def workspace_query(req: WorkspaceQuery):
+    """Alcançabilidade e margem de curso (mm) por consulta à tabela, com interpolação (positivos confirmados pela IK)."""
+    poses = np.array([
+        [p.x, p.y, p.z if p.z is not None else platform.h0, p.roll, p.pitch, p.yaw]
+        for p in req.poses
+    ], dtype=float)
+    try:
+        reachable, margin = platform.workspace().query(poses)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = {
+        "count": len(req.poses),
+        "reachable": reachable.tolist(),
+        "margin_mm": [None if np.isnan(m) else float(m) for m in margin],
+    }
+    if req.exact:
+        L, valid, _ = platform.inverse_kinematics_batch(poses)
+        result["valid_exact"] = valid.tolist()
+        result["margin_mm_exact"] = platform.stroke_margins(L).tolist()
+    return result
+
 @app.post("/apply_pose")
 def apply_pose(req: ApplyPoseRequest):
    # print(f"🚀 apply_pose recebido: x={req.x}, y={req.y}, z={req.z}, roll={req.roll}, pitch={req.pitch}, yaw={req.yaw}")
     z_value = req.z if req.z is not None else platform.h0
-    L, valid, _ = platform.inverse_kinematics(
+    L, valid, P = platform.inverse_kinematics(
         x=req.x, y=req.y, z=z_value,
         roll=req.roll, pitch=req.pitch, yaw=req.yaw
     )
+    cond = platform.conditioning([req.x, req.y, z_value, req.roll, req.pitch, req.yaw], L, P)
     if not valid:
         print("❌ Pose inválida")
-        return {"applied": False, "valid": False, "message": "Pose inválida."}
+        return {"applied": False, "valid": False, "message": "Pose inválida.", **cond}
+    if cond["near_singular"]:
+        print(f"⚠️ Pose perto de singularidade (destreza={cond['dexterity']:.3f})")
     course_mm = platform.lengths_to_stroke_mm(L)
     #print(f"✅ Cursos calculados (mm): {course_mm}")
     try:
@@ -1601,7 +5404,7 @@ def apply_pose(req: ApplyPoseRequest):
     except Exception as e:
         #print(f"❌ Erro ao enviar comando: {e}")
         raise HTTPException(status_code=400, detail=f"Erro TX serial: {e}")
-    return {"applied": True, "valid": True, "setpoints_mm": course_mm.tolist()}
+    return {"applied": True, "valid": True, "setpoints_mm": course_mm.tolist(), **cond}
 
 # OTIMIZAÇÃO: Endpoint para controle via MPU-6050 (acelerômetro)
 class MPUControlRequest(BaseModel):
@@ -1828,14 +5631,19 @@ async def ws_telemetry(ws: WebSocket):
     await ws_mgr.connect(ws)
     try:
         while True:
-            # Mantemos o canal half-duplex simples: ignoramos mensagens do cliente,
-            # mas lemos para detectar fechamento limpo.
-            await ws.receive_text()
+            # Cliente pode assinar tópicos/campos; sem assinatura recebe tudo.
+            # A leitura também detecta o fechamento limpo.
+            ws_mgr.handle_message(ws, await ws.receive_text())
     except WebSocketDisconnect:
         await ws_mgr.disconnect(ws)
     except Exception:
         await ws_mgr.disconnect(ws)
 
+@app.get("/ws/stats")
+def get_ws_stats():
+    """Fila, atraso e descartes de cada cliente do /ws/telemetry"""
+    return ws_mgr.stats()
+
 # -------------------- Raiz --------------------
 @app.get("/")
 def root():
@@ -1844,21 +5652,49 @@ def root():
         "version": API_VERSION,
         "endpoints": [
             "GET  /serial/ports",
-            "POST /serial/open {port, baud?}",
+            "GET  /virtual-rig",
+            "POST /virtual-rig/start {rate_hz?, telemetry_format?, encoding?, noise_mm?, seed?}",
+            "POST /virtual-rig/stop",
+            "GET  /replay/files",
+            "GET  /replay",
+            "POST /replay/start {file, speed?, loop?, start_s?}",
+            "POST /replay/seek {position_s, speed?}",
+            "POST /replay/{pause|resume|stop}",
+            "POST /serial/open {port, baud?, transport?}",
             "POST /serial/close",
             "GET  /serial/status",
+            "GET  /serial/stats",
+            "POST /serial/transaction {commands, timeout_s?}",
             "POST /serial/send {command}",
             "GET  /telemetry",
-            "WS   /ws/telemetry",
+            "GET  /fk/settings",
+            "POST /fk/settings {method?, cache_enabled?, cache_resolution_mm?, cache_size?, rate_hz?}",
+            "GET  /fk/stats",
+            "WS   /ws/telemetry {action: subscribe, topics?, fields?, rates?, decimation?} (subprotocolo stewart.bin.v1 opcional)",
+            "GET  /ws/stats",
             "POST /calculate",
+            "POST /calculate/batch {poses[], include_points?}",
+            "GET  /workspace",
+            "GET  /workspace/slice?ax1&ax2&n1&n2&min1&max1&min2&max2&x&y&z&roll&pitch&yaw",
+            "POST /workspace/query {poses[], exact?}",
             "POST /apply_pose",
             "POST /joystick/pose",
             "POST /mpu/control",
             "GET  /config",
             "POST /config",
+            "GET  /config/limits?x&y&z&roll&pitch&yaw",
+            "GET  /geometry",
+            "GET  /geometry/profiles",
+            "GET  /geometry/profiles/{name}",
+            "POST /geometry/profiles/{name}/activate",
+            "POST /calibration/record/start",
+            "POST /calibration/record/stop",
+            "GET  /calibration/record",
+            "POST /calibration/fit",
             "POST /pid/setpoint",
             "POST /pid/gains",
             "POST /pid/gains/all",
+            "POST /pid/batch",
             "POST /pid/feedforward",
             "POST /pid/feedforward/all",
             "POST /pid/settings",
@@ -1869,6 +5705,9 @@ def root():
             "POST /motion/start",
             "POST /motion/stop",
             "GET  /motion/status",
+            "POST /motion/analyze",
+            "GET  /motion/limits",
+            "POST /motion/limits",
             "POST /flight-simulation/start",
             "POST /flight-simulation/stop",
             "POST /flight-simulation/preview",
@@ -0,0 +1,106 @@
+"""
+Teste da cinemática inversa em lote (sem servidor)
+Compara inverse_kinematics_batch com inverse_kinematics pose a pose
+e chama diretamente o handler de POST /calculate/batch.
+Execute com: python test_batch_kinematics.py
+"""
+import sys
+sys.path.append('.')
+
+import numpy as np
+
+from app import platform, calculate_batch, calculate_position, BatchPoseInput, PoseInput
+
+
+def random_poses(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(-40, 40, n),     # x
+        rng.uniform(-40, 40, n),     # y
+        rng.uniform(430, 640, n),    # z
+        rng.uniform(-12, 12, n),     # roll
+        rng.uniform(-12, 12, n),     # pitch
+        rng.uniform(-12, 12, n),     # yaw
+    ])
+
+
+def test_batch_matches_scalar():
+    """Lote deve bater com a versão escalar (comprimentos, validade e pontos)"""
+    print("\n1️⃣ Comparando lote x escalar...")
+    poses = random_poses()
+    L_b, valid_b, P_b = platform.inverse_kinematics_batch(poses)
+
+    assert L_b.shape == (len(poses), 6)
+    assert valid_b.shape == (len(poses),)
+    assert P_b.shape == (len(poses), 6, 3)
+
+    for i, (x, y, z, roll, pitch, yaw) in enumerate(poses):
+        L, valid, P = platform.inverse_kinematics(x=x, y=y, z=z, roll=roll, pitch=pitch, yaw=yaw)
+        assert np.allclose(L, L_b[i], atol=1e-9), f"L difere na pose {i}"
+        assert np.allclose(P, P_b[i], atol=1e-9), f"P difere na pose {i}"
+        assert valid == bool(valid_b[i]), f"valid difere na pose {i}"
+
+    print(f"   ✅ {len(poses)} poses idênticas ({int(valid_b.sum())} válidas)")
+
+
+def test_batch_default_z():
+    """z = NaN usa h0, como z=None na versão escalar"""
+    print("\n2️⃣ Testando z padrão (NaN → h0)...")
+    L_b, _, _ = platform.inverse_kinematics_batch([[0, 0, np.nan, 0, 0, 0]])
+    L, _, _ = platform.inverse_kinematics()
+    assert np.allclose(L_b[0], L)
+    print("   ✅ OK")
+
+
+def test_batch_bad_shape():
+    """Shape errado deve gerar ValueError"""
+    print("\n3️⃣ Testando shape inválido...")
+    try:
+        platform.inverse_kinematics_batch(np.zeros((4, 5)))
+    except ValueError:
+        print("   ✅ ValueError levantado")
+        return
+    raise AssertionError("shape (4, 5) deveria ser rejeitado")
+
+
+def test_calculate_batch_endpoint():
+    """POST /calculate/batch"""
+    print("\n4️⃣ Testando POST /calculate/batch...")
+    payload = {
+        "poses": [
+            {"x": 0, "y": 0, "z": 500, "roll": 0, "pitch": 0, "yaw": 0},
+            {"x": 5, "y": -5, "z": 520, "roll": 2},
+            {"x": 0, "y": 0, "z": 700},           # acima do curso → inválida
+        ],
+        "include_points": True,
+    }
+    data = calculate_batch(BatchPoseInput(**payload)).model_dump()
+
+    assert data["count"] == 3
+    assert data["valid"][0] is True
+    assert data["valid"][2] is False
+    assert data["all_valid"] is False
+    assert data["first_invalid"] == 2
+    assert len(data["lengths"]) == 3 and len(data["lengths"][0]) == 6
+    assert len(data["platform_points"]) == 3
+
+    single = calculate_position(PoseInput(**payload["poses"][0]))
+    assert np.allclose([a.length for a in single.actuators], data["lengths"][0])
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Cinemática inversa em lote")
+    print("=" * 50)
+    test_batch_matches_scalar()
+    test_batch_default_z()
+    test_batch_bad_shape()
+    test_calculate_batch_endpoint()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Teste dos frames binários de telemetria (sem hardware)
+Codifica frames, verifica CRC/ressincronização, a detecção automática por conexão
+no _reader_loop e compara o custo de decodificação com o parse do CSV.
+Execute com: python test_binary_telemetry.py
+"""
+import sys
+sys.path.append('.')
+
+import threading
+import time
+
+import numpy as np
+
+from app import (TelemetryFramer, SerialManager, encode_binary_telemetry,
+                 TELEM_BIN_SYNC, CSV_DELIM)
+from test_serial_framer import FakeSerial
+
+
+def sample_fields(ms, kind="bno085"):
+    values = [ms, 250.0] + [100.0 + i + ms * 0.01 for i in range(6)] + [-200 + 80 * i for i in range(6)]
+    if kind in ("mpu6050", "bno085"):
+        values += [1.5, -2.25, 30.0]
+    if kind == "bno085":
+        values += [1.0, 0.0, 0.0, 0.0]
+    return values
+
+
+def csv_line(values):
+    return CSV_DELIM.join(f"{v:.3f}" if isinstance(v, float) else str(v) for v in values)
+
+
+def test_round_trip_all_formats():
+    """Os três formatos voltam com os mesmos valores (precisão float32)"""
+    print("\n1️⃣ Ida e volta dos formatos...")
+    for kind, n in (("standard", 14), ("mpu6050", 17), ("bno085", 21)):
+        values = sample_fields(1234, kind)
+        frame = encode_binary_telemetry(values)
+        assert frame.startswith(TELEM_BIN_SYNC)
+        frames, lines = TelemetryFramer().feed(frame)
+        assert lines == [] and len(frames) == 1 and len(frames[0]) == n
+        assert frames[0][0] == 1234
+        assert np.allclose(frames[0], values, atol=1e-4)
+        print(f"   {kind}: {len(frame)} bytes ({n} campos)")
+
+    try:
+        encode_binary_telemetry([0] * 15)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("15 campos deveriam ser rejeitados")
+    print("   ✅ OK")
+
+
+def test_split_frames_and_interleaved_text():
+    """Frames cortados entre blocos e texto entre frames continuam chegando"""
+    print("\n2️⃣ Frames fragmentados + texto intercalado...")
+    stream = b"boot...\r\n" + b"".join(
+        encode_binary_telemetry(sample_fields(ms)) + (b"OK spmm6x\n" if ms % 10 == 0 else b"")
+        for ms in range(100))
+
+    framer = TelemetryFramer()
+    frames, lines = [], []
+    for i in range(0, len(stream), 7):  # blocos pequenos cortam sync, tamanho e CRC
+        f, l = framer.feed(stream[i:i + 7])
+        frames += f
+        lines += l
+
+    assert [f[0] for f in frames] == list(range(100))
+    assert lines == [b"boot..."] + [b"OK spmm6x"] * 10
+    stats = framer.stats()
+    assert stats["encoding"] == "binary" and stats["frames_out"] == 100
+    assert stats["bytes_in"] == len(stream) and stats["crc_errors"] == 0
+    print("   ✅ OK")
+
+
+def test_crc_error_resyncs():
+    """Frame corrompido é descartado e o seguinte é aproveitado"""
+    print("\n3️⃣ CRC inválido e ressincronização...")
+    good = [encode_binary_telemetry(sample_fields(ms)) for ms in range(3)]
+    bad = bytearray(good[1])
+    bad[10] ^= 0xFF
+    framer = TelemetryFramer()
+    frames, lines = framer.feed(good[0] + bytes(bad) + b"\xaa\x55\x07lixo" + good[2])
+    assert [f[0] for f in frames] == [0, 2]
+    stats = framer.stats()
+    print(f"   crc_errors={stats['crc_errors']}, bad_length={stats['bad_length']}")
+    assert stats["crc_errors"] == 1 and stats["bad_length"] == 1
+    print("   ✅ OK")
+
+
+def test_text_connection_stays_text():
+    """Conexão só com CSV não entra em modo binário nem altera as linhas"""
+    print("\n4️⃣ Conexão em texto puro...")
+    framer = TelemetryFramer()
+    lines = framer.feed(b"".join(csv_line(sample_fields(ms)).encode() + b"\n" for ms in range(50)))[1]
+    assert len(lines) == 50
+    assert framer.feed(b"sp;1\n\xaa")[1] == [b"sp;1"]  # 0xAA no fim fica à espera do sync
+    assert framer.feed(b"x\n")[1] == [b"\xaax"]
+    assert framer.stats()["encoding"] == "text" and not framer.binary
+    print("   ✅ OK")
+
+
+def test_reader_loop_detects_binary():
+    """_reader_loop detecta o binário e publica o mesmo payload do CSV"""
+    print("\n5️⃣ _reader_loop com firmware binário...")
+    stream = b"ESP-ROM boot\n" + b"".join(encode_binary_telemetry(sample_fields(ms)) for ms in range(200))
+    chunks = [stream[i:i + 512] for i in range(0, len(stream), 512)]
+
+    mgr = SerialManager()
+    submitted, lines = [], []
+    mgr._fk_submit = lambda payload, L_abs: submitted.append(payload)
+    mgr._on_rx_line = lines.append
+    mgr.ser = FakeSerial(chunks, mgr.stop_evt.set)
+    t = threading.Thread(target=mgr._reader_loop)
+    t.start()
+    t.join(timeout=5.0)
+    assert not t.is_alive()
+
+    assert lines == ["ESP-ROM boot"]
+    assert len(submitted) == 200
+    last = submitted[-1]
+    assert last["type"] == "telemetry_bno085" and last["format"] == "bno085"
+    assert np.allclose(last["Y"], sample_fields(199)[2:8], atol=1e-4)
+    assert last["PWM"] == sample_fields(199)[8:14]
+    assert mgr.latest["encoding"] == "binary" and mgr.latest["raw"] is None
+
+    # mesma telemetria em CSV gera as mesmas chaves
+    text_payload = []
+    mgr._fk_submit = lambda payload, L_abs: text_payload.append(payload)
+    SerialManager._on_rx_line(mgr, csv_line(sample_fields(199)))
+    assert set(text_payload[0]) == set(last)
+    assert mgr.latest["encoding"] == "text"
+
+    stats = mgr.rx_stats()
+    print(f"   {stats['frames_out']} frames, modo {stats['encoding']}")
+    assert stats["encoding"] == "binary" and stats["frames_out"] == 200
+    print("   ✅ OK")
+
+
+def test_decode_cost_vs_csv():
+    """Decodificação binária é mais barata que o parse do CSV"""
+    print("\n6️⃣ Custo binário x CSV...")
+    n = 20000
+    binary = b"".join(encode_binary_telemetry(sample_fields(ms)) for ms in range(n))
+    text = [csv_line(sample_fields(ms)) for ms in range(n)]
+
+    t0 = time.perf_counter()
+    frames, _ = TelemetryFramer().feed(binary)
+    bin_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    parsed = [[float(p.replace(",", ".")) for p in line.split(CSV_DELIM)] for line in text]
+    csv_ms = (time.perf_counter() - t0) * 1000
+
+    assert len(frames) == len(parsed) == n
+    print(f"   {n} frames: binário {bin_ms:.1f} ms ({len(binary) / n:.0f} B/frame) | "
+          f"CSV {csv_ms:.1f} ms ({sum(map(len, text)) / n + 1:.0f} B/linha)")
+    assert bin_ms < csv_ms
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Telemetria binária")
+    print("=" * 50)
+    test_round_trip_all_formats()
+    test_split_frames_and_interleaved_text()
+    test_crc_error_resyncs()
+    test_text_connection_stays_text()
+    test_reader_loop_detects_binary()
+    test_decode_cost_vs_csv()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Teste da calibração cinemática (sem servidor)
+Gera frames sintéticos com uma geometria "real" perturbada em relação ao CAD e
+verifica se o least-squares esparso recupera B/P0 e grava um perfil de geometria.
+Execute com: python test_calibration.py
+"""
+import sys
+sys.path.append('.')
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+import app
+from app import (StewartPlatform, calibrate_geometry, calibration_fit, CalibrationRequest,
+                 calib_recorder, load_geometry_profile, switch_geometry, CSV_DELIM)
+from fastapi import HTTPException
+
+NOISE_MM = 0.05
+IMU_OFFSET_ZYX = [3.0, 0.5, -0.4]  # yaw, pitch, roll (graus)
+
+
+def synthetic_rig(seed=3):
+    rng = np.random.default_rng(seed)
+    nominal = app.platform
+    true = StewartPlatform(B=nominal.B + rng.normal(0, 2, (6, 3)),
+                           P0=nominal.P0 + rng.normal(0, 2, (6, 3)))
+    return rng, nominal, true
+
+
+def synthetic_frames(rng, true, n):
+    poses = np.column_stack([
+        rng.uniform(-30, 30, n), rng.uniform(-30, 30, n), rng.uniform(470, 590, n),
+        rng.uniform(-8, 8, n), rng.uniform(-8, 8, n), rng.uniform(-10, 10, n),
+    ])
+    L, valid, _ = true.inverse_kinematics_batch(poses)
+    poses, L = poses[valid], L[valid]
+    Y = L - true.stroke_min + rng.normal(0, NOISE_MM, L.shape)
+
+    # BNO085 com desalinhamento fixo: R_real = R_off · R_imu
+    R_true = true.rotation_matrices(poses[:, 3], poses[:, 4], poses[:, 5])
+    R_off = R.from_euler('ZYX', IMU_OFFSET_ZYX, degrees=True).as_matrix()
+    quats = R.from_matrix(np.einsum('ji,njk->nik', R_off, R_true)).as_quat()[:, [3, 0, 1, 2]]
+    return Y, poses, quats
+
+
+def test_known_poses_recover_geometry():
+    """Com poses conhecidas, B/P0 ajustados ficam mais perto da geometria real"""
+    print("\n1️⃣ Poses conhecidas...")
+    rng, nominal, true = synthetic_rig()
+    Y, poses, _ = synthetic_frames(rng, true, 2000)
+    B, P0, report = calibrate_geometry(nominal, Y, poses=poses)
+    print(f"   RMS {report['rms_before_mm']:.3f} → {report['rms_after_mm']:.3f} mm "
+          f"({report['solve_ms']:.0f} ms, {report['nfev']} avaliações)")
+    assert report["rms_after_mm"] < 1.5 * NOISE_MM
+    err_before = np.abs(np.r_[nominal.B - true.B, nominal.P0 - true.P0]).max()
+    err_after = np.abs(np.r_[B - true.B, P0 - true.P0]).max()
+    print(f"   Erro máx. dos pontos: {err_before:.2f} → {err_after:.2f} mm")
+    assert err_after < err_before / 3
+    print("   ✅ OK")
+
+
+def test_imu_frames_fit_offset_and_translations():
+    """Só com orientação do IMU: translações por frame e offset do IMU são ajustados"""
+    print("\n2️⃣ Frames com quaternion do BNO085...")
+    rng, nominal, true = synthetic_rig()
+    Y, _, quats = synthetic_frames(rng, true, 3000)
+    B, P0, report = calibrate_geometry(nominal, Y, quats=quats)
+    print(f"   {report['unknowns']} incógnitas, {report['jac_nnz']} não-zeros no Jacobiano")
+    print(f"   RMS {report['rms_before_mm']:.3f} → {report['rms_after_mm']:.3f} mm ({report['solve_ms']:.0f} ms)")
+    print(f"   Offset IMU: {report['imu_offset_deg']}")
+    assert report["frames_imu"] == len(Y) and report["frames_known_pose"] == 0
+    assert report["unknowns"] == 36 + 3 + 3 * len(Y)
+    assert report["rms_after_mm"] < 1.5 * NOISE_MM
+    assert abs(report["imu_offset_deg"]["yaw"] - IMU_OFFSET_ZYX[0]) < 0.5
+    print("   ✅ OK")
+
+
+def test_fit_endpoint_writes_and_activates_profile():
+    """POST /calibration/fit grava o perfil, que pode ser ativado na hora"""
+    print("\n3️⃣ POST /calibration/fit...")
+    rng, nominal, true = synthetic_rig()
+    Y, poses, _ = synthetic_frames(rng, true, 300)
+    folder = tempfile.mkdtemp()
+    old_dir = app.GEOMETRY_PROFILES_DIR
+    app.GEOMETRY_PROFILES_DIR = folder
+    try:
+        frames = [{"Y": y.tolist(), "pose": p.tolist()} for y, p in zip(Y, poses)]
+        result = calibration_fit(CalibrationRequest(profile_name="rig-cal", frames=frames, activate=True))
+        assert os.path.isfile(result["path"])
+        profile = load_geometry_profile("rig-cal")
+        assert profile.stroke_min == nominal.stroke_min
+        assert app.platform.name == "rig-cal"
+        assert app.motion_runner.platform is app.platform
+        print(f"   {profile.description}")
+
+        for bad in (CalibrationRequest(profile_name="default", frames=frames),
+                    CalibrationRequest(profile_name="../x", frames=frames),
+                    CalibrationRequest(profile_name="empty", frames=[{"Y": [0] * 6}])):
+            try:
+                calibration_fit(bad)
+            except HTTPException as e:
+                assert e.status_code == 400
+            else:
+                raise AssertionError(f"pedido inválido aceito: {bad.profile_name}")
+    finally:
+        app.GEOMETRY_PROFILES_DIR = old_dir
+        shutil.rmtree(folder)
+        switch_geometry(nominal)
+    print("   ✅ OK")
+
+
+def test_csv_and_recorder_sources():
+    """Frames de um CSV em aquisições/ e da gravação em memória dão o mesmo ajuste"""
+    print("\n4️⃣ CSV e gravador...")
+    rng, nominal, true = synthetic_rig()
+    Y, _, quats = synthetic_frames(rng, true, 400)
+    folder = tempfile.mkdtemp()
+    old_dir, old_replay = app.GEOMETRY_PROFILES_DIR, app.REPLAY_DIR
+    app.GEOMETRY_PROFILES_DIR = app.REPLAY_DIR = folder
+    try:
+        csv_path = os.path.join(folder, "frames.csv")
+        header = [f"Y{i}" for i in range(1, 7)] + ["qw", "qx", "qy", "qz"]
+        np.savetxt(csv_path, np.hstack([Y, quats]), delimiter=CSV_DELIM, fmt="%.6f",
+                   header=CSV_DELIM.join(header), comments="")
+        from_csv = calibration_fit(CalibrationRequest(profile_name="from-csv", csv_path="frames.csv"))
+
+        # Fora de aquisições/ (ou inexistente): mesma resposta, sem revelar se o arquivo existe
+        details = []
+        outside = os.path.abspath(__file__)  # existe, mas fora de aquisições/
+        for path in (outside, os.path.relpath(outside, folder), "nada.csv"):
+            try:
+                calibration_fit(CalibrationRequest(profile_name="fora", csv_path=path))
+            except HTTPException as e:
+                assert e.status_code == 400
+                details.append(e.detail.replace(path, "<arquivo>"))
+            else:
+                raise AssertionError(f"csv_path fora de aquisições/ aceito: {path}")
+        assert len(set(details)) == 1
+
+        calib_recorder.start()
+        calib_recorder.add([0.0] * 6, None)  # sem quaternion: ignorado
+        for y, q in zip(Y, quats):
+            calib_recorder.add(y.tolist(), dict(zip("wxyz", q)))
+        calib_recorder.stop()
+        assert calib_recorder.status()["frames"] == len(Y)
+        from_rec = calibration_fit(CalibrationRequest(profile_name="from-rec"))
+
+        print(f"   CSV: {from_csv['report']['rms_after_mm']:.4f} mm | gravação: {from_rec['report']['rms_after_mm']:.4f} mm")
+        assert from_csv["report"]["frames_imu"] == from_rec["report"]["frames_imu"] == len(Y)
+        # CSV arredonda em 6 casas: mesmo ajuste a menos de arredondamento
+        assert np.isclose(from_csv["report"]["rms_after_mm"], from_rec["report"]["rms_after_mm"], rtol=1e-2)
+        assert np.allclose(load_geometry_profile("from-csv").B, load_geometry_profile("from-rec").B, atol=0.05)
+    finally:
+        app.GEOMETRY_PROFILES_DIR, app.REPLAY_DIR = old_dir, old_replay
+        shutil.rmtree(folder)
+        calib_recorder.start()
+        calib_recorder.stop()
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Calibração cinemática")
+    print("=" * 50)
+    test_known_poses_recover_geometry()
+    test_imu_frames_fit_offset_and_translations()
+    test_fit_endpoint_writes_and_activates_profile()
+    test_csv_and_recorder_sources()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Teste do Jacobiano das pernas e da proximidade de singularidade (sem servidor)
+Confere o Jacobiano com diferenças finitas, a versão em lote com a escalar e
+os campos de condicionamento em /calculate, /calculate/batch, telemetria e precheck.
+Execute com: python test_conditioning.py
+"""
+import sys
+sys.path.append('.')
+
+import numpy as np
+
+from app import (platform, SerialManager, MotionRunner, MotionRequest, DEXTERITY_MIN,
+                 calculate_position, calculate_batch, PoseInput, BatchPoseInput)
+
+
+def test_jacobian_matches_finite_differences():
+    """Colunas de translação e de yaw batem com diferenças finitas dos comprimentos"""
+    print("\n1️⃣ Jacobiano x diferenças finitas...")
+    q = np.array([8.0, -5.0, 520.0, 2.0, -3.0, 4.0])
+    L, _, P = platform.inverse_kinematics_batch(q)
+    J = platform.leg_jacobian_batch(q, L, P)[0]
+
+    h = 1e-5
+    for k in range(3):
+        dq = np.zeros(6)
+        dq[k] = h
+        dL = (platform.inverse_kinematics_batch(q + dq)[0] - platform.inverse_kinematics_batch(q - dq)[0])[0] / (2 * h)
+        assert np.allclose(J[:, k], dL, atol=1e-6), k
+
+    # yaw é a rotação mais externa (Rz) → ω = ẑ · d(yaw)
+    dq = np.zeros(6)
+    dq[5] = h
+    dL = (platform.inverse_kinematics_batch(q + dq)[0] - platform.inverse_kinematics_batch(q - dq)[0])[0] / (2 * h)
+    assert np.allclose(J[:, 5] * platform.char_length, np.degrees(dL), atol=1e-5)
+    print("   ✅ OK")
+
+
+def test_batch_matches_scalar_and_flags_singularity():
+    """Lote = escalar; yaw de 90° é quase singular, pose neutra não"""
+    print("\n2️⃣ Lote x escalar e flag de singularidade...")
+    poses = np.array([
+        [0, 0, 520, 0, 0, 0],
+        [10, -10, 500, 5, -5, 10],
+        [0, 0, 520, 0, 0, 90],
+    ], dtype=float)
+    L, valid, P, cond, dexterity, near_singular = platform.conditioning_batch(poses)
+    for i, q in enumerate(poses):
+        c = platform.conditioning(q, L[i], P[i])
+        assert np.isclose(c["condition_number"], cond[i])
+        assert np.isclose(c["dexterity"], 1.0 / cond[i])
+    print(f"   cond: {np.round(cond, 2).tolist()}")
+    assert near_singular.tolist() == [False, False, True]
+    assert dexterity[2] < DEXTERITY_MIN
+    print("   ✅ OK")
+
+
+def test_calculate_endpoints_report_conditioning():
+    """/calculate e /calculate/batch devolvem cond(J) e destreza"""
+    print("\n3️⃣ /calculate e /calculate/batch...")
+    single = calculate_position(PoseInput(x=0, y=0, z=520))
+    assert single.condition_number > 1 and 0 < single.dexterity <= 1
+    assert not single.near_singular
+
+    batch = calculate_batch(BatchPoseInput(poses=[{"z": 520}, {"z": 520, "yaw": 90}]))
+    assert batch.near_singular == [False, True]
+    assert np.isclose(batch.condition_numbers[0], single.condition_number)
+    assert batch.min_dexterity == min(batch.dexterity)
+    print("   ✅ OK")
+
+
+def test_telemetry_frame_carries_conditioning():
+    """Frame publicado pela FK leva o condicionamento da pose reconstruída"""
+    print("\n4️⃣ Telemetria...")
+    mgr = SerialManager()
+    L, _, _ = platform.inverse_kinematics(x=3, y=2, z=520, roll=1)
+    payload = {"ts": 0.0}
+    mgr._publish_frame(payload, L)
+    cond = payload["conditioning"]
+    assert cond is not None and not cond["near_singular"]
+    assert mgr.fk_stats()["near_singular"] == 0
+    print(f"   {cond}")
+    print("   ✅ OK")
+
+
+def test_motion_precheck():
+    """Precheck amostra a rotina inteira e resume IK + destreza"""
+    print("\n5️⃣ Precheck de movimento...")
+    runner = MotionRunner(serial_manager=None, stewart_platform=platform)
+    result = runner.precheck(MotionRequest(routine="sine_axis", axis="roll", amp=3.0, duration_s=10))
+    print(f"   {result}")
+    assert result["samples"] == 600
+    assert result["all_valid"]
+    assert result["near_singular_samples"] == 0
+    assert result["min_dexterity"] > DEXTERITY_MIN
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Condicionamento do Jacobiano")
+    print("=" * 50)
+    test_jacobian_matches_finite_differences()
+    test_batch_matches_scalar_and_flags_singularity()
+    test_calculate_endpoints_report_conditioning()
+    test_telemetry_frame_carries_conditioning()
+    test_motion_precheck()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Teste do pipeline de telemetria leitura → FK (sem serial e sem servidor)
+Alimenta _on_rx_line com linhas CSV e verifica a thread FK e seus contadores.
+Execute com: python test_fk_pipeline.py
+"""
+import sys
+sys.path.append('.')
+
+import time
+
+import numpy as np
+
+import app
+from app import SerialManager, FKCache, PlatformConfig, platform
+
+
+def telemetry_line(ms, Y, pwm=0):
+    fields = [str(ms), "0.000"] + [f"{y:.3f}" for y in Y] + [str(pwm)] * 6
+    return ";".join(fields)
+
+
+def wait_until(cond, timeout=2.0):
+    t0 = time.time()
+    while not cond() and time.time() - t0 < timeout:
+        time.sleep(0.01)
+    return cond()
+
+
+def test_fk_worker_publishes_pose():
+    """A thread FK consome os frames e reconstrói a pose"""
+    print("\n1️⃣ Thread FK publicando pose...")
+    mgr = SerialManager()
+    original = mgr._publish_frame
+    published = []
+
+    def capture(payload, L_abs):
+        original(payload, L_abs)
+        published.append(payload)
+
+    mgr._publish_frame = capture
+    mgr._start_fk_worker()
+    try:
+        L, _, _ = platform.inverse_kinematics(x=5, y=-3, z=520, roll=1, pitch=-2, yaw=0.5)
+        Y = L - platform.stroke_min
+        mgr._on_rx_line(telemetry_line(1000, Y))
+
+        assert wait_until(lambda: len(published) == 1)
+        pose = published[0]["pose_live"]
+        assert pose is not None
+        assert abs(pose["x"] - 5) < 1e-2 and abs(pose["z"] - 520) < 1e-2
+        assert published[0]["fk"]["converged"]
+        assert np.allclose(mgr.latest["Y"], Y, atol=1e-3)
+        print(f"   Pose: {pose}")
+        print("   ✅ OK")
+    finally:
+        mgr.stop_evt.set()
+        mgr.close()
+
+
+def test_latest_wins_drops_stale_frames():
+    """Com a FK ocupada, frames intermediários são descartados e contados"""
+    print("\n2️⃣ Slot latest-wins...")
+    mgr = SerialManager()
+    original = mgr._publish_frame
+    seen = []
+
+    def slow_publish(payload, L_abs):
+        time.sleep(0.05)  # FK artificialmente lenta
+        original(payload, L_abs)
+        seen.append(payload["ts"])
+
+    mgr._publish_frame = slow_publish
+    mgr._start_fk_worker()
+    try:
+        Y = np.full(6, 60.0)
+        for k in range(20):
+            mgr._on_rx_line(telemetry_line(k, Y))
+
+        assert wait_until(lambda: mgr.fk_stats()["queue_depth"] == 0 and len(seen) >= 1)
+        time.sleep(0.1)
+        stats = mgr.fk_stats()
+        print(f"   Stats: {stats}")
+        assert stats["frames_in"] == 20
+        assert stats["frames_published"] + stats["frames_dropped"] == 20
+        assert stats["frames_dropped"] > 0
+        print("   ✅ OK")
+    finally:
+        mgr.stop_evt.set()
+        mgr.close()
+
+
+def test_fk_cache_hits_and_quantization():
+    """Comprimentos iguais dentro da resolução reaproveitam a solução"""
+    print("\n3️⃣ Cache FK quantizado...")
+    cache = FKCache(resolution_mm=0.01, max_entries=2)
+    L = np.array([560.0, 561.0, 562.0, 563.0, 564.0, 565.0])
+    pose = {"x": 1.0, "y": 0.0, "z": 520.0, "roll": 0.0, "pitch": 0.0, "yaw": 0.0}
+    P = np.zeros((6, 3))
+
+    assert cache.get(L) is None
+    cache.put(L, pose, P)
+    assert cache.get(L + 0.004) is not None      # mesma célula de 0.01 mm
+    assert cache.get(L + 0.02) is None           # célula vizinha
+
+    cache.put(L + 1, pose, P)
+    cache.put(L + 2, pose, P)                    # excede max_entries → remove o mais antigo
+    assert cache.get(L) is None
+    stats = cache.stats()
+    print(f"   Stats: {stats}")
+    assert stats["size"] == 2 and stats["hits"] == 1
+    print("   ✅ OK")
+
+
+def test_fk_cache_used_by_pipeline_and_invalidated_by_config():
+    """Frames repetidos acertam o cache; POST /config limpa o cache"""
+    print("\n4️⃣ Cache no pipeline e invalidação por /config...")
+    mgr = app.serial_mgr
+    original_platform = app.platform
+    mgr.fk_cache.clear()
+    try:
+        L, _, _ = original_platform.inverse_kinematics(x=0, y=0, z=530)
+        for _ in range(5):
+            mgr._publish_frame({"ts": time.time()}, L)
+        stats = mgr.fk_cache.stats()
+        assert stats["hits"] == 4 and stats["misses"] == 1
+
+        app.set_config(PlatformConfig(h0=440, stroke_min=500, stroke_max=680))
+        assert mgr.fk_cache.stats()["size"] == 0
+        # chute inicial volta para a altura neutra da nova geometria
+        assert mgr._last_pose_guess[2] == app.platform.compute_limits()["neutral_z"]
+        print("   ✅ OK")
+    finally:
+        app.switch_geometry(original_platform)
+
+
+def test_fk_rate_decoupled_from_telemetry():
+    """Com rate_hz baixo, frames intermediários levam a última pose e sua idade"""
+    print("\n5️⃣ Taxa FK desacoplada...")
+    mgr = SerialManager()
+    mgr.fk_rate_hz = 10.0  # uma solução a cada 100 ms
+    L, _, _ = platform.inverse_kinematics(x=0, y=0, z=530)
+
+    frames = []
+    t0 = time.time()
+    for k in range(6):
+        payload = {"ts": t0 + k * 0.033}
+        mgr._publish_frame(payload, L + k * 0.5)
+        frames.append(payload)
+
+    stats = mgr.fk_stats()
+    print(f"   Stats: solved={stats['fk_solved']}, reused={stats['fk_reused']}")
+    assert stats["fk_solved"] == 1 and stats["fk_reused"] == 5
+    assert frames[0]["pose_age_ms"] == 0.0
+    assert abs(frames[3]["pose_age_ms"] - 99.0) < 1e-3
+    assert frames[5]["pose_live"] == frames[0]["pose_live"]
+
+    mgr._fk_last_solve_mono -= 1.0  # simula passagem do período
+    payload = {"ts": t0 + 1.0}
+    mgr._publish_frame(payload, L)
+    assert payload["pose_age_ms"] == 0.0
+    assert mgr.fk_stats()["fk_solved"] == 2
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Pipeline leitura → FK")
+    print("=" * 50)
+    test_fk_worker_publishes_pose()
+    test_latest_wins_drops_stale_frames()
+    test_fk_cache_hits_and_quantization()
+    test_fk_cache_used_by_pipeline_and_invalidated_by_config()
+    test_fk_rate_decoupled_from_telemetry()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
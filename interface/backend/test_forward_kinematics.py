@@ -0,0 +1,121 @@
+"""
+Teste da cinemática direta (sem servidor)
+Gera comprimentos pela cinemática inversa e verifica se os motores
+"newton" (Jacobiano analítico) e "lsq" (least_squares) recuperam a pose.
+Execute com: python test_forward_kinematics.py
+"""
+import sys
+sys.path.append('.')
+
+import numpy as np
+
+from app import platform
+
+AXES = ["x", "y", "z", "roll", "pitch", "yaw"]
+
+
+def random_poses(n=100, seed=1):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(-30, 30, n),
+        rng.uniform(-30, 30, n),
+        rng.uniform(450, 590, n),
+        rng.uniform(-8, 8, n),
+        rng.uniform(-8, 8, n),
+        rng.uniform(-8, 8, n),
+    ])
+
+
+def test_jacobian_matches_finite_differences():
+    """Jacobiano analítico deve bater com diferenças finitas"""
+    print("\n1️⃣ Jacobiano analítico x diferenças finitas...")
+    q = np.array([12.0, -7.0, 520.0, 3.0, -4.0, 5.0])
+    L, _, _ = platform.inverse_kinematics_batch(q)
+    _, J = platform._fk_residuals_jacobian(q, L[0])
+
+    h = 1e-6
+    J_fd = np.empty((6, 6))
+    for k in range(6):
+        dq = np.zeros(6)
+        dq[k] = h
+        r_plus, _ = platform._fk_residuals_jacobian(q + dq, L[0])
+        r_minus, _ = platform._fk_residuals_jacobian(q - dq, L[0])
+        J_fd[:, k] = (r_plus - r_minus) / (2 * h)
+
+    assert np.allclose(J, J_fd, atol=1e-5), np.abs(J - J_fd).max()
+    print("   ✅ OK")
+
+
+def test_newton_recovers_pose():
+    """Newton com warm start recupera a pose com poucas iterações"""
+    print("\n2️⃣ Newton (warm start)...")
+    rng = np.random.default_rng(2)
+    poses = random_poses()
+    L, _, _ = platform.inverse_kinematics_batch(poses)
+
+    iterations = []
+    for q, lengths in zip(poses, L):
+        x0 = q + np.r_[rng.normal(0, 2, 3), rng.normal(0, 1, 3)]
+        pose, P, info = platform.solve_forward_kinematics(lengths, x0=x0, method="newton")
+        assert pose is not None
+        assert not info["fallback"]
+        assert np.allclose([pose[a] for a in AXES], q, atol=1e-4)
+        assert info["residual_mm"] < 1e-6
+        iterations.append(info["iterations"])
+
+    print(f"   ✅ {len(poses)} poses, média de {np.mean(iterations):.1f} iterações")
+
+
+def test_newton_matches_lsq():
+    """Ambos os motores convergem para a mesma pose a partir da pose neutra"""
+    print("\n3️⃣ Newton x least_squares...")
+    q = np.array([5.0, 10.0, 540.0, -2.0, 3.0, 1.0])
+    L, _, _ = platform.inverse_kinematics_batch(q)
+
+    pose_n, P_n, info_n = platform.solve_forward_kinematics(L[0], method="newton")
+    pose_l, P_l, info_l = platform.solve_forward_kinematics(L[0], method="lsq")
+    assert np.allclose([pose_n[a] for a in AXES], [pose_l[a] for a in AXES], atol=1e-3)
+    assert np.allclose(P_n, P_l, atol=1e-3)
+    print(f"   Newton: {info_n['iterations']} it, {info_n['solve_ms']:.3f} ms")
+    print(f"   LSQ:    {info_l['iterations']} nfev, {info_l['solve_ms']:.3f} ms")
+    print("   ✅ OK")
+
+
+def test_estimate_pose_compat():
+    """estimate_pose_from_lengths mantém a assinatura (pose, P)"""
+    print("\n4️⃣ Compatibilidade de estimate_pose_from_lengths...")
+    L, _, _ = platform.inverse_kinematics(x=0, y=0, z=520)
+    pose, P = platform.estimate_pose_from_lengths(L)
+    assert abs(pose["z"] - 520) < 1e-3
+    assert P.shape == (6, 3)
+    print("   ✅ OK")
+
+
+def test_invalid_method():
+    """Método desconhecido gera ValueError"""
+    print("\n5️⃣ Método inválido...")
+    L, _, _ = platform.inverse_kinematics(x=0, y=0, z=520)
+    try:
+        platform.solve_forward_kinematics(L, method="foo")
+    except ValueError:
+        print("   ✅ ValueError levantado")
+        return
+    raise AssertionError("método 'foo' deveria ser rejeitado")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Cinemática direta")
+    print("=" * 50)
+    test_jacobian_matches_finite_differences()
+    test_newton_recovers_pose()
+    test_newton_matches_lsq()
+    test_estimate_pose_compat()
+    test_invalid_method()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Teste dos perfis de geometria e da troca a quente (sem servidor)
+Carrega perfis do disco, troca a geometria ativa e verifica que MotionRunner,
+SerialManager e as tabelas derivadas acompanham a troca (e que as antigas são liberadas).
+Execute com: python test_geometry_profiles.py
+"""
+import sys
+sys.path.append('.')
+
+import gc
+import json
+import os
+import shutil
+import tempfile
+import weakref
+
+import numpy as np
+
+import app
+from app import (StewartPlatform, PlatformConfig, switch_geometry, load_geometry_profile,
+                 get_geometry_profiles, activate_geometry_profile, set_config, get_config_limits)
+from fastapi import HTTPException
+
+
+def write_profile(folder, name, **overrides):
+    data = StewartPlatform().to_profile().model_dump()
+    data.update(overrides)
+    with open(os.path.join(folder, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def test_default_profile_matches_builtin():
+    """default.json descreve a mesma geometria da plataforma embutida"""
+    print("\n1️⃣ Perfil default...")
+    assert "default" in get_geometry_profiles()["profiles"]
+    geo = StewartPlatform.from_profile(load_geometry_profile("default"))
+    builtin = StewartPlatform()
+    assert np.allclose(geo.B, builtin.B) and np.allclose(geo.P0, builtin.P0)
+    assert (geo.h0, geo.stroke_min, geo.stroke_max) == (builtin.h0, builtin.stroke_min, builtin.stroke_max)
+    print("   ✅ OK")
+
+
+def test_activate_switches_every_component():
+    """Ativar um perfil troca plataforma, MotionRunner e chute da FK juntos"""
+    print("\n2️⃣ Troca a quente...")
+    original = app.platform
+    folder = tempfile.mkdtemp()
+    old_dir = app.GEOMETRY_PROFILES_DIR
+    app.GEOMETRY_PROFILES_DIR = folder
+    try:
+        write_profile(folder, "short", stroke_max=660, home_z=510)
+        result = activate_geometry_profile("short")
+        print(f"   {result['message']} ({result['total_ms']:.0f} ms)")
+
+        assert app.platform.name == "short" and app.platform.stroke_max == 660
+        assert app.motion_runner.platform is app.platform
+        assert app.motion_runner._home_z_mm == 510
+        assert app.motion_runner._z_limits_mm is None
+        assert app.serial_mgr.fk_cache.stats()["size"] == 0
+        neutral_z = app.platform.compute_limits()["neutral_z"]
+        assert abs(app.serial_mgr._last_pose_guess[2] - neutral_z) < 1e-9
+        # artefatos já montados antes da troca
+        assert app.platform._workspace is not None
+        assert get_config_limits()["z_max"] < original.compute_limits()["z_max"]
+    finally:
+        app.GEOMETRY_PROFILES_DIR = old_dir
+        shutil.rmtree(folder)
+        switch_geometry(original)
+    assert app.platform is original and app.motion_runner.platform is original
+    print("   ✅ OK")
+
+
+def test_old_tables_are_released():
+    """Depois da troca, a plataforma anterior (e suas tabelas) é coletada"""
+    print("\n3️⃣ Liberação da geometria antiga...")
+    original = app.platform
+    try:
+        switch_geometry(StewartPlatform(name="tmp-a"))
+        ref = weakref.ref(app.platform)
+        ws_ref = weakref.ref(app.platform.workspace())
+        switch_geometry(StewartPlatform(name="tmp-b"))
+        gc.collect()
+        assert ref() is None, "plataforma antiga ainda referenciada"
+        assert ws_ref() is None, "tabela do espaço de trabalho antiga ainda em memória"
+    finally:
+        switch_geometry(original)
+    print("   ✅ OK")
+
+
+def test_invalid_profile_keeps_active_geometry():
+    """Perfil inválido é rejeitado sem mexer na geometria ativa"""
+    print("\n4️⃣ Perfil inválido...")
+    original = app.platform
+    folder = tempfile.mkdtemp()
+    old_dir = app.GEOMETRY_PROFILES_DIR
+    app.GEOMETRY_PROFILES_DIR = folder
+    try:
+        write_profile(folder, "broken", B=[[0, 0, 0]] * 5)
+        write_profile(folder, "unreachable", stroke_min=10, stroke_max=20)
+        for name, status in (("broken", 400), ("unreachable", 400), ("../default", 404), ("missing", 404)):
+            try:
+                activate_geometry_profile(name)
+            except HTTPException as e:
+                assert e.status_code == status, (name, e.status_code)
+            else:
+                raise AssertionError(f"perfil '{name}' deveria ser rejeitado")
+        assert app.platform is original and app.motion_runner.platform is original
+    finally:
+        app.GEOMETRY_PROFILES_DIR = old_dir
+        shutil.rmtree(folder)
+    print("   ✅ OK")
+
+
+def test_set_config_uses_same_switch():
+    """POST /config mantém B/P0 e também atualiza o MotionRunner"""
+    print("\n5️⃣ POST /config...")
+    original = app.platform
+    try:
+        set_config(PlatformConfig(h0=440, stroke_min=500, stroke_max=670))
+        assert app.platform.h0 == 440 and app.platform.name == "custom"
+        assert np.allclose(app.platform.B, original.B)
+        assert app.motion_runner.platform is app.platform
+    finally:
+        switch_geometry(original)
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Perfis de geometria")
+    print("=" * 50)
+    test_default_profile_matches_builtin()
+    test_activate_switches_every_component()
+    test_old_tables_are_released()
+    test_invalid_profile_keeps_active_geometry()
+    test_set_config_uses_same_switch()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Teste do cálculo de limites geométricos (sem servidor)
+Verifica StewartPlatform.compute_limits contra a IK, o handler de
+GET /config/limits e a calibração de limites do MotionRunner.
+Execute com: python test_limits.py
+"""
+import sys
+sys.path.append('.')
+
+import numpy as np
+
+from app import platform, StewartPlatform, MotionRunner, get_config_limits
+from fastapi import HTTPException
+
+
+def margin(**pose):
+    L, _, _ = platform.inverse_kinematics(**pose)
+    return min(np.min(L - platform.stroke_min), np.min(platform.stroke_max - L))
+
+
+def test_z_limits_at_neutral():
+    """z_min/z_max na orientação neutra ficam exatamente na borda do curso"""
+    print("\n1️⃣ Limites de z na pose neutra...")
+    lim = platform.compute_limits()
+    print(f"   z ∈ [{lim['z_min']:.2f}, {lim['z_max']:.2f}] mm, neutro = {lim['neutral_z']:.2f} mm "
+          f"({lim['compute_ms']:.1f} ms)")
+    assert 425 < lim["z_min"] < 440 and 620 < lim["z_max"] < 640
+    assert lim["z_min"] < lim["neutral_z"] < lim["z_max"]
+    assert abs(margin(x=0, y=0, z=lim["z_min"])) < 1e-3
+    assert abs(margin(x=0, y=0, z=lim["z_max"])) < 1e-3
+    assert margin(x=0, y=0, z=lim["z_min"] - 0.01) < 0
+    assert margin(x=0, y=0, z=lim["z_max"] + 0.01) < 0
+    print("   ✅ OK")
+
+
+def test_axis_excursions_are_tight():
+    """Cada borda de eixo fica no limite do curso a partir da pose base"""
+    print("\n2️⃣ Excursão por eixo a partir de z=520...")
+    lim = platform.compute_limits({"z": 520})
+    base = lim["base_pose"]
+    for name, ax in lim["axes"].items():
+        for edge in ("min", "max"):
+            pose = dict(base)
+            pose[name] = ax[edge]
+            assert abs(margin(**pose)) < 1e-3, (name, edge)
+        assert ax["neg"] > 0 and ax["pos"] > 0
+        print(f"   {name:>5}: [{ax['min']:8.2f}, {ax['max']:8.2f}]")
+    print("   ✅ OK")
+
+
+def test_limits_cached_per_geometry():
+    """Mesma pose base reaproveita o resultado; outra geometria recalcula"""
+    print("\n3️⃣ Cache por geometria...")
+    assert platform.compute_limits() is platform.compute_limits()
+    calls = []
+    fresh = StewartPlatform(h0=platform.h0, stroke_min=platform.stroke_min, stroke_max=platform.stroke_max)
+    neutral_height = fresh.neutral_height
+    fresh.neutral_height = lambda *a: calls.append(a) or neutral_height(*a)
+    lim = fresh.compute_limits()
+    assert fresh.compute_limits() is lim and fresh.compute_limits({"z": None}) is lim
+    assert len(calls) == 1  # acerto no cache não busca a altura neutra de novo
+    assert lim["base_pose"]["z"] == lim["neutral_z"]
+    assert fresh.compute_limits({"z": lim["neutral_z"]})["axes"] == lim["axes"]
+    other = StewartPlatform(h0=432, stroke_min=500, stroke_max=660)
+    assert other.compute_limits()["z_max"] < platform.compute_limits()["z_max"]
+    print("   ✅ OK")
+
+
+def test_config_limits_endpoint():
+    """GET /config/limits e pose base inválida → 400"""
+    print("\n4️⃣ GET /config/limits...")
+    lim = get_config_limits(z=520)
+    assert lim["base_pose"]["z"] == 520
+    try:
+        get_config_limits(z=700)
+    except HTTPException as e:
+        assert e.status_code == 400
+    else:
+        raise AssertionError("pose base fora do curso deveria ser rejeitada")
+    print("   ✅ OK")
+
+
+def test_motion_runner_uses_same_limits():
+    """MotionRunner calibra a partir de compute_limits com margem de segurança"""
+    print("\n5️⃣ Calibração do MotionRunner...")
+    runner = MotionRunner(serial_manager=None, stewart_platform=platform)
+    runner._calibrate_limits_from_home()
+    lim = platform.compute_limits(runner._home_pose())
+    z_min, z_max = runner._z_limits_mm
+    assert abs(z_min - (lim["z_min"] + runner._z_safety_mm)) < 1e-9
+    assert abs(z_max - (lim["z_max"] - runner._z_safety_mm)) < 1e-9
+
+    pose = runner._clamp_pose({"x": 0, "y": 0, "z": 900, "roll": 50, "pitch": 0, "yaw": 0})
+    assert pose["z"] == z_max
+    assert pose["roll"] <= 10.0
+    print(f"   Z calibrado: [{z_min:.2f}, {z_max:.2f}] mm")
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Limites geométricos")
+    print("=" * 50)
+    test_z_limits_at_neutral()
+    test_axis_excursions_are_tight()
+    test_limits_cached_per_geometry()
+    test_config_limits_endpoint()
+    test_motion_runner_uses_same_limits()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
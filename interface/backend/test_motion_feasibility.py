@@ -0,0 +1,174 @@
+"""
+Teste da análise de velocidade/aceleração das pernas (sem servidor e sem serial)
+Compara os perfis numéricos com a derivada analítica de uma senoide e verifica
+o precheck de /motion/start contra os limites configurados, inclusive em rotinas longas.
+Execute com: python test_motion_feasibility.py
+"""
+import sys
+sys.path.append('.')
+
+from math import pi
+from types import SimpleNamespace
+
+import numpy as np
+
+from app import (platform, motion_runner, serial_mgr, MotionRequest, MotionLimits, StewartPlatform,
+                 motion_analyze, motion_start, set_motion_limits, get_motion_limits,
+                 ACTUATOR_VMAX_MM_S_DEFAULT)
+from fastapi import HTTPException
+
+
+def test_leg_rates_match_analytic_sine():
+    """Heave senoidal: perfis batem com v = Aω·cos e a = -Aω²·sin"""
+    print("\n1️⃣ Perfis x derivada analítica...")
+    dt, hz, amp = 1.0 / 600.0, 1.0, 10.0
+    t = np.arange(0.0, 2.0, dt)
+    w = 2 * pi * hz
+    L = 600.0 + amp * np.sin(w * t)[:, None] * np.ones(6)
+    v, a = StewartPlatform.leg_rates(L, dt)
+    inner = slice(2, -2)
+    assert np.allclose(v[inner], (amp * w * np.cos(w * t))[inner, None], rtol=1e-3, atol=1e-2)
+    assert np.allclose(a[inner], (-amp * w * w * np.sin(w * t))[inner, None], rtol=1e-3, atol=1.0)
+    print("   ✅ OK")
+
+
+def test_slow_routine_is_feasible():
+    """Rotina lenta fica abaixo do vmax do firmware"""
+    print("\n2️⃣ Rotina lenta...")
+    result = motion_analyze(MotionRequest(routine="sine_axis", axis="z", duration_s=10, hz=0.2))
+    print(f"   v pico={max(result['peak_velocity_mm_s']):.1f} mm/s ({result['compute_ms']:.0f} ms)")
+    assert result["vmax_mm_s"] == ACTUATOR_VMAX_MM_S_DEFAULT
+    assert result["feasible"] and result["velocity_ok"]
+    assert len(result["peak_velocity_mm_s"]) == 6
+    assert "profiles" not in result
+    print("   ✅ OK")
+
+
+def test_fast_routine_exceeds_vmax():
+    """heave_pitch a 2 Hz pede mais de 150 mm/s e é rejeitada antes de mover"""
+    print("\n3️⃣ Rotina rápida...")
+    req = MotionRequest(routine="heave_pitch", duration_s=10, hz=2.0)
+    result = motion_analyze(req, include_profiles=True)
+    print(f"   v pico={max(result['peak_velocity_mm_s']):.1f} mm/s, "
+          f"violação em t={result['first_dynamics_violation_t']:.2f}s")
+    assert not result["velocity_ok"] and not result["feasible"]
+    assert len(result["profiles"]["velocity_mm_s"]) == result["samples"]
+
+    try:
+        motion_start(req)  # serial é verificada antes do precheck
+    except HTTPException as e:
+        assert e.status_code == 409
+    else:
+        raise AssertionError("sem serial a rotina não deveria iniciar")
+
+    saved = serial_mgr.ser
+    serial_mgr.ser = SimpleNamespace(is_open=True)  # porta "aberta": precheck recusa antes de escrever
+    try:
+        motion_start(req)
+    except HTTPException as e:
+        assert e.status_code == 400
+        assert "limites dos atuadores" in e.detail
+    else:
+        raise AssertionError("rotina inviável não deveria iniciar")
+    finally:
+        serial_mgr.ser = saved
+    print("   ✅ OK")
+
+
+def test_limits_settings():
+    """POST /motion/limits altera vmax/amax usados no precheck"""
+    print("\n4️⃣ POST /motion/limits...")
+    original = get_motion_limits()
+    try:
+        set_motion_limits(MotionLimits(vmax_mm_s=400.0, amax_mm_s2=500.0))
+        req = MotionRequest(routine="heave_pitch", duration_s=10, hz=2.0)
+        result = motion_analyze(req)
+        assert result["velocity_ok"]
+        assert not result["acceleration_ok"]  # ~2000 mm/s² > 500
+        assert not result["feasible"]
+
+        set_motion_limits(MotionLimits(amax_mm_s2=0))
+        assert motion_analyze(req)["feasible"]
+    finally:
+        set_motion_limits(MotionLimits(vmax_mm_s=original["vmax_mm_s"],
+                                       amax_mm_s2=original["amax_mm_s2"],
+                                       enforce=original["enforce"]))
+    print("   ✅ OK")
+
+
+def test_invalid_routine_rejected():
+    """Rotina desconhecida → 400"""
+    print("\n5️⃣ Rotina inválida...")
+    try:
+        motion_analyze(MotionRequest(routine="foo"))
+    except HTTPException as e:
+        assert e.status_code == 400
+        print("   ✅ OK")
+        return
+    raise AssertionError("rotina 'foo' deveria ser rejeitada")
+
+
+def test_long_routine_same_sampling():
+    """Rotina longa: mesmo passo e mesmos picos de uma amostragem completa (não afrouxa com a duração)"""
+    print("\n6️⃣ Rotina longa...")
+    original = get_motion_limits()
+    try:
+        for hz in (2.0, 0.7):  # período com nº inteiro de ticks e sem (0.7 Hz → 85.7 ticks)
+            kw = dict(routine="sine_axis", axis="z", amp=5.0, hz=hz)
+            dt = motion_analyze(MotionRequest(duration_s=600, **kw))["dt_s"]
+            assert 1.0 / 61.0 < dt <= 1.0 / 60.0 and abs(1.0 / hz / dt - round(1.0 / hz / dt)) < 1e-9
+
+            # referência: a rotina inteira amostrada na mesma grade
+            grid = np.arange(0.0, 600.0, dt)
+            poses = motion_runner._trajectory_poses(MotionRequest(duration_s=600, **kw), grid,
+                                                    motion_runner._home_axis_limits() or {})
+            v, a = StewartPlatform.leg_rates(platform.inverse_kinematics_batch(poses)[0], dt)
+            v_ref, a_ref = np.abs(v).max(), np.abs(a).max()
+
+            set_motion_limits(MotionLimits(vmax_mm_s=0.9 * v_ref))
+            for duration in (600, 3600):
+                result = motion_analyze(MotionRequest(duration_s=duration, **kw))
+                print(f"   {hz} Hz, {duration} s: {result['samples']} amostras em {result['windows_s']}, "
+                      f"v pico={max(result['peak_velocity_mm_s']):.1f} mm/s ({result['compute_ms']:.0f} ms)")
+                assert result["dt_s"] == dt and len(result["windows_s"]) == 2
+                assert abs(max(result["peak_velocity_mm_s"]) - v_ref) < 1e-6 * v_ref
+                assert abs(max(result["peak_acceleration_mm_s2"]) - a_ref) < 1e-6 * a_ref
+                assert not result["velocity_ok"]  # acima do limite em qualquer duração
+    finally:
+        set_motion_limits(MotionLimits(vmax_mm_s=original["vmax_mm_s"], amax_mm_s2=original["amax_mm_s2"],
+                                       enforce=original["enforce"]))
+    print("   ✅ OK")
+
+
+def test_analyze_keeps_runner_limits():
+    """/motion/analyze com rotina em curso não recalibra os limites do runner"""
+    print("\n7️⃣ Analyze sem efeito colateral...")
+    saved = motion_runner._z_limits_mm, motion_runner._axis_limits_home
+    try:
+        motion_runner._z_limits_mm, motion_runner._axis_limits_home = (1.0, 2.0), {"z": (1.0, 2.0)}
+        result = motion_analyze(MotionRequest(routine="sine_axis", axis="z", duration_s=10, hz=0.2))
+        assert result["all_valid"]  # usou os limites da HOME, não os do runner
+        assert motion_runner._z_limits_mm == (1.0, 2.0) and motion_runner._axis_limits_home == {"z": (1.0, 2.0)}
+    finally:
+        motion_runner._z_limits_mm, motion_runner._axis_limits_home = saved
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Viabilidade dinâmica das rotinas")
+    print("=" * 50)
+    test_leg_rates_match_analytic_sine()
+    test_slow_routine_is_feasible()
+    test_fast_routine_exceeds_vmax()
+    test_limits_settings()
+    test_invalid_routine_rejected()
+    test_long_routine_same_sampling()
+    test_analyze_keeps_runner_limits()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Teste das transações confirmadas da serial (sem hardware)
+Um firmware falso responde "OK ..."/"ERR ..." como o ESP32 (com atraso de ida e volta)
+e os handlers PID são chamados direto, sem servidor. Respostas a comandos escritos
+antes da transação (setpoints da rotina, v? avulso) não podem confirmá-la.
+Execute com: python test_pid_transactions.py
+"""
+import sys
+sys.path.append('.')
+
+import threading
+import time
+
+import app
+from app import (SerialManager, PendingAck, expected_reply, set_pid_gains, set_pid_batch, set_pid_offset,
+                 api_serial_transaction, PIDGains, PIDBatch, SerialTransaction, pid_gains_cache)
+from fastapi import HTTPException
+
+RTT_S = 0.02  # ida e volta simulada (USB + laço do firmware)
+
+
+class FakeFirmware:
+    """Serial falsa que interpreta os comandos como o pid-control-filter-spike-bno"""
+
+    def __init__(self, mgr, rtt_s=RTT_S, mute=False):
+        self.mgr = mgr
+        self.rtt_s = rtt_s
+        self.mute = mute
+        self.is_open = True
+        self.sel = 0
+        self.kp = [0.0] * 6
+        self.u0a = [0.0] * 6
+        self.offset = [0.0] * 6
+        self.received = []
+
+    def write(self, data):
+        lines = data.decode().splitlines()
+        self.received += lines
+        replies = [r for r in map(self._handle, lines) if r]
+        if replies and not self.mute:
+            threading.Timer(self.rtt_s, lambda: [self.mgr._on_rx_line(r) for r in replies]).start()
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+    def _handle(self, cmd):
+        if cmd.startswith("sel="):
+            self.sel = min(max(int(cmd[4:]), 1), 6) - 1
+        elif cmd.startswith("kpmm="):
+            self.kp[self.sel] = float(cmd[5:])
+        elif cmd.startswith(("kimm=", "kdmm=", "dbmm=", "minpwm=")):
+            pass
+        elif cmd.startswith("u0a="):
+            self.u0a[self.sel] = float(cmd[4:])
+            return f"OK U0_adv[{self.sel + 1}]={self.u0a[self.sel]:.1f}"
+        elif cmd.startswith("offset="):
+            self.offset[self.sel] = float(cmd[7:])
+            return f"OK offset[{self.sel + 1}]={self.offset[self.sel]:.3f} mm"
+        elif cmd.startswith("cal="):
+            v0, v100 = map(float, cmd[4:].split(","))
+            return f"OK CAL[{self.sel + 1}]=V0={v0:.4f} V, V100={v100:.4f} V" if v100 > v0 + 0.02 else "ERR CAL span pequeno"
+        elif cmd.startswith("spmm6x="):
+            return "OK spmm6x aplicado"
+        elif cmd == "v?":
+            return f"V[{self.sel + 1}]=1.2345 V | Y=10.000 mm"
+        return None
+
+
+def attach(mgr, fw):
+    mgr.ser = fw
+    mgr.stop_evt.clear()
+    mgr.tx_thread = threading.Thread(target=mgr._tx_loop, daemon=True)
+    mgr.tx_thread.start()
+
+
+def test_expected_reply_table():
+    """Comandos com e sem resposta própria no firmware"""
+    print("\n1️⃣ Tabela de respostas...")
+    assert expected_reply("u0a=12.00") == ("OK U0_adv[",)
+    assert expected_reply("u0aall=12.00") == ("OK U0_adv para todos",)
+    assert expected_reply("offsetall=1.000") == ("OK offset para todos",)
+    assert expected_reply("ZERO") == ("OK ZERO[",)
+    assert expected_reply("cal=0.5,2.5") == ("OK CAL[", "ERR CAL")
+    for cmd in ("sel=1", "kpmm=1.0", "kpall=2.0", "dbmm=0.2", "minpwm=40", "spmm1=10", "spmm=10"):
+        assert expected_reply(cmd) is None, cmd
+    print("   ✅ OK")
+
+
+def test_unacked_batch_uses_barrier():
+    """sel= + ganhos (sem resposta) são confirmados pelo v? no fim do lote"""
+    print("\n2️⃣ Lote sem respostas próprias + barreira...")
+    mgr = SerialManager()
+    fw = FakeFirmware(mgr)
+    attach(mgr, fw)
+    result = mgr.transaction(["sel=3", "kpmm=1.5000", "kimm=0.1000"])
+    mgr.close()
+
+    print(f"   {result['elapsed_ms']:.1f} ms | {[c['status'] for c in result['commands']]}")
+    assert result["ok"] and result["barrier"]
+    assert [c["status"] for c in result["commands"]] == ["implied"] * 3
+    assert fw.received == ["sel=3", "kpmm=1.5000", "kimm=0.1000", "v?"]
+    assert fw.kp[2] == 1.5
+    assert result["elapsed_ms"] < RTT_S * 1000 * 3
+    print("   ✅ OK")
+
+
+def test_bulk_six_pistons_in_one_round_trip():
+    """POST /pid/batch: 6 pistões (ganhos + feedforward) em ~uma ida e volta"""
+    print("\n3️⃣ Reconfiguração dos 6 pistões...")
+    mgr = app.serial_mgr
+    fw = FakeFirmware(mgr)
+    attach(mgr, fw)
+    try:
+        batch = PIDBatch(
+            gains=[PIDGains(piston=p, kp=1.0 + p, ki=0.1, kd=0.01) for p in range(1, 7)],
+            feedforward=[{"piston": p, "u0_adv": 10.0 * p} for p in range(1, 7)],
+        )
+        t0 = time.perf_counter()
+        res = set_pid_batch(batch)
+        wall_ms = (time.perf_counter() - t0) * 1000
+    finally:
+        mgr.close()
+
+    old_ms = res["commands"] * 10  # esquema antigo: sleep(0.01) por linha
+    print(f"   {res['commands']} comandos em {wall_ms:.1f} ms (antes: ≥ {old_ms} ms só em sleeps)")
+    assert fw.kp == [1.0 + p for p in range(1, 7)]
+    assert fw.u0a == [10.0 * p for p in range(1, 7)]
+    assert all(pid_gains_cache[p]["kp"] == 1.0 + p for p in range(1, 7))
+    assert wall_ms < RTT_S * 1000 * 3
+    print("   ✅ OK")
+
+
+def test_err_reply_and_endpoint_error():
+    """ERR do firmware marca o comando; handler PID devolve 400"""
+    print("\n4️⃣ Resposta ERR...")
+    mgr = app.serial_mgr
+    fw = FakeFirmware(mgr)
+    attach(mgr, fw)
+    try:
+        result = api_serial_transaction(SerialTransaction(commands=["sel=2", "cal=0.50,0.51", "zero"], timeout_s=0.2))
+        assert not result["ok"]
+        assert result["commands"][1]["status"] == "error"
+        assert result["errors"] == ["ERR CAL span pequeno"]
+        assert result["timeouts"] == ["zero"]  # o firmware falso não implementa zero
+
+        res = set_pid_offset(piston=4, offset=0.25)
+        assert fw.offset[3] == 0.25 and res["ack_ms"] < RTT_S * 1000 * 3
+    finally:
+        mgr.close()
+    print("   ✅ OK")
+
+
+def test_timeout_and_unrelated_replies():
+    """Firmware mudo estoura o prazo; OK de outros comandos não confirma a transação"""
+    print("\n5️⃣ Timeout e respostas alheias...")
+    mgr = SerialManager()
+    fw = FakeFirmware(mgr, mute=True)
+    attach(mgr, fw)
+    done = {}
+    t = threading.Thread(target=lambda: done.update(mgr.transaction(["sel=1", "offset=1.0"], timeout=0.3)))
+    t.start()
+    time.sleep(0.05)
+    mgr._on_rx_line("OK spmm6x aplicado")   # resposta a um setpoint da rotina
+    mgr._on_rx_line("OK offset[1]=1.000 mm")
+    t.join()
+    assert done["ok"] and [c["status"] for c in done["commands"]] == ["implied", "ok"]
+
+    t0 = time.perf_counter()
+    result = mgr.transaction(["sel=1", "kpmm=2.0"], timeout=0.1)
+    elapsed = time.perf_counter() - t0
+    mgr.close()
+    assert not result["ok"] and result["timeouts"] == ["sel=1", "kpmm=2.0"]
+    assert 0.09 < elapsed < 0.5
+    stats = mgr.txn_stats()
+    print(f"   {stats}")
+    assert stats["pending_acks"] == 0 and stats["failed"] == 1 and stats["transactions"] == 2
+
+    try:
+        set_pid_gains(PIDGains(piston=1, kp=1.0))  # serial global fechada
+    except HTTPException as e:
+        assert e.status_code == 400
+    else:
+        raise AssertionError("serial fechada deveria gerar 400")
+    print("   ✅ OK")
+
+
+def test_replies_to_earlier_commands():
+    """Respostas a setpoints/v? escritos antes não confirmam; spmm6x da transação não é descartado"""
+    print("\n6️⃣ Respostas de comandos anteriores e latest-wins...")
+    mgr = SerialManager()
+    fw = FakeFirmware(mgr, mute=True)
+    attach(mgr, fw)
+    mgr.write_line("spmm6x=0,0,0,0,0,0")   # setpoint da rotina, resposta ainda em trânsito
+    mgr.write_line("v?")                    # /serial/send avulso
+    while len(fw.received) < 2:
+        time.sleep(0.005)
+    done = {}
+    t = threading.Thread(target=lambda: done.update(
+        mgr.transaction(["spmm6x=1,1,1,1,1,1", "sel=2"], timeout=0.5)))
+    t.start()
+    time.sleep(0.05)
+    mgr._on_rx_line("OK spmm6x aplicado")          # do setpoint da rotina
+    mgr._on_rx_line("V[1]=1.2345 V | Y=10.000 mm")  # do v? avulso
+    time.sleep(0.05)
+    assert t.is_alive() and not done, "resposta de comando anterior confirmou a transação"
+    mgr._on_rx_line("OK spmm6x aplicado")
+    mgr._on_rx_line("V[2]=1.2345 V | Y=10.000 mm")  # barreira
+    t.join()
+    assert done["ok"] and [c["status"] for c in done["commands"]] == ["ok", "implied"]
+    assert mgr.txn_stats()["pending_replies"] == 0
+    mgr.close()
+
+    # Sem thread TX: setpoint da transação e da rotina na fila ao mesmo tempo
+    mgr = SerialManager()
+    fw = FakeFirmware(mgr)
+    mgr.ser = fw
+    mgr.write_lines(["spmm6x=1,1,1,1,1,1"], acks=[PendingAck("spmm6x=1,1,1,1,1,1", expected_reply("spmm6x="))])
+    mgr.write_line("spmm6x=2,2,2,2,2,2")
+    mgr.write_line("spmm6x=3,3,3,3,3,3")
+    attach(mgr, fw)
+    while mgr.tx_stats()["queue_depth"]:
+        time.sleep(0.005)
+    time.sleep(0.05)
+    mgr.close()
+    print(f"   {fw.received}")
+    assert fw.received == ["spmm6x=1,1,1,1,1,1", "spmm6x=3,3,3,3,3,3"]
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Transações confirmadas (PID)")
+    print("=" * 50)
+    test_expected_reply_table()
+    test_unacked_batch_uses_barrier()
+    test_bulk_six_pistons_in_one_round_trip()
+    test_err_reply_and_endpoint_error()
+    test_timeout_and_unrelated_replies()
+    test_replies_to_earlier_commands()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
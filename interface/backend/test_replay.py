@@ -0,0 +1,231 @@
+"""
+Teste do replay de aquisições gravadas (sem hardware)
+Parse dos dois formatos do host, ritmo 1x/Nx, seek/pausa/loop (a serial já está livre
+quando o replay termina) e a vazão de ingestão (linhas/s) do caminho
+_on_rx_line → FK com dados reais de aquisições/.
+Execute com: python test_replay.py
+"""
+import sys
+sys.path.append('.')
+
+import os
+import tempfile
+import time
+
+import app
+from app import (TelemetryReplay, SerialManager, parse_acquisition, list_acquisitions, REPLAY_DIR,
+                 start_replay, control_replay, seek_replay, get_replay, api_open_serial,
+                 ReplayRequest, ReplaySeek, SerialOpenRequest)
+from fastapi import HTTPException
+
+REAL_FILE = "stewart_full_2025-10-24_21-46-44.csv"  # ~8900 linhas RX, boot + telemetria de 14 campos
+HAS_REAL = os.path.isfile(os.path.join(REPLAY_DIR, REAL_FILE))
+
+
+def telem(ms, y=10.0):
+    return f"{ms};0.000;" + ";".join(f"{y + i:.3f}" for i in range(6)) + ";0;0;0;0;0;0"
+
+
+def write_monitor(path, n, period_s, t0_s=0.0):
+    """Log no formato do monitor serial: hora;direcao;"linha" """
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("hora;direcao;linha\r\n")
+        for k in range(n):
+            t = t0_s + k * period_s
+            hora = f"{int(t // 3600) % 24:02d}:{int(t // 60) % 60:02d}:{t % 60:06.3f}"
+            f.write(f'{hora};RX;"{telem(k * 100)}"\r\n')
+
+
+def wait_for(cond, timeout=5.0):
+    t_end = time.monotonic() + timeout
+    while time.monotonic() < t_end:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_parse_formats():
+    """Monitor serial (aspas, TX, lixo de boot, meia-noite) e dumps hora;ms;SP;FB"""
+    print("\n1️⃣ Parse dos formatos...")
+    monitor = ("hora;direcao;linha\r\n"
+               "23:59:59.900;RX;\x00\x0c\xff\xfe lixo\r\n"
+               "23:59:59.950;RX;ESP-ROM:esp32s3-20210327\r\n"
+               "23:59:59.990;TX;spmm6x=1,1,1,1,1,1\r\n"
+               "23:59:59.995;RX;\r\n"
+               f'00:00:00.050;RX;"{telem(100)}"\r\n').encode("utf-8") + b"00:00:00.150;RX;\"OK \xe9\"\r\n"
+    t, lines, info = parse_acquisition(monitor)
+    assert info["format"] == "monitor" and info["tx_rows"] == 1 and info["skipped"] == 2
+    assert lines[1:3] == ["ESP-ROM:esp32s3-20210327", telem(100)]
+    assert lines[3].startswith("OK ")  # byte inválido vira U+FFFD, não derruba o parse
+    assert abs(t[2] - 0.15) < 1e-9 and abs(info["duration_s"] - 0.25) < 1e-9
+
+    raw = b"20:28:09.518;ms;SP;FB\n20:28:09.519;99;0.000;7.218\n20:28:09.622;199;0.000;7.226\n"
+    t, lines, info = parse_acquisition(raw)
+    assert info["format"] == "raw" and lines == ["ms;SP;FB", "99;0.000;7.218", "199;0.000;7.226"]
+    assert abs(t[-1] - 0.104) < 1e-9
+
+    t, lines, info = parse_acquisition(b"06:48.3;RX;0;0;0;0\n06:48.4;RX;1;0;0;0\n")  # hora cortada pelo Excel
+    assert lines == ["0;0;0;0", "1;0;0;0"] and abs(t[-1] - 0.1) < 1e-9
+
+    files = list_acquisitions()
+    print(f"   {len(files)} aquisições em {REPLAY_DIR}")
+    if HAS_REAL:
+        assert any(f["file"] == "p1/p1.csv" for f in files)
+        for name in (REAL_FILE, "p1/p1.csv"):
+            with open(os.path.join(REPLAY_DIR, name), "rb") as f:
+                _, lines, info = parse_acquisition(f.read())
+            print(f"   {name}: {info['format']}, {info['lines']} linhas, {info['duration_s']:.1f} s")
+            assert info["lines"] > 1000
+    print("   ✅ OK")
+
+
+def test_speed_pacing():
+    """1x segue a hora do host; 4x leva um quarto do tempo"""
+    print("\n2️⃣ Ritmo 1x e 4x...")
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "rampa.csv")
+        write_monitor(path, 41, 0.02, t0_s=3600.0)  # 0,8 s gravados
+        for speed, expected in ((1.0, 0.8), (4.0, 0.2)):
+            mgr = SerialManager()
+            rp = TelemetryReplay(mgr, path, speed=speed)
+            t0 = time.monotonic()
+            rp.start()
+            rp.thread.join(timeout=5.0)
+            elapsed = time.monotonic() - t0
+            st = rp.status()
+            print(f"   speed={speed:g}: {elapsed:.3f} s (esperado {expected} s), atraso máx {st['max_lag_ms']:.1f} ms")
+            assert st["lines_fed"] == 41 and not st["running"]
+            assert expected - 0.01 < elapsed < expected + 0.15
+            assert mgr._fk_counters["frames_in"] == 41
+            assert mgr.offline_source is None and not mgr.fk_thread.is_alive()
+    print("   ✅ OK")
+
+
+def test_seek_pause_loop():
+    """seek reposiciona, pausa congela a posição e loop recomeça do início"""
+    print("\n3️⃣ Seek, pausa e loop...")
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "longa.csv")
+        write_monitor(path, 201, 0.01)  # 2 s gravados
+        mgr = SerialManager()
+        rp = TelemetryReplay(mgr, path, speed=1.0)
+        rp.start(start_s=0.5)
+        time.sleep(0.1)
+        assert 50 <= rp.status()["index"] <= 75
+        rp.seek(1.5)
+        time.sleep(0.1)
+        st = rp.status()
+        assert 150 <= st["index"] <= 175 and st["position_s"] >= 1.5
+        assert mgr.latest["Y"][0] == 10.0
+
+        rp.set_paused(True)
+        time.sleep(0.05)
+        idx = rp.status()["index"]
+        time.sleep(0.15)
+        assert rp.status()["index"] == idx and rp.status()["paused"]
+        rp.set_paused(False)
+        assert wait_for(lambda: not rp.running, timeout=2.0)  # chega ao fim sem loop
+
+        try:
+            rp.seek(10.0)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("seek além da duração deveria falhar")
+
+        # fim natural: quando running cai a serial já está livre (sem janela para /serial/open)
+        for _ in range(5):
+            quick = TelemetryReplay(mgr, path, speed=0)
+            quick.start()
+            assert wait_for(lambda: not quick.running)
+            assert mgr.offline_source is None, "running=False antes de liberar o SerialManager"
+
+        looping = TelemetryReplay(mgr, path, speed=0, loop=True)
+        looping.start()
+        assert wait_for(lambda: looping.status()["loops"] >= 3)
+        looping.stop()
+        st = looping.status()
+        print(f"   loop: {st['loops']} voltas, {st['lines_fed']} linhas")
+        assert not st["running"] and mgr.offline_source is None
+    print("   ✅ OK")
+
+
+def test_ingestion_benchmark():
+    """Sem espera: linhas reais/s pelo caminho _on_rx_line + FK"""
+    print("\n4️⃣ Vazão de ingestão (speed=0)...")
+    if not HAS_REAL:
+        print(f"   ⚠️ {REAL_FILE} ausente: benchmark pulado")
+        return
+    mgr = SerialManager()
+    rp = TelemetryReplay(mgr, os.path.join(REPLAY_DIR, REAL_FILE), speed=0)
+    telemetry_lines = sum(1 for line in rp.lines if len(line.split(app.CSV_DELIM)) >= 14)
+    rp.start()
+    rp.thread.join(timeout=60.0)
+    st, fk = rp.status(), mgr.fk_stats()
+    print(f"   {st['lines_fed']} linhas em {st['lines_fed'] / st['lines_per_s']:.2f} s → {st['lines_per_s']:.0f} linhas/s "
+          f"({st['avg_feed_us']:.1f} µs/linha; gravação de {st['duration_s']:.0f} s = "
+          f"{st['lines'] / st['duration_s']:.1f} linhas/s) | FK publicou {fk['frames_published']}, descartou {fk['frames_dropped']}")
+    assert st["lines_fed"] == st["lines"]
+    # linhas corrompidas com 14+ campos caem no parse_error, como na serial
+    assert telemetry_lines - 5 <= mgr._fk_counters["frames_in"] <= telemetry_lines
+    assert st["lines_per_s"] > 100 * st["lines"] / st["duration_s"]
+    print("   ✅ OK")
+
+
+def test_endpoints_and_serial_conflict():
+    """POST /replay/start usa a serial global; abrir a porta durante o replay é recusado"""
+    print("\n5️⃣ Endpoints /replay...")
+    for bad in ("../interface/backend/app.py", "nao_existe.csv"):
+        try:
+            start_replay(ReplayRequest(file=bad))
+        except HTTPException as e:
+            assert e.status_code == 404
+        else:
+            raise AssertionError(f"{bad} deveria gerar 404")
+    if not HAS_REAL:
+        print(f"   ⚠️ {REAL_FILE} ausente: resto pulado")
+        return
+
+    res = start_replay(ReplayRequest(file=REAL_FILE, speed=2.0, start_s=30.0))
+    try:
+        assert res["running"] and res["position_s"] >= 30.0
+        try:
+            start_replay(ReplayRequest(file=REAL_FILE))
+        except HTTPException as e:
+            assert e.status_code == 409
+        else:
+            raise AssertionError("segundo replay deveria gerar 409")
+        try:
+            api_open_serial(SerialOpenRequest(port="/dev/null"))
+        except HTTPException as e:
+            assert "Replay" in e.detail
+        else:
+            raise AssertionError("abrir a serial durante o replay deveria falhar")
+        assert wait_for(lambda: app.serial_mgr.latest.get("format") == "standard")
+        st = seek_replay(ReplaySeek(position_s=100.0, speed=0))
+        assert st["speed"] == 0
+        assert control_replay("pause")["paused"]
+    finally:
+        out = control_replay("stop")
+    assert not out["running"] and not get_replay()["running"]
+    assert app.serial_mgr.offline_source is None
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Replay de aquisições")
+    print("=" * 50)
+    test_parse_formats()
+    test_speed_pacing()
+    test_seek_pause_loop()
+    test_ingestion_benchmark()
+    test_endpoints_and_serial_conflict()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
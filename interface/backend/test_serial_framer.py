@@ -0,0 +1,148 @@
+"""
+Teste do framer de linhas da serial (sem hardware)
+Verifica o corte de linhas, o descarte de linhas gigantes, a leitura em bloco do
+_reader_loop com uma serial falsa e compara o custo com o split linha a linha antigo.
+Execute com: python test_serial_framer.py
+"""
+import sys
+sys.path.append('.')
+
+import threading
+import time
+
+from app import LineFramer, SerialManager
+
+
+def telemetry_line(ms):
+    return f"{ms};0.000;" + ";".join(["12.345"] * 6) + ";" + ";".join(["100"] * 6)
+
+
+def legacy_split(chunks):
+    """Laço antigo de _reader_loop: buf += data; split(b'\\n', 1) por linha"""
+    buf, lines = b"", []
+    for data in chunks:
+        buf += data
+        while b"\n" in buf:
+            line, buf = buf.split(b"\n", 1)
+            lines.append(line.rstrip(b"\r"))
+    return lines
+
+
+class FakeSerial:
+    """Serial falsa: entrega os blocos em ordem via in_waiting/read e sinaliza o fim"""
+
+    def __init__(self, chunks, on_end):
+        self._chunks = list(chunks)
+        self._pending = b""
+        self._on_end = on_end
+        self.reads = 0
+        self.is_open = True
+
+    @property
+    def in_waiting(self):
+        if not self._pending and self._chunks:
+            self._pending = self._chunks.pop(0)
+        return len(self._pending)
+
+    def read(self, n):
+        self.reads += 1
+        if not self._pending and not self._chunks:
+            self._on_end()
+            return b""
+        self.in_waiting
+        data, self._pending = self._pending[:n], self._pending[n:]
+        return data
+
+
+def test_splits_lines_across_chunks():
+    """Linhas partidas entre blocos, CRLF e várias linhas por bloco"""
+    print("\n1️⃣ Corte de linhas...")
+    framer = LineFramer()
+    assert framer.feed(b"abc") == []
+    assert framer.feed(b"def\r\nghi\n\njk") == [b"abcdef", b"ghi", b""]
+    assert framer.feed(b"l\n") == [b"jkl"]
+    assert framer.feed(b"tail") == []
+    assert framer.flush() == b"tail"
+    stats = framer.stats()
+    assert stats["bytes_in"] == len(b"abcdef\r\nghi\n\njkl\ntail") and stats["lines_out"] == 4 and stats["buffered_bytes"] == 0
+    print("   ✅ OK")
+
+
+def test_runaway_lines_are_capped():
+    """Lixo sem '\\n' maior que max_line é descartado até o próximo fim de linha"""
+    print("\n2️⃣ Linhas gigantes...")
+    framer = LineFramer(max_line=64)
+    for _ in range(10):
+        assert framer.feed(b"\xff\x00" * 50) == []
+        assert framer.stats()["buffered_bytes"] <= 64
+    assert framer.feed(b"still garbage\nok;1\n") == [b"ok;1"]
+    assert framer.feed(b"x" * 100 + b"\nok;2\n") == [b"ok;2"]  # gigante dentro de um bloco
+    stats = framer.stats()
+    print(f"   {stats}")
+    assert stats["lines_dropped"] == 2
+    assert stats["bytes_dropped"] == 1000 + len(b"still garbage\n") + 101
+    assert framer.flush() is None
+    print("   ✅ OK")
+
+
+def test_reader_loop_bulk_reads():
+    """_reader_loop lê tudo que está em in_waiting de uma vez e entrega linha a linha"""
+    print("\n3️⃣ _reader_loop com serial falsa...")
+    payload = b"\xff\xfe boot \x00" * 200 + b"\n" + b"".join(
+        telemetry_line(ms).encode() + b"\r\n" for ms in range(500)) + b"sem-fim"
+    chunks = [payload[i:i + 4096] for i in range(0, len(payload), 4096)]
+
+    mgr = SerialManager()
+    lines = []
+    mgr._on_rx_line = lines.append
+    mgr.ser = FakeSerial(chunks, mgr.stop_evt.set)
+    t = threading.Thread(target=mgr._reader_loop)
+    t.start()
+    t.join(timeout=5.0)
+    assert not t.is_alive()
+
+    assert lines[1:501] == [telemetry_line(ms) for ms in range(500)]
+    assert lines[-1] == "sem-fim"  # resto parcial entregue ao parar
+    assert mgr.ser.reads <= len(chunks) + 1
+    stats = mgr.rx_stats()
+    print(f"   {len(chunks)} blocos, {mgr.ser.reads} leituras, {stats['lines_out']} linhas")
+    assert stats["bytes_in"] == len(payload)
+    print("   ✅ OK")
+
+
+def test_linear_cost_on_bursts():
+    """Rajada grande: framer em uma passada x split linha a linha"""
+    print("\n4️⃣ Custo em rajadas...")
+    burst = b"".join(telemetry_line(ms).encode() + b"\n" for ms in range(20000))
+    chunks = [burst[i:i + 262144] for i in range(0, len(burst), 262144)]
+
+    t0 = time.perf_counter()
+    old = legacy_split(chunks)
+    legacy_ms = (time.perf_counter() - t0) * 1000
+
+    framer = LineFramer()
+    t0 = time.perf_counter()
+    new = [line for c in chunks for line in framer.feed(c)]
+    framer_ms = (time.perf_counter() - t0) * 1000
+
+    print(f"   {len(burst) / 1e6:.1f} MB: split antigo {legacy_ms:.1f} ms | framer {framer_ms:.1f} ms")
+    assert new == old
+    assert framer_ms < legacy_ms
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Framer de linhas da serial")
+    print("=" * 50)
+    test_splits_lines_across_chunks()
+    test_runaway_lines_are_capped()
+    test_reader_loop_bulk_reads()
+    test_linear_cost_on_bursts()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Teste da thread TX da serial (sem hardware)
+Verifica ordem dos comandos de configuração, descarte latest-wins de setpoints,
+prioridade da parada manual, que write_line não bloqueia numa porta lenta e
+o que acontece quando a escrita falha.
+Execute com: python test_serial_tx.py
+"""
+import sys
+sys.path.append('.')
+
+import threading
+import time
+
+import app
+from app import SerialManager, api_serial_stats, api_serial_status, TX_PRIO_URGENT
+
+
+class FakeTxSerial:
+    """Serial falsa para escrita: registra o que saiu e pode travar até gate.set()"""
+
+    def __init__(self, delay_s=0.0):
+        self.is_open = True
+        self.delay_s = delay_s
+        self.gate = threading.Event()
+        self.gate.set()
+        self.writes = []
+
+    def write(self, data):
+        self.gate.wait()
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        self.writes.append(bytes(data))
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+    def lines(self):
+        return b"".join(self.writes).decode().splitlines()
+
+
+def start_tx(mgr, ser):
+    mgr.ser = ser
+    mgr.stop_evt.clear()
+    mgr.tx_thread = threading.Thread(target=mgr._tx_loop, daemon=True)
+    mgr.tx_thread.start()
+
+
+def wait_idle(mgr, timeout=2.0):
+    t_end = time.monotonic() + timeout
+    while time.monotonic() < t_end:
+        stats = mgr.tx_stats()
+        if stats["written"] + stats["dropped_stale"] == stats["enqueued"]:
+            return
+        time.sleep(0.005)
+    raise AssertionError("fila TX não esvaziou")
+
+
+def test_config_order_and_latest_wins():
+    """Configuração sai em ordem; setpoints acumulados viram só o último"""
+    print("\n1️⃣ Ordem da configuração + setpoints latest-wins...")
+    mgr = SerialManager()
+    ser = FakeTxSerial()
+    start_tx(mgr, ser)
+    ser.gate.clear()                    # porta "travada": tudo se acumula na fila
+    mgr.write_line("sel=1")
+    time.sleep(0.05)                    # TX pegou o primeiro comando e está preso no write
+    for k in range(100):
+        mgr.write_line(f"spmm6x={k},{k},{k},{k},{k},{k}")
+        if k % 25 == 0:
+            mgr.write_line(f"kpmm={k}")
+    assert mgr.tx_stats()["queue_depth"] == 5  # 4 kpmm + 1 setpoint válido
+    ser.gate.set()
+    wait_idle(mgr)
+    mgr.close()
+
+    lines = ser.lines()
+    print(f"   {len(lines)} linhas escritas em {len(ser.writes)} chamadas: {lines}")
+    assert lines == ["sel=1", "kpmm=0", "kpmm=25", "kpmm=50", "kpmm=75", "spmm6x=99,99,99,99,99,99"]
+    stats = mgr.tx_stats()
+    assert stats["dropped_stale"] == 99
+    assert stats["written"] == 6 and stats["enqueued"] == 105
+    assert stats["writes"] == 2  # o acumulado sai numa única escrita
+    print("   ✅ OK")
+
+
+def test_setpoint_keeps_position_of_latest():
+    """Setpoint novo entra na posição de chegada (não fura configs anteriores)"""
+    print("\n2️⃣ Posição do setpoint na fila...")
+    mgr = SerialManager()
+    ser = FakeTxSerial()
+    start_tx(mgr, ser)
+    ser.gate.clear()
+    mgr.write_line("zero")
+    time.sleep(0.05)
+    mgr.write_line("spmm6x=1,1,1,1,1,1")
+    mgr.write_line("vmaxmmps=50.0")
+    mgr.write_line("spmm6x=2,2,2,2,2,2")
+    ser.gate.set()
+    wait_idle(mgr)
+    mgr.close()
+    assert ser.lines() == ["zero", "vmaxmmps=50.0", "spmm6x=2,2,2,2,2,2"]
+    print("   ✅ OK")
+
+
+def test_urgent_stop_jumps_queue():
+    """Parada manual ("OK", em qualquer caixa) sai antes dos comandos pendentes"""
+    print("\n3️⃣ Prioridade da parada...")
+    mgr = SerialManager()
+    ser = FakeTxSerial()
+    start_tx(mgr, ser)
+    ser.gate.clear()
+    mgr.write_line("A")
+    time.sleep(0.05)
+    for j in range(6):
+        mgr.write_line(f"spmm{j + 1}=10.000")
+    mgr.write_line("ok")  # firmware aceita em qualquer caixa
+    mgr.write_line("sel=2", priority=TX_PRIO_URGENT)
+    ser.gate.set()
+    wait_idle(mgr)
+    mgr.close()
+    lines = ser.lines()
+    assert lines[:3] == ["A", "ok", "sel=2"]
+    assert lines[3:] == [f"spmm{j + 1}=10.000" for j in range(6)]
+    print("   ✅ OK")
+
+
+def test_write_line_does_not_block():
+    """Chamador não espera a porta; latência fica registrada nas estatísticas"""
+    print("\n4️⃣ write_line numa porta lenta...")
+    mgr = SerialManager()
+    ser = FakeTxSerial(delay_s=0.02)
+    start_tx(mgr, ser)
+
+    t0 = time.perf_counter()
+    for k in range(50):
+        mgr.write_line(f"spmm6x={k},0,0,0,0,0")
+    caller_ms = (time.perf_counter() - t0) * 1000
+    wait_idle(mgr)
+    stats = mgr.tx_stats()
+    mgr.close()
+
+    print(f"   50 setpoints enfileirados em {caller_ms:.2f} ms | escritos {stats['written']}, "
+          f"descartados {stats['dropped_stale']}, latência máx {stats['max_latency_ms']:.1f} ms")
+    assert caller_ms < 20  # 50 escritas síncronas levariam ~1 s
+    assert stats["written"] + stats["dropped_stale"] == 50
+    assert ser.lines()[-1] == "spmm6x=49,0,0,0,0,0"
+    assert stats["max_latency_ms"] > 0
+    print("   ✅ OK")
+
+
+def test_closed_port_and_stats_endpoint():
+    """Porta fechada rejeita; close descarta pendentes; /serial/stats traz tx"""
+    print("\n5️⃣ Porta fechada e GET /serial/stats...")
+    mgr = SerialManager()
+    try:
+        mgr.write_line("zero")
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("serial fechada deveria gerar RuntimeError")
+
+    ser = FakeTxSerial()
+    start_tx(mgr, ser)
+    ser.gate.clear()
+    mgr.write_line("sel=1")
+    time.sleep(0.05)
+    mgr.write_line("sel=2")
+    mgr.write_line("sel=3")
+    ser.gate.set()  # libera o write em andamento; close descarta o resto
+    mgr.stop_evt.set()
+    mgr.close()
+    stats = mgr.tx_stats()
+    assert stats["written"] + stats["dropped_closed"] == 3
+    assert stats["queue_depth"] == 0 and not stats["running"]
+
+    data = api_serial_stats()
+    assert {"queue_depth", "dropped_stale", "avg_latency_ms"} <= set(data["tx"])
+    assert "bytes_in" in data
+    print("   ✅ OK")
+
+
+class FailingTxSerial(FakeTxSerial):
+    """Escreve só parte do lote e estoura o timeout (como pyserial com write_timeout)"""
+
+    def __init__(self):
+        super().__init__()
+        self.port = "/dev/ttyFAKE"
+        self.fail = True
+
+    def write(self, data):
+        if self.fail:
+            self.writes.append(bytes(data[:5]))
+            raise TimeoutError("Write timeout")
+        return super().write(data)
+
+
+def test_write_failure_marks_port():
+    """Falha de escrita: próximos comandos recusam, /serial/status mostra e o comando cortado é fechado"""
+    print("\n6️⃣ Falha de escrita...")
+    mgr = SerialManager()
+    ser = FailingTxSerial()
+    start_tx(mgr, ser)
+    mgr.write_line("spmm6x=1,2,3,4,5,6")  # já aceito quando a escrita falha
+    t_end = time.monotonic() + 2.0
+    while mgr.tx_error is None and time.monotonic() < t_end:
+        time.sleep(0.005)
+    assert mgr.tx_error == "Write timeout" and mgr.tx_stats()["write_errors"] == 1
+    try:
+        mgr.write_line("sel=1")
+    except RuntimeError as e:
+        assert "reabra a porta" in str(e)
+    else:
+        raise AssertionError("porta com falha de escrita deveria recusar comandos")
+
+    saved = app.serial_mgr
+    app.serial_mgr = mgr
+    try:
+        status = api_serial_status()
+    finally:
+        app.serial_mgr = saved
+    print(f"   {status}")
+    assert status["connected"] and status["tx_error"] == "Write timeout"
+
+    # Porta volta (reabertura limpa o erro): o lote seguinte começa terminando o comando cortado
+    ser.fail = False
+    mgr.tx_error = None
+    mgr.write_line("sel=1")
+    t_end = time.monotonic() + 2.0
+    while mgr.tx_stats()["written"] < 1 and time.monotonic() < t_end:
+        time.sleep(0.005)
+    mgr.close()
+    assert ser.lines() == ["spmm6", "sel=1"] and ser.writes[-1] == b"\nsel=1\n"
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Thread TX da serial")
+    print("=" * 50)
+    test_config_order_and_latest_wins()
+    test_setpoint_keeps_position_of_latest()
+    test_urgent_stop_jumps_queue()
+    test_write_line_does_not_block()
+    test_closed_port_and_stats_endpoint()
+    test_write_failure_marks_port()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Teste do parser CSV de telemetria com formato travado (sem hardware)
+Travamento pelo cabeçalho do firmware ou pelo 1º frame (só 14/17/21 campos),
+contagens diferentes rejeitadas sem retravar, linhas que não são telemetria, cabeçalho repetido após o travamento, payload único (latest) e
+micro-benchmark contra o parse campo a campo.
+Execute com: python test_telemetry_parser.py
+"""
+import sys
+sys.path.append('.')
+
+import time
+
+import numpy as np
+
+import app
+from app import TelemetryParser, SerialManager, CSV_DELIM
+
+HEADER_MPU = "ms;SP_mm;Y1;Y2;Y3;Y4;Y5;Y6;PWM1;PWM2;PWM3;PWM4;PWM5;PWM6;Roll;Pitch;Yaw"
+
+HEADER_BNO = "ms;SP_mm;Y1;Y2;Y3;Y4;Y5;Y6;PWM1;PWM2;PWM3;PWM4;PWM5;PWM6;Roll;Pitch;Yaw;Qw;Qx;Qy;Qz"
+
+
+def line(n=21, ms=1000, y0=10.0):
+    fields = [str(ms), "25.000"] + [f"{y0 + i:.3f}" for i in range(6)] + [str(-100 + 40 * i) for i in range(6)]
+    fields += ["1.25", "-2.50", "30.00", "0.9990", "0.0100", "0.0200", "0.0300"]
+    return CSV_DELIM.join(fields[:n])
+
+
+def legacy_on_rx_line(text):
+    """Caminho anterior: redetecção por linha, replace+float campo a campo e dois dicts"""
+    if text.startswith("ms;"):
+        text = text[3:]
+    parts = text.split(CSV_DELIM)
+    if len(parts) < 14:
+        return None
+    float(parts[0].replace(",", "."))
+    sp = float(parts[1].replace(",", "."))
+    Y = [float(parts[2 + i].replace(",", ".")) for i in range(6)]
+    PWM = [int(float(parts[8 + i].replace(",", "."))) for i in range(6)]
+    mpu_data = quaternions = None
+    if len(parts) >= 17:
+        mpu_data = {"roll": float(parts[14].replace(",", ".")), "pitch": float(parts[15].replace(",", ".")),
+                    "yaw": float(parts[16].replace(",", "."))}
+        if len(parts) >= 21:
+            quaternions = {"w": float(parts[17].replace(",", ".")), "x": float(parts[18].replace(",", ".")),
+                           "y": float(parts[19].replace(",", ".")), "z": float(parts[20].replace(",", "."))}
+    data_format = "bno085" if quaternions else "mpu6050" if mpu_data else "standard"
+    latest = {"ts": time.time(), "sp_mm": sp, "Y": Y, "PWM": PWM, "mpu": mpu_data, "quaternions": quaternions,
+              "raw": text, "format": data_format, "encoding": "text"}
+    app.calib_recorder.add(Y, quaternions)
+    L_abs = app.platform.stroke_min + np.array(Y, dtype=float)
+    payload = {"type": "telemetry", "ts": latest["ts"], "sp_mm": sp, "Y": Y, "PWM": PWM, "mpu": mpu_data,
+               "quaternions": quaternions, "format": data_format, "actuator_lengths_abs": L_abs.tolist(),
+               "base_points": app.platform.B.tolist()}
+    return latest, payload, L_abs
+
+
+def test_lock_by_header_and_relock():
+    """Cabeçalho do firmware trava o formato; só outro cabeçalho retrava"""
+    print("\n1️⃣ Travamento pelo cabeçalho...")
+    p = TelemetryParser()
+    assert p.parse(HEADER_BNO) is None
+    assert p.n_fields == 21 and p.locked_by == "header"
+    values = p.parse(line(21))
+    assert values[:3] == [1000.0, 25.0, 10.0] and values[-1] == 0.03
+    try:
+        p.parse(line(17))  # frame de outra contagem não troca o formato
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("contagem diferente da travada deveria gerar ValueError")
+    assert p.n_fields == 21
+    assert p.parse(HEADER_MPU) is None
+    assert p.parse(line(17)) is not None
+    st = p.stats()
+    print(f"   {st}")
+    assert st["n_fields"] == 17 and st["format"] == "mpu6050" and st["relocks"] == 1
+    assert st["headers"] == 2 and st["frames"] == 2 and st["rejected"] == 1
+    print("   ✅ OK")
+
+
+def test_lock_by_frame_and_other_lines():
+    """1º frame trava; respostas, lixo e linha corrompida não mexem no formato"""
+    print("\n2️⃣ Travamento pelo 1º frame e linhas que não são telemetria...")
+    p = TelemetryParser()
+    for text in ("ESP-ROM:esp32s3-20210327", "OK spmm6x aplicado", "V[1]=1.2345 V | Y=10.000 mm", "a;b;c"):
+        assert p.parse(text) is None
+    assert p.n_fields is None
+    assert p.parse(line(14)) is not None and p.locked_by == "frame"
+    try:
+        p.parse(line(14).replace("11.000", "1x.000"))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("campo não numérico deveria gerar ValueError")
+    assert p.n_fields == 14
+    assert p.parse(line(14).replace(".", ","))[2] == 10.0  # vírgula decimal
+    assert p.parse("ms;" + line(14, ms=7))[0] == 7.0        # prefixo "ms;" (compatibilidade)
+    assert p.stats()["relocks"] == 0
+    print("   ✅ OK")
+
+
+def test_single_payload_and_raw_header():
+    """_on_rx_line: cabeçalho vira raw (não erro); payload único é também o latest"""
+    print("\n3️⃣ Payload único no SerialManager...")
+    mgr = SerialManager()
+    emitted, submitted = [], []
+    mgr._emit = emitted.append
+    mgr._fk_submit = lambda payload, L_abs: submitted.append((payload, L_abs))
+    mgr._on_rx_line(HEADER_BNO)
+    assert emitted[0]["type"] == "raw" and "parse_error" not in emitted[0]
+    mgr._on_rx_line(line(21, y0=20.0))
+    payload, L_abs = submitted[0]
+    assert mgr.latest is payload
+    assert payload["type"] == "telemetry_bno085" and payload["raw"] == line(21, y0=20.0)
+    assert payload["PWM"] == [-100, -60, -20, 20, 60, 100] and all(type(v) is int for v in payload["PWM"])
+    assert L_abs == payload["actuator_lengths_abs"] == [app.platform.stroke_min + 20.0 + i for i in range(6)]
+    assert payload["quaternions"] == {"w": 0.999, "x": 0.01, "y": 0.02, "z": 0.03}
+    assert mgr.rx_stats()["parser"]["locked_by"] == "header"
+
+    mgr._on_rx_line(line(21).replace("30.00", "3o.00"))
+    assert emitted[-1].get("parse_error") and len(submitted) == 1
+    print("   ✅ OK")
+
+
+def test_repeated_header_after_lock():
+    """Cabeçalho reenviado (reset do ESP32) com a contagem travada continua sendo raw"""
+    print("\n4️⃣ Cabeçalho repetido com formato já travado...")
+    for first in (HEADER_BNO, line(21)):
+        p = TelemetryParser()
+        p.parse(first)
+        assert p.n_fields == 21
+        assert p.parse(HEADER_BNO) is None
+        assert p.n_fields == 21 and p.locked_by == "header" and p.stats()["relocks"] == 0
+        assert p.parse(line(21))[0] == 1000.0
+        try:
+            p.parse(line(21).replace("25.000", "2x.000"))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("campo não numérico deveria gerar ValueError")
+
+    mgr = SerialManager()
+    emitted, submitted = [], []
+    mgr._emit = emitted.append
+    mgr._fk_submit = lambda payload, L_abs: submitted.append(payload)
+    mgr._on_rx_line(line(21))
+    mgr._on_rx_line(HEADER_BNO)
+    assert emitted[-1]["type"] == "raw" and "parse_error" not in emitted[-1]
+    mgr._on_rx_line(line(21))
+    assert len(submitted) == 2
+    print("   ✅ OK")
+
+
+def test_only_known_counts_lock():
+    """Só 14/17/21 campos travam; travado, linhas coladas ou truncadas são rejeitadas"""
+    print("\n5️⃣ Contagens fora do formato...")
+    p = TelemetryParser()
+    glued = line(21) + CSV_DELIM + line(21)   # duas linhas sem o '\n' entre elas
+    for text in (line(21)[:-7], glued, line(14) + ";0"):
+        try:
+            p.parse(text)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"{len(text.split(CSV_DELIM))} campos não deveria travar")
+    assert p.n_fields is None and p.stats()["rejected"] == 3
+    assert p.parse(line(14)) is not None and p.n_fields == 14
+    for text in (line(17), line(21), glued):
+        try:
+            p.parse(text)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("com o formato travado, outra contagem deveria ser rejeitada")
+    st = p.stats()
+    assert st["n_fields"] == 14 and st["locked_by"] == "frame" and st["relocks"] == 0 and st["rejected"] == 6
+
+    mgr = SerialManager()
+    emitted, submitted = [], []
+    mgr._emit = emitted.append
+    mgr._fk_submit = lambda payload, L_abs: submitted.append(payload)
+    mgr._on_rx_line(line(21))
+    mgr._on_rx_line(line(17))
+    assert emitted[-1].get("parse_error") and len(submitted) == 1
+    assert mgr.rx_stats()["parser"]["format"] == "bno085"
+    print("   ✅ OK")
+
+
+def test_per_frame_cost():
+    """Micro-benchmark: custo por frame do caminho novo x parse campo a campo"""
+    print("\n6️⃣ Custo por frame...")
+    n = 20000
+    for fields in (14, 21):
+        text = line(fields)
+        mgr = SerialManager()
+        mgr._fk_submit = lambda payload, L_abs: None
+        mgr._on_rx_line(text)  # trava o formato
+
+        best_new = best_old = float("inf")
+        for _ in range(5):
+            t0 = time.perf_counter()
+            for _ in range(n):
+                mgr._on_rx_line(text)
+            best_new = min(best_new, time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            for _ in range(n):
+                legacy_on_rx_line(text)
+            best_old = min(best_old, time.perf_counter() - t0)
+        new_us, old_us = best_new / n * 1e6, best_old / n * 1e6
+        print(f"   {fields} campos: {new_us:.2f} µs/frame (antes {old_us:.2f} µs/frame, {old_us / new_us:.2f}x)")
+        assert new_us < old_us
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Parser de telemetria")
+    print("=" * 50)
+    test_lock_by_header_and_relock()
+    test_lock_by_frame_and_other_lines()
+    test_single_payload_and_raw_header()
+    test_repeated_header_after_lock()
+    test_only_known_counts_lock()
+    test_per_frame_cost()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
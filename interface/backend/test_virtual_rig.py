@@ -0,0 +1,173 @@
+"""
+Teste do rig virtual (ESP32 emulado num pseudo-terminal)
+Protocolo e dinâmica sem pty; depois o caminho completo serial → parser → FK
+pela porta pty, em texto e em binário, incluindo uma carga acima da taxa real.
+Falha ao criar o rig no startup só gera aviso, não derruba o servidor.
+Execute com: python test_virtual_rig.py   (Linux/macOS)
+"""
+import sys
+sys.path.append('.')
+
+import asyncio
+import os
+import time
+
+import numpy as np
+
+import app
+from app import (VirtualRig, SerialManager, VirtualRigConfig, expected_reply, start_virtual_rig,
+                 stop_virtual_rig, startup_event, VIRTUAL_RIG_ENV, api_list_ports, get_virtual_rig, set_pid_batch, PIDBatch, PIDGains)
+
+HAS_PTY = hasattr(os, "openpty")
+
+
+def wait_for(cond, timeout=3.0):
+    t_end = time.monotonic() + timeout
+    while time.monotonic() < t_end:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_protocol_replies():
+    """Respostas do rig batem com a tabela de confirmações do backend"""
+    print("\n1️⃣ Protocolo do firmware...")
+    rig = VirtualRig()
+    assert rig.handle_command("sel=3") is None and rig.sel == 2
+    assert rig.handle_command("kpmm=7.5") is None and rig.Kp[2] == 7.5
+    assert rig.handle_command("kiall=0.5") is None and np.all(rig.Ki == 0.5)
+    assert rig.handle_command("spmm4=999") is None and rig.SP[3] == rig.Lmm[3]
+    assert rig.handle_command("spmm=20") is None and np.all(rig.SP == 20)
+    for cmd in ("spmm6x=1,2,3,4,5,6", "vmaxmmps=80", "u0a=12", "u0r=9", "u0aall=10", "u0rall=10",
+                "offset=0.5", "offsetall=0", "cal=0.3,3.1", "cal=1.0,1.01", "zero", "mark100", "v?"):
+        reply = rig.handle_command(cmd)
+        assert reply is not None and reply.startswith(expected_reply(cmd)), (cmd, reply)
+    assert rig.SP.tolist() == [1, 2, 3, 4, 5, 6]
+    assert rig.handle_command("spmm6x=1,2").startswith("ERR")
+    assert rig.handle_command("comando-desconhecido") is None
+    print("   ✅ OK")
+
+
+def test_step_response():
+    """PID + atuador de 1ª ordem chega ao setpoint dentro da zona morta"""
+    print("\n2️⃣ Resposta ao degrau (simulação pura)...")
+    rig = VirtualRig()
+    rig.handle_command("spmm6x=20,25,30,35,40,45")
+    dt = 1.0 / app.VIRTUAL_RIG_CONTROL_HZ
+    for _ in range(int(5.0 / dt)):
+        rig._control_step(dt)
+    err = np.abs(rig.y - rig.SP)
+    print(f"   erro final: {np.round(err, 3).tolist()} mm")
+    assert np.all(err < 0.5)
+    assert np.all(rig.pwm <= 255)
+
+    rig.handle_command("sel=1")
+    rig.handle_command("A")
+    y0 = rig.y[0]
+    for _ in range(int(0.5 / dt)):
+        rig._control_step(dt)
+    assert rig.y[0] > y0 + 1.0  # avanço manual move o pistão selecionado
+    print("   ✅ OK")
+
+
+def test_pty_end_to_end():
+    """Porta em /serial/ports, telemetria BNO085, setpoints e lote PID confirmado"""
+    print("\n3️⃣ Caminho completo pela pty...")
+    res = start_virtual_rig(VirtualRigConfig(rate_hz=100, telemetry_format="bno085", noise_mm=0.01, seed=1))
+    port = res["port"]
+    mgr = app.serial_mgr
+    try:
+        ports = api_list_ports()["ports"]
+        virtual = [p for p in ports if p.get("virtual")]
+        assert virtual and virtual[0]["device"] == port
+
+        mgr.open(port)
+        assert wait_for(lambda: mgr.latest.get("format") == "bno085")
+        assert mgr.latest["quaternions"] is not None
+
+        mgr.write_line("spmm6x=30,30,30,30,30,30")
+        assert wait_for(lambda: all(abs(y - 30) < 1.0 for y in mgr.latest.get("Y", [0])), timeout=10.0)
+
+        batch = PIDBatch(gains=[PIDGains(piston=p, kp=6.0) for p in range(1, 7)],
+                         feedforward=[{"piston": p, "u0_adv": 12.0} for p in range(1, 7)])
+        out = set_pid_batch(batch)
+        print(f"   lote PID ({out['commands']} comandos) confirmado em {out['ack_ms']:.1f} ms")
+        assert np.all(app.virtual_rig.Kp == 6.0) and np.all(app.virtual_rig.U0a == 12.0)
+    finally:
+        stop_virtual_rig()
+    assert not mgr.ser
+    assert not get_virtual_rig()["running"]
+    print("   ✅ OK")
+
+
+def test_binary_and_load():
+    """Rig binário acima da taxa real: parser acompanha e a FK fica com o último frame"""
+    print("\n4️⃣ Carga em binário...")
+    for encoding in ("text", "binary"):
+        rig = VirtualRig(rate_hz=1000, telemetry_format="mpu6050", encoding=encoding)
+        mgr = SerialManager()
+        mgr.open(rig.start())
+        try:
+            time.sleep(0.3)
+            f0, t0 = mgr._fk_counters["frames_in"], time.monotonic()
+            time.sleep(2.0)
+            rate = (mgr._fk_counters["frames_in"] - f0) / (time.monotonic() - t0)
+            stats = mgr.rx_stats()
+            fmt = mgr.latest.get("format")
+        finally:
+            mgr.close()
+            rig.stop()
+        fk = mgr.fk_stats()
+        print(f"   {encoding}: {rate:.0f} frames/s recebidos (alvo 1000), modo {stats['encoding']}, "
+              f"FK publicou {fk['frames_published']}, descartou {fk['frames_dropped']}")
+        assert stats["encoding"] == encoding
+        assert rate > 500
+        assert fmt == "mpu6050"
+    print("   ✅ OK")
+
+
+def test_startup_without_pty():
+    """STEWART_VIRTUAL_RIG=1 sem pty: startup avisa e segue"""
+    print("\n5️⃣ Startup com rig virtual indisponível...")
+    original_start = VirtualRig.start
+    old_env = os.environ.get(VIRTUAL_RIG_ENV)
+    old_loop = app.serial_mgr.loop
+
+    def no_pty(self):
+        raise RuntimeError("Pseudo-terminal indisponível neste sistema")
+
+    VirtualRig.start = no_pty
+    os.environ[VIRTUAL_RIG_ENV] = "1"
+    try:
+        asyncio.run(startup_event())   # não pode levantar
+    finally:
+        VirtualRig.start = original_start
+        app.serial_mgr.loop = old_loop
+        if old_env is None:
+            del os.environ[VIRTUAL_RIG_ENV]
+        else:
+            os.environ[VIRTUAL_RIG_ENV] = old_env
+    assert app.virtual_rig is None or not app.virtual_rig.running
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Rig virtual (pty)")
+    print("=" * 50)
+    test_protocol_replies()
+    test_step_response()
+    if not HAS_PTY:
+        print("\n⚠️ Sem pseudo-terminal neste sistema: testes com pty pulados")
+    else:
+        test_pty_end_to_end()
+        test_binary_and_load()
+    test_startup_without_pty()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Teste do índice do espaço de trabalho (sem servidor)
+Compara a consulta por tabela com a IK exata e chama os handlers de /workspace.
+Execute com: python test_workspace.py
+"""
+import sys
+sys.path.append('.')
+
+import time
+
+import numpy as np
+
+from app import (platform, StewartPlatform, get_workspace, get_workspace_slice,
+                 workspace_query, WorkspaceQuery)
+from fastapi import HTTPException
+
+
+def random_poses(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(-100, 100, n),
+        rng.uniform(-100, 100, n),
+        rng.uniform(440, 620, n),
+        rng.uniform(-12, 12, n),
+        rng.uniform(-12, 12, n),
+        rng.uniform(-12, 12, n),
+    ])
+
+
+def test_index_matches_exact_ik():
+    """Consulta interpolada concorda com a IK exata na grande maioria das poses"""
+    print("\n1️⃣ Tabela x IK exata...")
+    ws = platform.workspace()
+    poses = random_poses()
+
+    t0 = time.perf_counter()
+    reachable, margin = ws.query(poses)
+    query_ms = (time.perf_counter() - t0) * 1000
+
+    L, valid, _ = platform.inverse_kinematics_batch(poses)
+    margin_exact = platform.stroke_margins(L)
+
+    agreement = np.mean(reachable == valid)
+    err = np.abs(margin - margin_exact)
+    print(f"   Build: {ws.build_ms:.0f} ms | Consulta: {query_ms:.1f} ms p/ {len(poses)} poses")
+    print(f"   Concordância: {agreement * 100:.1f}% | erro de margem: mediana {np.median(err):.2f} mm, máx {err.max():.2f} mm")
+    assert agreement > 0.95
+    assert np.median(err) < 3.0
+    print("   ✅ OK")
+
+
+def test_no_false_positives():
+    """Pose dada como alcançável pela tabela está sempre dentro do curso pela IK exata"""
+    print("\n2️⃣ Sem falso positivo...")
+    ws = platform.workspace()
+    rng = np.random.default_rng(1)
+    lo = np.array([a[0] for a in ws.axes])
+    hi = np.array([a[-1] for a in ws.axes])
+    poses = rng.uniform(lo, hi, (100000, 6))  # caixa inteira da grade
+
+    t0 = time.perf_counter()
+    reachable, margin = ws.query(poses)
+    query_ms = (time.perf_counter() - t0) * 1000
+
+    L, valid, _ = platform.inverse_kinematics_batch(poses)
+    print(f"   {reachable.sum()} alcançáveis de {len(poses)} | falsos negativos: {np.sum(valid & ~reachable)} "
+          f"| consulta {query_ms:.0f} ms")
+    assert not np.any(reachable & ~valid)
+    assert np.allclose(margin[reachable], platform.stroke_margins(L[reachable]))
+    print("   ✅ OK")
+
+
+def test_index_is_cached_per_geometry():
+    """Mesma geometria reaproveita o índice; nova geometria monta outro"""
+    print("\n3️⃣ Índice por geometria...")
+    assert platform.workspace() is platform.workspace()
+    other = StewartPlatform(h0=432, stroke_min=500, stroke_max=660)
+    assert other.workspace() is not platform.workspace()
+    assert other.workspace().summary()["axis_ranges"]["z"]["max"] < platform.workspace().summary()["axis_ranges"]["z"]["max"]
+    print("   ✅ OK")
+
+
+def test_outside_grid_is_unreachable():
+    """Pose fora da grade não é alcançável e não tem margem"""
+    print("\n4️⃣ Pose fora da grade...")
+    reachable, margin = platform.workspace().query([[0, 0, 2000, 0, 0, 0]])
+    assert not reachable[0]
+    assert np.isnan(margin[0])
+    print("   ✅ OK")
+
+
+def test_workspace_endpoints():
+    """GET /workspace e POST /workspace/query"""
+    print("\n5️⃣ Endpoints /workspace...")
+    summary = get_workspace()
+    assert set(summary["axis_ranges"]) == {"x", "y", "z", "roll", "pitch", "yaw"}
+    z_range = summary["axis_ranges"]["z"]
+    print(f"   Faixa de z na pose neutra: [{z_range['min']:.1f}, {z_range['max']:.1f}] mm")
+    assert 425 < z_range["min"] < 440 and 620 < z_range["max"] < 640
+
+    req = WorkspaceQuery(poses=[
+        {"x": 0, "y": 0, "z": 530},
+        {"x": 0, "y": 0, "z": 700},
+    ], exact=True)
+    result = workspace_query(req)
+    assert result["reachable"] == [True, False]
+    assert result["valid_exact"] == [True, False]
+    assert abs(result["margin_mm"][0] - result["margin_mm_exact"][0]) < 3.0
+    print("   ✅ OK")
+
+
+def test_workspace_slice_xy_and_roll_pitch():
+    """Fatias x-y e roll-pitch batem com a IK e são reaproveitadas do cache"""
+    print("\n6️⃣ GET /workspace/slice...")
+    sl = get_workspace_slice(ax1="x", ax2="y", z=520, n1=41, n2=31)
+    assert not sl["cached"]
+    assert len(sl["margin_mm"]) == 41 and len(sl["margin_mm"][0]) == 31
+    assert sl["fixed"]["z"] == 520
+
+    # amostra da fatia confere com a IK escalar
+    i1, i2 = 20, 15
+    L, valid, _ = platform.inverse_kinematics(x=sl["values1"][i1], y=sl["values2"][i2], z=520)
+    assert valid == sl["valid"][i1][i2]
+    print(f"   XY em z=520: bounds={sl['bounds']}, {sl['compute_ms']:.1f} ms")
+
+    again = get_workspace_slice(ax1="x", ax2="y", z=520, n1=41, n2=31)
+    assert again["cached"]
+
+    rp = get_workspace_slice(ax1="roll", ax2="pitch", z=500)
+    assert rp["reachable_fraction"] > 0
+    print(f"   roll/pitch em z=500: bounds={rp['bounds']}")
+
+    try:
+        get_workspace_slice(ax1="x", ax2="x")
+    except HTTPException as e:
+        assert e.status_code == 400
+    else:
+        raise AssertionError("eixos iguais deveriam ser rejeitados")
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Espaço de trabalho")
+    print("=" * 50)
+    test_index_matches_exact_ik()
+    test_no_false_positives()
+    test_index_is_cached_per_geometry()
+    test_outside_grid_is_unreachable()
+    test_workspace_endpoints()
+    test_workspace_slice_xy_and_roll_pitch()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
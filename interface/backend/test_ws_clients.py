@@ -0,0 +1,498 @@
+"""
+Teste das filas por cliente do WebSocket (sem servidor)
+Política da fila (descarta a mais antiga / só a mais recente por tipo), cliente
+lento ou travado sem atrasar os outros, serialização única por broadcast,
+assinatura de tópicos/campos, decimação por cliente, subprotocolo binário,
+erro de envio e GET /ws/stats.
+Execute com: python test_ws_clients.py
+"""
+import sys
+sys.path.append('.')
+
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from app import (WSClient, WSManager, SerialManager, encode_ws, encode_ws_binary, decode_ws_binary, get_ws_stats,
+                 ws_mgr, WS_JSON_ENCODER, WS_BIN_SUBPROTOCOL)
+
+
+class FakeWS:
+    """WebSocket falso: send_json demora `delay_s` (None = trava para sempre)"""
+
+    def __init__(self, delay_s=0.0, fail=False, subprotocols=()):
+        self.delay_s = delay_s
+        self.fail = fail
+        self.got = []
+        self.client = ("127.0.0.1", 50000)
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.subprotocol = None
+
+    async def accept(self, subprotocol=None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, text):
+        if self.fail:
+            raise ConnectionResetError("cliente sumiu")
+        if self.delay_s is None:
+            await asyncio.Event().wait()
+        if self.delay_s:
+            await asyncio.sleep(self.delay_s)
+        self.got.append((time.monotonic(), json.loads(text)))
+
+    async def send_bytes(self, data):
+        self.got.append((time.monotonic(), dict(decode_ws_binary(data), nbytes=len(data))))
+
+
+class LegacyWSManager:
+    """Broadcast anterior: um lock e send_json em cada socket, um de cada vez"""
+
+    def __init__(self):
+        self.active = []
+        self.lock = asyncio.Lock()
+
+    async def broadcast_json(self, obj):
+        async with self.lock:
+            for ws in self.active:
+                await ws.send_text(json.dumps(obj))
+
+
+def telem(k):
+    return {"type": "telemetry", "k": k, "t_send": time.monotonic()}
+
+
+def raw(k):
+    return {"type": "raw", "raw": f"OK {k}"}
+
+
+def put(client, obj):
+    client.enqueue(obj["type"], json.dumps(obj))
+
+
+def queued(client):
+    return [json.loads(item[2]) for item in client.pending]
+
+
+def test_queue_policy():
+    """Telemetria pendente é substituída no lugar; fila cheia perde a mais antiga"""
+    print("\n1️⃣ Política da fila...")
+    c = WSClient(FakeWS(), 1, maxsize=4)
+    for k in range(3):
+        put(c, telem(k))
+    put(c, raw(0))
+    put(c, {"type": "motion_tick", "t": 0.0})
+    put(c, {"type": "motion_tick", "t": 0.1})
+    msgs = queued(c)
+    assert [m["type"] for m in msgs] == ["telemetry", "raw", "motion_tick"]
+    assert msgs[0]["k"] == 2 and msgs[2]["t"] == 0.1
+    assert c.counters["coalesced"] == 3 and c.counters["dropped"] == 0
+
+    put(c, raw(1))
+    put(c, raw(2))  # cheia: sai a telemetria (mais antiga)
+    assert c.counters["dropped"] == 1 and "telemetry" not in c._latest
+    put(c, telem(9))  # não há telemetria pendente: entra no fim da fila
+    assert [m.get("raw", m["type"]) for m in queued(c)] == ["motion_tick", "OK 1", "OK 2", "telemetry"]
+    assert len(c.pending) == 4 and c.stats()["max_depth"] == 4
+    print("   ✅ OK")
+
+
+async def _broadcast_run(mgr, n=300, period_s=0.001):
+    t0 = time.perf_counter()
+    worst = 0.0
+    for k in range(n):
+        t = time.perf_counter()
+        await mgr.broadcast_json(telem(k))
+        if k % 10 == 0:
+            await mgr.broadcast_json(raw(k))
+        worst = max(worst, time.perf_counter() - t)
+        await asyncio.sleep(period_s)
+    await asyncio.sleep(0.1)
+    return time.perf_counter() - t0, worst
+
+
+def _lag_ms(ws):
+    lags = [(t - obj["t_send"]) * 1000 for t, obj in ws.got if obj["type"] == "telemetry"]
+    return sum(lags) / len(lags), max(lags)
+
+
+def test_slow_client_isolated():
+    """Cliente lento e cliente travado não atrasam o rápido (comparado ao broadcast com lock)"""
+    print("\n2️⃣ Cliente lento isolado...")
+
+    async def run_new():
+        mgr = WSManager()
+        fast, slow, stuck = FakeWS(), FakeWS(delay_s=0.02), FakeWS(delay_s=None)
+        for ws in (fast, slow, stuck):
+            await mgr.connect(ws)
+        elapsed, worst = await _broadcast_run(mgr)
+        stats = {c.ws: c.stats() for c in mgr.clients.values()}
+        while mgr.clients[slow].pending:  # lento termina de esvaziar a fila
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        for ws in (fast, slow, stuck):
+            await mgr.disconnect(ws)
+        return fast, slow, stats, elapsed, worst
+
+    async def run_legacy():
+        mgr = LegacyWSManager()
+        fast, slow = FakeWS(), FakeWS(delay_s=0.02)
+        mgr.active += [slow, fast]
+        elapsed, worst = await _broadcast_run(mgr, n=50)
+        return fast, elapsed, worst
+
+    fast, slow, stats, elapsed, worst = asyncio.run(run_new())
+    legacy_fast, legacy_elapsed, legacy_worst = asyncio.run(run_legacy())
+    lag_avg, lag_max = _lag_ms(fast)
+    legacy_avg, legacy_max = _lag_ms(legacy_fast)
+    print(f"   novo: broadcast pior caso {worst * 1e6:.0f} µs | rápido: atraso médio {lag_avg:.2f} ms, máx {lag_max:.2f} ms")
+    print(f"   com lock: broadcast pior caso {legacy_worst * 1e3:.1f} ms | rápido: atraso médio {legacy_avg:.1f} ms, máx {legacy_max:.1f} ms")
+    for name, ws in (("rápido", fast), ("lento", slow)):
+        st = stats[ws]
+        print(f"   {name}: {st['sent']} enviadas, {st['coalesced']} fundidas, {st['dropped']} descartadas")
+    stuck_st = [st for ws, st in stats.items() if ws not in (fast, slow)][0]
+    print(f"   travado: fila {stuck_st['queue_depth']}/{stuck_st['queue_max']}, {stuck_st['dropped']} descartadas")
+
+    assert worst < 0.005 and lag_max < 20 and lag_avg < legacy_avg / 5
+    assert len(fast.got) >= 300  # rápido recebe praticamente tudo
+    slow_raw = [obj["raw"] for _, obj in slow.got if obj["type"] == "raw"]
+    assert slow_raw == [f"OK {k}" for k in range(0, 300, 10)]  # raw nunca é fundido nem reordenado
+    assert stats[slow]["coalesced"] > 100 and stats[slow]["dropped"] == 0
+    assert stuck_st["queue_depth"] <= stuck_st["queue_max"] and stuck_st["dropped"] == 0
+    # travado: 1ª telemetria presa no send; na fila ficam só a mais recente e os 30 raws
+    assert stuck_st["coalesced"] == 298 and stuck_st["queue_depth"] == 31
+    print("   ✅ OK")
+
+
+def telemetry_payload():
+    """Frame de telemetria BNO085 completo, com pose reconstruída pela FK"""
+    mgr = SerialManager()
+    mgr._emit = lambda obj: None
+    frames = []
+    mgr._fk_submit = lambda payload, L_abs: frames.append((payload, L_abs))
+    fields = ["1000", "25.000"] + [f"{150.0 + i:.3f}" for i in range(6)] + ["10"] * 6
+    mgr._on_rx_line(";".join(fields + ["1.25", "-2.50", "30.00", "0.9990", "0.0100", "0.0200", "0.0300"]))
+    payload, L_abs = frames[0]
+    mgr._publish_frame(payload, L_abs)
+    return payload
+
+
+def test_encode_once():
+    """Texto serializado uma vez e compartilhado; arrays NumPy e custo por mensagem"""
+    print(f"\n3️⃣ Serialização única ({WS_JSON_ENCODER})...")
+    payload = telemetry_payload()
+    assert payload["pose_live"] is not None
+    mixed = {"type": "x", "a": np.arange(6.0), "b": np.arange(12.0).reshape(3, 4)[:, ::2],
+             "c": np.float32(0.5), "d": np.int64(3), "e": np.bool_(True)}
+    assert json.loads(encode_ws(mixed)) == {"type": "x", "a": [0, 1, 2, 3, 4, 5], "b": [[0, 2], [4, 6], [8, 10]],
+                                            "c": 0.5, "d": 3, "e": True}
+    assert json.loads(encode_ws(payload)) == json.loads(json.dumps(payload))
+
+    async def run():
+        mgr = WSManager()
+        sockets = [FakeWS() for _ in range(5)]
+        for ws in sockets:
+            await mgr.connect(ws)
+        for k in range(100):
+            mgr.broadcast(dict(payload, ts=k))
+            texts = {id(c.pending[-1][2]) for c in mgr.clients.values()}
+            assert len(texts) == 1  # o mesmo objeto str em todas as filas
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.02)
+        stats = mgr.stats()
+        for ws in sockets:
+            await mgr.disconnect(ws)
+        return sockets, stats
+
+    sockets, stats = asyncio.run(run())
+    assert stats["encoded"] == 100 and all(len(ws.got) == 100 for ws in sockets)
+    assert sockets[0].got[-1][1]["pose_live"] == sockets[4].got[-1][1]["pose_live"]
+
+    n, clients = 2000, 5
+    best_new = best_old = float("inf")
+    for _ in range(5):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            encode_ws(payload)
+        best_new = min(best_new, time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            for _ in range(clients):  # send_json do Starlette: json.dumps por cliente
+                json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+        best_old = min(best_old, time.perf_counter() - t0)
+    new_us, old_us = best_new / n * 1e6, best_old / n * 1e6
+    print(f"   telemetria ({stats['bytes_avg']:.0f} B): {new_us:.1f} µs por mensagem para {clients} clientes "
+          f"(antes {old_us:.1f} µs, {old_us / new_us:.1f}x) | métrica: {stats['encode_us_avg']:.1f} µs médio, "
+          f"{stats['encode_us_max']:.1f} µs máx")
+    assert new_us < old_us / clients
+    print("   ✅ OK")
+
+
+def test_topic_subscriptions():
+    """Cada cliente recebe só os tópicos/campos assinados; mesma assinatura divide o texto"""
+    print("\n4️⃣ Assinatura de tópicos e campos...")
+    payload = telemetry_payload()
+    tick = {"type": "motion_tick", "t": 0.5, "pose_cmd": {"z": 432.0}}
+    line = {"type": "raw", "raw": "OK spmm6x aplicado"}
+    joystick = {"action": "subscribe", "topics": ["telemetry"], "fields": {"telemetry": ["ts", "pose_live"]}}
+    actuators = {"action": "subscribe", "topics": ["telemetry", "raw"],
+                 "fields": {"telemetry": ["ts", "sp_mm", "Y", "PWM"]}}
+
+    async def run():
+        mgr = WSManager()
+        full, joy, act1, act2 = (FakeWS() for _ in range(4))
+        for ws in (full, joy, act1, act2):
+            await mgr.connect(ws)
+        mgr.handle_message(joy, json.dumps(joystick))
+        for ws in (act1, act2):
+            mgr.handle_message(ws, json.dumps(actuators))
+        for bad in ("não é json", json.dumps({"action": "subscribe", "topics": ["pose"]}),
+                    json.dumps({"action": "subscribe", "topics": ["raw"], "fields": {"telemetry": ["Y"]}}),
+                    json.dumps({"action": "unsubscribe"}), json.dumps({"topics": "raw"})):
+            mgr.handle_message(joy, bad)  # erro não altera a assinatura atual
+        await asyncio.sleep(0.01)
+
+        n0 = mgr.encode_counters["messages"]
+        mgr.broadcast(payload)
+        shared = mgr.clients[act1].pending[-1][2] is mgr.clients[act2].pending[-1][2]
+        encodes = mgr.encode_counters["messages"] - n0
+        mgr.broadcast(tick)
+        mgr.broadcast(line)
+        await asyncio.sleep(0.01)
+        stats = {ws: mgr.clients[ws].stats() for ws in (full, joy, act1)}
+        for ws in (full, joy, act1, act2):
+            await mgr.disconnect(ws)
+        return full, joy, act1, shared, encodes, stats
+
+    full, joy, act1, shared, encodes, stats = asyncio.run(run())
+    joy_msgs = [obj for _, obj in joy.got]
+    replies = [m for m in joy_msgs if m["type"] in ("subscribed", "error")]
+    assert [m["type"] for m in replies] == ["subscribed"] + ["error"] * 5
+    assert replies[0]["topics"] == ["telemetry"] and replies[0]["fields"] == {"telemetry": ["type", "pose_live", "ts"]}
+    print(f"   erros: {[m['detail'][:40] for m in replies[1:]]}")
+
+    data = [m for m in joy_msgs if m not in replies]
+    assert data == [{"type": "telemetry_bno085", "ts": payload["ts"], "pose_live": payload["pose_live"]}]
+    act_msgs = [obj for _, obj in act1.got][1:]
+    assert [m["type"] for m in act_msgs] == ["telemetry_bno085", "raw"]
+    assert set(act_msgs[0]) == {"type", "ts", "sp_mm", "Y", "PWM"} and act_msgs[1] == line
+    assert [obj["type"] for _, obj in full.got] == ["telemetry_bno085", "motion_tick", "raw"]
+    assert shared and encodes == 3  # inteira + joystick + atuadores (2 clientes, 1 serialização)
+    assert stats[joy]["filtered"] == 2 and stats[act1]["filtered"] == 1 and stats[full]["filtered"] == 0
+
+    size = {name: len(encode_ws(m)) for name, m in (("inteira", full.got[0][1]), ("joystick", data[0]),
+                                                     ("atuadores", act_msgs[0]))}
+    print(f"   bytes por telemetria: {size}")
+    assert size["joystick"] < size["inteira"] / 3 and size["atuadores"] < size["inteira"] / 3
+    print("   ✅ OK")
+
+
+def test_rate_decimation():
+    """Taxa máxima por cliente: último frame do período ou agregado min/máx/média dos pulados"""
+    print("\n5️⃣ Decimação por cliente...")
+    n = 400
+
+    def frame(k):
+        return {"type": "telemetry", "ts": float(k), "k": k, "sp_mm": float(k), "Y": [float(k + i) for i in range(6)],
+                "mpu": {"roll": float(-k)}, "raw": f"{k};..."}
+
+    async def run():
+        mgr = WSManager()
+        full, slow, agg = FakeWS(), FakeWS(), FakeWS()
+        for ws in (full, slow, agg):
+            await mgr.connect(ws)
+        mgr.handle_message(slow, json.dumps({"action": "subscribe", "rates": {"telemetry": 10}}))
+        mgr.handle_message(agg, json.dumps({"action": "subscribe", "topics": ["telemetry"], "rates": {"telemetry": 50},
+                                            "decimation": "aggregate"}))
+        for bad in ({"rates": {"raw": 5}}, {"rates": {"telemetry": 0}}, {"decimation": "mean"},
+                    {"topics": ["raw"], "rates": {"telemetry": 5}}):
+            mgr.handle_message(agg, json.dumps(dict(bad, action="subscribe")))
+        await asyncio.sleep(0.01)
+        t0 = time.monotonic()
+        for k in range(n):
+            mgr.broadcast(frame(k))
+            await asyncio.sleep(0.002)
+        elapsed = time.monotonic() - t0
+        await asyncio.sleep(0.15)  # timer entrega o último frame retido
+        stats = {ws: mgr.clients[ws].stats() for ws in (full, slow, agg)}
+        for ws in (full, slow, agg):
+            await mgr.disconnect(ws)
+        return full, slow, agg, stats, elapsed
+
+    full, slow, agg, stats, elapsed = asyncio.run(run())
+    replies = {name: [obj for _, obj in ws.got if obj["type"] in ("subscribed", "error")]
+               for name, ws in (("slow", slow), ("agg", agg))}
+    assert replies["slow"][0]["rates"] == {"telemetry": 10.0} and replies["slow"][0]["decimation"] == "latest"
+    assert [m["type"] for m in replies["agg"]] == ["subscribed"] + ["error"] * 4
+    assert stats[agg]["rates"] == {"telemetry": 50.0} and stats[agg]["decimation"] == "aggregate"
+
+    def frames(ws):
+        return [(t, obj) for t, obj in ws.got if obj["type"] == "telemetry"]
+
+    assert [obj["k"] for _, obj in frames(full)] == list(range(n))
+    slow_frames = frames(slow)
+    gaps = [b[0] - a[0] for a, b in zip(slow_frames, slow_frames[1:])]
+    print(f"   {n} frames em {elapsed:.2f} s ({n / elapsed:.0f} Hz) | 10 Hz: {len(slow_frames)} frames, "
+          f"intervalo mín {min(gaps) * 1000:.0f} ms | 50 Hz agregado: {len(frames(agg))} frames")
+    assert slow_frames[-1][1]["k"] == n - 1  # o último frame não fica preso
+    assert len(slow_frames) <= elapsed * 10 + 2 and min(gaps) > 0.08
+    assert stats[slow]["decimated"] + len(slow_frames) == n
+
+    windows = [obj["agg"] for _, obj in frames(agg)]
+    assert sum(w["n"] for w in windows) == n and len(windows) <= elapsed * 50 + 2
+    first = 0
+    for (_, obj), w in zip(frames(agg), windows):  # janelas contíguas: do 1º frame pulado ao enviado
+        last = obj["k"]
+        assert w["n"] == last - first + 1
+        assert w["fields"]["Y"]["min"][0] == first and w["fields"]["Y"]["max"][5] == last + 5
+        assert w["fields"]["sp_mm"]["mean"] == (first + last) / 2
+        assert w["fields"]["mpu"]["roll"] == {"min": -last, "max": -first, "mean": -(first + last) / 2}
+        assert "raw" not in w["fields"] and "ts" not in w["fields"]
+        first = last + 1
+    print(f"   agregado: {windows[1]}")
+    print("   ✅ OK")
+
+
+def test_binary_protocol():
+    """Subprotocolo binário: negociação, layout float32 com seq, raw em texto e tamanho x JSON"""
+    print(f"\n6️⃣ Subprotocolo binário ({WS_BIN_SUBPROTOCOL})...")
+    payload = telemetry_payload()
+    no_pose = dict(payload, pose_live=None, platform_points_live=None, conditioning=None)
+    tick = {"type": "motion_tick", "t": 0.5, "elapsed_ms": 500, "routine": "helix",
+            "pose_cmd": {"x": 1.0, "y": 2.0, "z": 432.0, "roll": 0.0, "pitch": 1.5, "yaw": -1.0},
+            "actuators_cmd": [500.0 + i for i in range(6)], "actuators_real": [0.0] * 6,
+            "dexterity": 0.4, "near_singular": False}
+
+    async def run():
+        mgr = WSManager()
+        binary, text = FakeWS(subprotocols=["outro", WS_BIN_SUBPROTOCOL]), FakeWS(subprotocols=["outro"])
+        for ws in (binary, text):
+            await mgr.connect(ws)
+        mgr.handle_message(binary, json.dumps({"action": "subscribe", "decimation": "aggregate",
+                                               "rates": {"telemetry": 10}}))
+        for obj in (payload, payload, no_pose, {"type": "raw", "raw": "OK"}, tick):
+            mgr.broadcast(obj)
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.01)
+        stats = mgr.stats()
+        for ws in (binary, text):
+            await mgr.disconnect(ws)
+        return binary, text, stats
+
+    binary, text, stats = asyncio.run(run())
+    assert binary.subprotocol == WS_BIN_SUBPROTOCOL and text.subprotocol is None
+    got = [obj for _, obj in binary.got]
+    assert got[0]["type"] == "error" and "aggregate" in got[0]["detail"]  # agregado só em JSON
+    assert [m["type"] for m in got[1:]] == ["telemetry_bno085"] * 3 + ["raw", "motion_tick"]
+    assert [m["seq"] for m in got[1:4]] == [1, 2, 3] and got[5]["seq"] == 1  # sequência por tópico
+
+    frame = got[1]
+    assert frame["ts"] == payload["ts"]  # ts em float64 no cabeçalho
+    assert np.allclose(frame["Y"], payload["Y"]) and np.allclose(frame["PWM"], payload["PWM"])
+    assert np.allclose(frame["platform_points_live"], payload["platform_points_live"], atol=1e-3)
+    assert frame["conditioning"]["near_singular"] is payload["conditioning"]["near_singular"]
+    assert frame["format"] == payload["format"]
+    assert all(abs(frame["pose_live"][k] - v) < 1e-4 for k, v in payload["pose_live"].items())
+    assert got[3]["pose_live"] is None and got[3]["conditioning"] is None and got[3]["Y"] is not None
+    assert got[4] == {"type": "raw", "raw": "OK"}
+    assert got[5]["pose_cmd"]["z"] == 432.0 and got[5]["near_singular"] is False and got[5]["nbytes"] == 104
+
+    json_size = len(encode_ws(payload))
+    ratio = json_size / frame["nbytes"]
+    assert ratio > 3 and stats["binary"]["clients"] == 1 and stats["binary"]["encoded"] == 4
+    assert text.got[0][1] == json.loads(encode_ws(payload))
+
+    data = encode_ws_binary(payload, 1)
+    raw_json = encode_ws(payload)
+    n = 20000
+    costs = {}
+    for name, fn in (("encode JSON", lambda: encode_ws(payload)), ("encode binário", lambda: encode_ws_binary(payload, 1)),
+                     ("decode JSON", lambda: json.loads(raw_json)),
+                     ("decode binário", lambda: np.frombuffer(data, "<f4", offset=16))):  # como Float32Array
+        best = float("inf")
+        for _ in range(3):
+            t0 = time.perf_counter()
+            for _ in range(n):
+                fn()
+            best = min(best, time.perf_counter() - t0)
+        costs[name] = best / n * 1e6
+    print(f"   telemetria: {json_size} B JSON x {frame['nbytes']} B binário ({ratio:.1f}x menor) | "
+          + ", ".join(f"{k} {v:.1f} µs" for k, v in costs.items()))
+    assert costs["decode binário"] < costs["decode JSON"] / 5
+    print("   ✅ OK")
+
+
+def test_encode_failure_isolated():
+    """Falha ao serializar uma variante (binária) não derruba o broadcast para os clientes JSON"""
+    print("\n7️⃣ Falha de serialização isolada por variante...")
+    good = telemetry_payload()
+    bad = dict(good, Y=["nan?"] * 6)  # JSON serializa; float32 não
+
+    async def run():
+        mgr = WSManager()
+        clients = [FakeWS(subprotocols=[WS_BIN_SUBPROTOCOL]), FakeWS(subprotocols=[WS_BIN_SUBPROTOCOL]), FakeWS()]
+        for ws in clients:  # binários antes do JSON na ordem do broadcast
+            await mgr.connect(ws)
+        for obj in (bad, good):
+            mgr.broadcast(obj)
+            await asyncio.sleep(0.005)  # sem coalescer (telemetria é "latest")
+        await asyncio.sleep(0.01)
+        stats = mgr.stats()
+        for ws in clients:
+            await mgr.disconnect(ws)
+        return clients, stats
+
+    (bin1, bin2, text), stats = asyncio.run(run())
+    print(f"   binário: {stats['binary']['encode_errors']} erro(s), JSON: {len(text.got)} mensagem(ns)")
+    assert [obj["Y"] for _, obj in text.got] == [bad["Y"], good["Y"]]
+    for ws in (bin1, bin2):
+        assert [obj["seq"] for _, obj in ws.got] == [2]  # o frame ruim some só para os binários
+    assert stats["binary"]["encode_errors"] == 1  # falha em cache: não repete por cliente
+    print("   ✅ OK")
+
+
+def test_send_error_and_stats():
+    """Erro de envio remove só o cliente com problema; GET /ws/stats lista os demais"""
+    print("\n8️⃣ Erro de envio e /ws/stats...")
+
+    async def run():
+        good, bad = FakeWS(), FakeWS(fail=True)
+        await ws_mgr.connect(good)
+        await ws_mgr.connect(bad)
+        ws_mgr.broadcast(raw(1))
+        await asyncio.sleep(0.01)
+        ws_mgr.broadcast(raw(2))
+        await asyncio.sleep(0.01)
+        stats = get_ws_stats()
+        await ws_mgr.disconnect(good)
+        await ws_mgr.disconnect(bad)  # já removido: não falha
+        return good, stats
+
+    good, stats = asyncio.run(run())
+    print(f"   {stats['clients']} cliente(s): {stats['per_client'][0]}")
+    assert [obj["raw"] for _, obj in good.got] == ["OK 1", "OK 2"]
+    assert stats["clients"] == 1 and stats["per_client"][0]["client"] == "127.0.0.1:50000"
+    assert stats["per_client"][0]["sent"] == 2 and not ws_mgr.clients
+    print("   ✅ OK")
+
+
+def main():
+    print("=" * 50)
+    print("🧪 TESTES - Filas por cliente do WebSocket")
+    print("=" * 50)
+    test_queue_policy()
+    test_slow_client_isolated()
+    test_encode_once()
+    test_topic_subscriptions()
+    test_rate_decimation()
+    test_binary_protocol()
+    test_encode_failure_isolated()
+    test_send_error_and_stats()
+    print("\n" + "=" * 50)
+    print("✅ TODOS OS TESTES PASSARAM!")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -52,6 +52,13 @@ function initLocalTelemetryWS() {
     clearTimeout(reconnectTimer);
     lastMessageTime = Date.now();
 
+    // Só o que esta página usa: Y/PWM/SP da telemetria e as linhas raw do console
+    window.ws.send(JSON.stringify({
+      action: 'subscribe',
+      topics: ['telemetry', 'raw'],
+      fields: { telemetry: ['ts', 'sp_mm', 'Y', 'PWM'] },
+    }));
+
     if (heartbeatTimer) clearInterval(heartbeatTimer);
     heartbeatTimer = setInterval(() => {
       const now = Date.now();
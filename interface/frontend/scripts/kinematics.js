@@ -322,9 +322,7 @@ function setSerialStatus(connected, port = '') {
 
 // ========== WebSocket para Telemetria Ao Vivo ==========
 // normalizeTelemetry(), reconstructPlatformPoints(), applyLiveTelemetry() vêm de telemetry-utils.js
-let lastWSUpdate = 0;
-let lastWSMessage = null;
-const WS_UPDATE_INTERVAL = 33; // ~30 FPS
+const WS_MAX_HZ = 30; // taxa pedida ao servidor por tópico (ele decima; o cliente processa tudo que chega)
 let heartbeatTimer = null;
 let lastMessageTime = 0;
 
@@ -348,7 +346,9 @@ function initLocalTelemetryWS() {
   }
 
   try {
-    ws = new WebSocket(WS_URL);
+    // Frames de telemetria/motion_tick em binário (stewart.bin.v1); raw e respostas seguem em JSON
+    ws = new WebSocket(WS_URL, [WS_BIN_SUBPROTOCOL]);
+    ws.binaryType = 'arraybuffer';
   } catch (e) {
     console.error('❌ Erro ao criar WebSocket:', e);
     scheduleReconnect();
@@ -359,6 +359,9 @@ function initLocalTelemetryWS() {
     if (wsTimer) clearTimeout(wsTimer);
     lastMessageTime = Date.now();
 
+    // Decimação no servidor, por tópico: telemetry e motion_tick a ~30 FPS cada
+    ws.send(JSON.stringify({ action: 'subscribe', rates: { telemetry: WS_MAX_HZ, motion_tick: WS_MAX_HZ } }));
+
     // ✅ Heartbeat: verifica se está recebendo mensagens
     heartbeatTimer = setInterval(() => {
       const now = Date.now();
@@ -382,20 +385,10 @@ function initLocalTelemetryWS() {
 
   ws.onmessage = (evt) => {
     lastMessageTime = Date.now();
-    const now = performance.now();
-
-    if (now - lastWSUpdate < WS_UPDATE_INTERVAL) {
-      lastWSMessage = evt.data;
-      return;
-    }
-
-    lastWSUpdate = now;
-
-    const dataToProcess = lastWSMessage || evt.data;
-    lastWSMessage = null;
 
     try {
-      const msg = JSON.parse(dataToProcess);
+      const msg = parseWSMessage(evt.data);
+      if (!msg) return;
 
       // Se vier motion_tick com pose_cmd, apenas atualiza Preview
       if (msg.type === 'motion_tick' && msg.pose_cmd) {
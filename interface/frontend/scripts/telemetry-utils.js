@@ -180,6 +180,85 @@ function applyLiveTelemetry(containerId, data, customCallback) {
   }
 }
 
+// ========== Telemetria Binária (subprotocolo stewart.bin.v1) ==========
+
+// Espelho de WS_BIN_LAYOUTS do backend: número = nº de floats, [linhas, colunas] = matriz, nomes = objeto
+const WS_BIN_SUBPROTOCOL = 'stewart.bin.v1';
+const WS_BIN_POSE_AXES = ['x', 'y', 'z', 'roll', 'pitch', 'yaw'];
+const WS_BIN_TELEMETRY = [
+  ['sp_mm', 1], ['Y', 6], ['PWM', 6], ['actuator_lengths_abs', 6],
+  ['pose_live', WS_BIN_POSE_AXES], ['pose_age_ms', 1], ['platform_points_live', [6, 3]], ['base_points', [6, 3]],
+  ['mpu', ['roll', 'pitch', 'yaw']], ['quaternions', ['w', 'x', 'y', 'z']],
+  ['conditioning', ['condition_number', 'dexterity', 'near_singular']],
+  ['fk', ['solve_ms', 'iterations', 'residual_mm']],
+];
+const WS_BIN_LAYOUTS = {
+  1: ['telemetry', WS_BIN_TELEMETRY],
+  2: ['telemetry_mpu', WS_BIN_TELEMETRY],
+  3: ['telemetry_bno085', WS_BIN_TELEMETRY],
+  4: ['motion_tick', [
+    ['t', 1], ['elapsed_ms', 1], ['pose_cmd', WS_BIN_POSE_AXES], ['actuators_cmd', 6],
+    ['actuators_real', 6], ['dexterity', 1], ['near_singular', 1],
+  ]],
+};
+const WS_BIN_HEADER_SIZE = 16;
+const WS_BIN_FORMATS = { telemetry: 'standard', telemetry_mpu: 'mpu6050', telemetry_bno085: 'bno085' };
+
+/**
+ * Decodifica um frame binário no mesmo formato da mensagem JSON
+ * Cabeçalho LE: u8 tipo | u8 versão | u16 flags | u32 seq | f64 ts; corpo: float32 LE
+ * @param {ArrayBuffer} buffer - Frame recebido (ws.binaryType = 'arraybuffer')
+ * @returns {Object|null} Mensagem decodificada ou null se o tipo for desconhecido
+ */
+function decodeBinaryTelemetry(buffer) {
+  const view = new DataView(buffer);
+  const entry = WS_BIN_LAYOUTS[view.getUint8(0)];
+  if (!entry) return null;
+
+  const [type, layout] = entry;
+  const flags = view.getUint16(2, true);
+  const msg = { type, seq: view.getUint32(4, true), ts: view.getFloat64(8, true), version: view.getUint8(1) };
+  if (WS_BIN_FORMATS[type]) msg.format = WS_BIN_FORMATS[type]; // implícito no código do tipo
+  // Corpo começa alinhado em 16 bytes: leitura direta como Float32Array (little-endian no navegador)
+  const values = new Float32Array(buffer, WS_BIN_HEADER_SIZE, (buffer.byteLength - WS_BIN_HEADER_SIZE) / 4);
+
+  let pos = 0;
+  layout.forEach(([name, spec], i) => {
+    const n = typeof spec === 'number' ? spec : typeof spec[0] === 'string' ? spec.length : spec[0] * spec[1];
+    const block = values.subarray(pos, pos + n);
+    pos += n;
+
+    if (!(flags & (1 << i))) {
+      msg[name] = null;
+    } else if (typeof spec[0] === 'string') {
+      const obj = {};
+      spec.forEach((key, j) => {
+        const v = block[j];
+        obj[key] = key === 'near_singular' ? v !== 0 : Number.isNaN(v) ? null : v;
+      });
+      msg[name] = obj;
+    } else if (Array.isArray(spec)) {
+      const rows = [];
+      for (let r = 0; r < spec[0]; r++) rows.push(Array.from(block.subarray(r * spec[1], (r + 1) * spec[1])));
+      msg[name] = rows;
+    } else if (n === 1) {
+      msg[name] = name === 'near_singular' ? block[0] !== 0 : block[0];
+    } else {
+      msg[name] = Array.from(block);
+    }
+  });
+  return msg;
+}
+
+/**
+ * Converte uma mensagem do WebSocket (texto JSON ou frame binário) em objeto
+ * @param {string|ArrayBuffer} data - evt.data
+ * @returns {Object|null} Mensagem decodificada
+ */
+function parseWSMessage(data) {
+  return typeof data === 'string' ? JSON.parse(data) : decodeBinaryTelemetry(data);
+}
+
 // ========== Throttle de Processamento ==========
 
 /**
@@ -218,3 +297,6 @@ window.normalizeTelemetry = normalizeTelemetry;
 window.reconstructPlatformPoints = reconstructPlatformPoints;
 window.applyLiveTelemetry = applyLiveTelemetry;
 window.createThrottledTelemetryProcessor = createThrottledTelemetryProcessor;
+window.WS_BIN_SUBPROTOCOL = WS_BIN_SUBPROTOCOL;
+window.decodeBinaryTelemetry = decodeBinaryTelemetry;
+window.parseWSMessage = parseWSMessage;